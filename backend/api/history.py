@@ -0,0 +1,555 @@
+"""
+Resolution picker and downsampling for /api/sensors/{sensor_identifier}/history.
+
+With `max_points`, ranges holding more raw rows than that are answered from
+1-minute, 15-minute or 1-hour buckets of sensor_data: each point carries the
+bucket average as `value` plus its min / max / last / count, so peaks stay
+visible on the chart. Buckets come from the TimescaleDB continuous
+aggregates when they exist (see timescale.py); on plain PostgreSQL they are
+aggregated from the raw rows by the query, which still ships one row per
+bucket instead of every reading. When even the 1-hour buckets outnumber
+max_points, adjacent buckets are merged into max_points equal time buckets
+(min of mins, max of maxes, count-weighted average, latest last).
+
+With `method` as well, the raw rows are downsampled to max_points instead,
+in one pass over a streamed cursor (only a couple of buckets are held):
+- lttb: Largest-Triangle-Three-Buckets, keeps the visual shape and the peaks
+- minmax: the lowest and highest reading of each bucket
+- avg: one averaged point per bucket (same fields as the rollups)
+
+`format` selects the response encoding:
+- json: a list of point objects (default)
+- columnar: newline-delimited JSON chunks of parallel arrays
+  {"t": [epoch ms], "v": [values], "q": [qualities]} (bucketed points add
+  their min / max / last / count arrays)
+- binary: chunks of packed little-endian columns, each one
+  uint32 n | n x float64 t (epoch ms) | n x float64 v | n x int32 q
+  followed for bucketed points by
+  n x float64 min | n x float64 max | n x float64 last | n x int64 count
+  (the X-History-Columns header lists the columns of the response; null is NaN)
+Raw rows are streamed in both formats from a server-side cursor, one chunk
+per cursor batch, so memory stays flat whatever the range.
+"""
+import json
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi.responses import StreamingResponse
+from sqlalchemy import desc, func, select, text
+from .database import AsyncSessionLocal
+from . import models, timescale
+
+# (resolution, bucket seconds, continuous aggregate), finest first
+RESOLUTIONS = (
+    ("1m", 60, "sensor_data_1m"),
+    ("15m", 900, "sensor_data_15m"),
+    ("1h", 3600, "sensor_data_1h"),
+)
+
+
+def pick_resolution(start: datetime, end: datetime, max_points: int) -> tuple:
+    """Finest resolution that fits the range in max_points (the coarsest one if none does)."""
+    seconds_per_point = (end - start).total_seconds() / max_points
+    for resolution in RESOLUTIONS:
+        if resolution[1] >= seconds_per_point:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+async def raw_row_count(db, sensor_id: int, start: datetime, end: datetime, limit: int) -> int:
+    """Raw rows in the range, counting at most `limit` (bounded scan of the (sensor_id, timestamp) index)."""
+    rows = select(models.SensorData.timestamp).where(
+        models.SensorData.sensor_id == sensor_id,
+        models.SensorData.timestamp >= start,
+        models.SensorData.timestamp <= end
+    ).limit(limit).subquery()
+    result = await db.execute(select(func.count()).select_from(rows))
+    return result.scalar() or 0
+
+
+async def choose_resolution(db, sensor_id: int, start: datetime, end: datetime, max_points: Optional[int]) -> Optional[tuple]:
+    """Resolution for a history request, None for raw rows."""
+    if not max_points:
+        return None
+    # Raw rows depend on the poll interval and storage compression, not only on the range
+    if await raw_row_count(db, sensor_id, start, end, max_points + 1) <= max_points:
+        return None
+    return pick_resolution(start, end, max_points)
+
+
+def bucket_floor(ts: datetime, bucket_s: int) -> datetime:
+    epoch = datetime(1970, 1, 1, tzinfo=ts.tzinfo)
+    return ts - timedelta(seconds=(ts - epoch).total_seconds() % bucket_s)
+
+
+async def raw_row_counts(db, sensor_ids: list, start: datetime, end: datetime, limit: int) -> dict:
+    """raw_row_count for several sensors in one query: sensor_id -> rows, counting at most `limit` each."""
+    result = await db.execute(text("""
+        SELECT s.sensor_id,
+               (SELECT count(*) FROM (
+                    SELECT 1 FROM sensor_data d
+                    WHERE d.sensor_id = s.sensor_id AND d.timestamp >= :start AND d.timestamp <= :end
+                    LIMIT :limit
+               ) r)
+        FROM unnest(CAST(:sensor_ids AS integer[])) AS s(sensor_id)
+    """), {"sensor_ids": list(sensor_ids), "start": start, "end": end, "limit": limit})
+    return dict(result.all())
+
+
+async def fetch_rollups(db, sensor_ids: list, start: datetime, end: datetime, resolution: tuple,
+                        max_points: Optional[int] = None) -> dict:
+    """Bucketed history points of several sensors in one query: sensor_id -> points (the bucket holding start included).
+
+    With max_points, series holding more buckets than that are merged down to max_points.
+    """
+    _, bucket_s, view = resolution
+    params = {"sensor_ids": list(sensor_ids), "start": bucket_floor(start, bucket_s), "end": end}
+    if timescale.rollups_enabled:
+        query = text(f"""
+            SELECT sensor_id, bucket, min_value, max_value, avg_value, last_value, sample_count
+            FROM {view}
+            WHERE sensor_id = ANY(:sensor_ids) AND bucket >= :start AND bucket <= :end
+            ORDER BY sensor_id, bucket
+        """)
+    else:
+        query = text("""
+            SELECT sensor_id,
+                   to_timestamp(floor(extract(epoch FROM timestamp) / CAST(:bucket_s AS double precision)) * :bucket_s) AS bucket,
+                   min(value), max(value), avg(value),
+                   (array_agg(value ORDER BY timestamp DESC))[1],
+                   count(*)
+            FROM sensor_data
+            WHERE sensor_id = ANY(:sensor_ids) AND timestamp >= :start AND timestamp <= :end
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """)
+        params["bucket_s"] = float(bucket_s)
+
+    result = await db.execute(query, params)
+    series = {sensor_id: [] for sensor_id in sensor_ids}
+    for sensor_id, bucket, min_value, max_value, avg_value, last_value, count in result.all():
+        series[sensor_id].append({
+            "sensor_id": sensor_id,
+            "timestamp": bucket,
+            "value": avg_value,
+            "min": min_value,
+            "max": max_value,
+            "last": last_value,
+            "count": count
+        })
+    if max_points:
+        for sensor_id, points in series.items():
+            if len(points) > max_points:
+                series[sensor_id] = merge_buckets(points, start, end, max_points)
+    return series
+
+
+async def fetch_rollup(db, sensor_id: int, start: datetime, end: datetime, resolution: tuple,
+                       max_points: Optional[int] = None) -> list:
+    """Bucketed history points between start and end (the bucket holding start included)."""
+    return (await fetch_rollups(db, [sensor_id], start, end, resolution, max_points))[sensor_id]
+
+
+def epoch_seconds(ts: datetime) -> float:
+    # Naive datetimes (datetime.utcnow() defaults, query strings without offset) are UTC
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def epoch_ms(ts: datetime) -> int:
+    return round(epoch_seconds(ts) * 1000)
+
+
+class _Sampler:
+    """Time buckets of equal width over [start, end]; points are fed in timestamp order."""
+
+    def __init__(self, start: datetime, end: datetime, buckets: int):
+        self.t0 = epoch_seconds(start)
+        self.buckets = max(1, buckets)
+        self.width = (epoch_seconds(end) - self.t0) / self.buckets or 1.0
+        self.out = []
+
+    def bucket(self, t: float) -> int:
+        return min(max(int((t - self.t0) / self.width), 0), self.buckets - 1)
+
+
+class LttbSampler(_Sampler):
+    """Streaming LTTB: a bucket is decided once the following non-empty bucket is complete."""
+
+    def __init__(self, start: datetime, end: datetime, max_points: int):
+        # The first and the last reading are always kept
+        super().__init__(start, end, max_points - 2)
+        self.max_points = max_points
+        self.current = []
+        self.current_bucket = None
+        self.following = []
+        self.following_bucket = None
+
+    def add(self, ts: datetime, value: float):
+        point = (epoch_seconds(ts), value, ts)
+        if not self.out:
+            self.out.append(point)
+            return
+        index = self.bucket(point[0])
+        if not self.following and (self.current_bucket is None or index == self.current_bucket):
+            self.current.append(point)
+            self.current_bucket = index
+        elif not self.following or index == self.following_bucket:
+            self.following.append(point)
+            self.following_bucket = index
+        else:
+            self._select(self.current, self._average(self.following))
+            self.current, self.current_bucket = self.following, self.following_bucket
+            self.following, self.following_bucket = [point], index
+
+    @staticmethod
+    def _average(points: list) -> tuple:
+        return sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points)
+
+    def _select(self, points: list, next_point: tuple):
+        """Keep the point of the bucket forming the largest triangle with the last kept one and next_point."""
+        at, av = self.out[-1][0], self.out[-1][1]
+        nt, nv = next_point[0], next_point[1]
+        self.out.append(max(points, key=lambda p: abs((at - nt) * (p[1] - av) - (at - p[0]) * (nv - av))))
+
+    def points(self) -> list:
+        if self.current or self.following:
+            last = (self.following or self.current).pop()
+            if self.current:
+                self._select(self.current, self._average(self.following) if self.following else last)
+            if self.following:
+                self._select(self.following, last)
+            self.out.append(last)
+            self.current, self.following = [], []
+        if len(self.out) > self.max_points:
+            # max_points < 3 leaves no bucket between the first and the last reading
+            self.out = [self.out[0], self.out[-1]][:self.max_points]
+        return [(ts, value) for _, value, ts in self.out]
+
+
+class MinMaxSampler(_Sampler):
+    """Lowest and highest reading of each bucket, in time order."""
+
+    def __init__(self, start: datetime, end: datetime, max_points: int):
+        super().__init__(start, end, max_points // 2)
+        self.max_points = max_points
+        self.current_bucket = None
+        self.low = None
+        self.high = None
+
+    def add(self, ts: datetime, value: float):
+        index = self.bucket(epoch_seconds(ts))
+        if index != self.current_bucket:
+            self._emit()
+            self.current_bucket = index
+            self.low = self.high = (ts, value)
+        elif value < self.low[1]:
+            self.low = (ts, value)
+        elif value > self.high[1]:
+            self.high = (ts, value)
+
+    def _emit(self):
+        if self.low is None:
+            return
+        if self.low is self.high:
+            self.out.append(self.low)
+        else:
+            self.out.extend(sorted((self.low, self.high), key=lambda p: p[0]))
+        self.low = self.high = None
+
+    def points(self) -> list:
+        self._emit()
+        # max_points = 1: a single bucket still has two extremes, keep the first
+        return self.out[:self.max_points]
+
+
+class AvgSampler(_Sampler):
+    """One point per bucket: avg as value, with min / max / last / count."""
+
+    def __init__(self, start: datetime, end: datetime, max_points: int):
+        super().__init__(start, end, max_points)
+        self.current_bucket = None
+        self.total = 0.0
+        self.count = 0
+        self.low = None
+        self.high = None
+        self.last = None
+
+    def add(self, ts: datetime, value: float):
+        index = self.bucket(epoch_seconds(ts))
+        if index != self.current_bucket:
+            self._emit()
+            self.current_bucket = index
+            self.low = self.high = value
+        else:
+            self.low = min(self.low, value)
+            self.high = max(self.high, value)
+        self.total += value
+        self.count += 1
+        self.last = value
+
+    def _emit(self):
+        if not self.count:
+            return
+        bucket_start = datetime.fromtimestamp(self.t0 + self.current_bucket * self.width, tz=timezone.utc)
+        self.out.append((bucket_start, self.total / self.count, self.low, self.high, self.last, self.count))
+        self.total = 0.0
+        self.count = 0
+
+    def points(self) -> list:
+        self._emit()
+        return self.out
+
+
+def merge_buckets(points: list, start: datetime, end: datetime, max_points: int) -> list:
+    """Merge rollup points (in time order) into at most max_points equal time buckets."""
+    sampler = _Sampler(start, end, max_points)
+    merged = []
+    current_bucket = None
+    for point in points:
+        index = sampler.bucket(epoch_seconds(point["timestamp"]))
+        if index != current_bucket:
+            current_bucket = index
+            merged.append(dict(point))
+            continue
+        target = merged[-1]
+        count = (target["count"] or 0) + (point["count"] or 0)
+        if count:
+            target["value"] = ((target["value"] or 0.0) * (target["count"] or 0) + (point["value"] or 0.0) * (point["count"] or 0)) / count
+        for key, pick in (("min", min), ("max", max)):
+            values = [v for v in (target[key], point[key]) if v is not None]
+            target[key] = pick(values) if values else None
+        target["last"] = point["last"]
+        target["count"] = count
+    return merged
+
+
+SAMPLERS = {
+    "lttb": LttbSampler,
+    "minmax": MinMaxSampler,
+    "avg": AvgSampler,
+}
+DOWNSAMPLE_METHODS = tuple(SAMPLERS)
+
+# Rows fetched per round trip of the server-side cursor (and per columnar chunk)
+STREAM_BATCH_SIZE = 5000
+
+HISTORY_FORMATS = ("json", "columnar", "binary")
+
+
+async def downsample_histories(db, sensor_ids: list, start: datetime, end: datetime, max_points: int, method: str) -> dict:
+    """Raw readings of several sensors, each reduced to at most max_points, in one streamed query: sensor_id -> points."""
+    samplers = {sensor_id: SAMPLERS[method](start, end, max_points) for sensor_id in sensor_ids}
+    query = select(models.SensorData.sensor_id, models.SensorData.timestamp, models.SensorData.value).where(
+        models.SensorData.sensor_id.in_(list(sensor_ids)),
+        models.SensorData.timestamp >= start,
+        models.SensorData.timestamp <= end
+    ).order_by(models.SensorData.sensor_id, models.SensorData.timestamp.asc()).execution_options(yield_per=STREAM_BATCH_SIZE)
+
+    result = await db.stream(query)
+    async for sensor_id, ts, value in result:
+        samplers[sensor_id].add(ts, value)
+
+    series = {}
+    for sensor_id, sampler in samplers.items():
+        if method == "avg":
+            series[sensor_id] = [
+                {"sensor_id": sensor_id, "timestamp": ts, "value": value, "min": low, "max": high, "last": last, "count": count}
+                for ts, value, low, high, last, count in sampler.points()
+            ]
+        else:
+            series[sensor_id] = [{"sensor_id": sensor_id, "timestamp": ts, "value": value} for ts, value in sampler.points()]
+    return series
+
+
+async def downsample_history(db, sensor_id: int, start: datetime, end: datetime, max_points: int, method: str) -> list:
+    """Raw readings of the range reduced to at most max_points with the given method."""
+    return (await downsample_histories(db, [sensor_id], start, end, max_points, method))[sensor_id]
+
+
+async def fetch_raw_histories(db, sensors: list, start: datetime, end: datetime) -> dict:
+    """Raw readings of several sensors in one query: sensor_id -> points (compressed sensors bracketed)."""
+    sensor_ids = [sensor.id for sensor in sensors]
+    result = await db.execute(
+        select(models.SensorData.sensor_id, models.SensorData.timestamp, models.SensorData.value, models.SensorData.quality).where(
+            models.SensorData.sensor_id.in_(sensor_ids),
+            models.SensorData.timestamp >= start,
+            models.SensorData.timestamp <= end
+        ).order_by(models.SensorData.sensor_id, models.SensorData.timestamp.asc())
+    )
+    series = {sensor_id: [] for sensor_id in sensor_ids}
+    for sensor_id, ts, value, quality in result.all():
+        series[sensor_id].append({"sensor_id": sensor_id, "timestamp": ts, "value": value, "quality": quality})
+
+    for sensor in sensors:
+        if (sensor.metadata_info or {}).get("storage"):
+            await bracket_compressed_history(db, sensor.id, series[sensor.id], start, end, as_point=sample_point)
+    return series
+
+
+RESOLUTION_NAMES = ("auto", "raw") + tuple(name for name, _, _ in RESOLUTIONS)
+
+
+async def fetch_histories(db, sensors: list, start: datetime, end: datetime, resolution: str = "auto",
+                          max_points: Optional[int] = None, method: Optional[str] = None) -> tuple:
+    """History of several sensors at one shared resolution. Returns (resolution name, sensor_id -> points).
+
+    With resolution "auto" the rows stay raw while every sensor fits in
+    max_points, as in the single-sensor endpoint.
+    """
+    sensor_ids = [sensor.id for sensor in sensors]
+    chosen = None
+    if resolution == "auto":
+        if max_points:
+            counts = await raw_row_counts(db, sensor_ids, start, end, max_points + 1)
+            if any(count > max_points for count in counts.values()):
+                chosen = pick_resolution(start, end, max_points)
+        if chosen and method:
+            return method, await downsample_histories(db, sensor_ids, start, end, max_points, method)
+    elif resolution != "raw":
+        chosen = next(r for r in RESOLUTIONS if r[0] == resolution)
+
+    if chosen:
+        return chosen[0], await fetch_rollups(db, sensor_ids, start, end, chosen, max_points if resolution == "auto" else None)
+    return "raw", await fetch_raw_histories(db, sensors, start, end)
+
+
+async def compressed_bracket(db, sensor_id: int, start: datetime, end: datetime) -> tuple:
+    """Stored samples right before and after the window of a compressed sensor.
+
+    The collector stores only the samples needed to rebuild the series (see
+    collector/compression.py). If nothing is stored after the window yet, the
+    collector still holds the tail and the last value is returned instead, as
+    a transient SensorData.
+    """
+    result = await db.execute(
+        select(models.SensorData).where(
+            models.SensorData.sensor_id == sensor_id,
+            models.SensorData.timestamp < start
+        ).order_by(desc(models.SensorData.timestamp)).limit(1)
+    )
+    before = result.scalar_one_or_none()
+
+    result = await db.execute(
+        select(models.SensorData).where(
+            models.SensorData.sensor_id == sensor_id,
+            models.SensorData.timestamp > end
+        ).order_by(models.SensorData.timestamp.asc()).limit(1)
+    )
+    after = result.scalar_one_or_none()
+    if after is not None:
+        return before, after
+
+    result = await db.execute(select(models.SensorLastValue).where(models.SensorLastValue.sensor_id == sensor_id))
+    last = result.scalar_one_or_none()
+    if last is not None and last.timestamp is not None:
+        after = models.SensorData(sensor_id=sensor_id, timestamp=last.timestamp, value=last.value, quality=last.quality)
+    return before, after
+
+
+def sample_point(row) -> dict:
+    return {"sensor_id": row.sensor_id, "timestamp": row.timestamp, "value": row.value, "quality": row.quality}
+
+
+async def bracket_compressed_history(db, sensor_id: int, data: list, start: datetime, end: datetime, as_point=None) -> list:
+    """Add the compressed_bracket samples around the ascending points of a compressed sensor.
+
+    Points are SensorData rows, or whatever as_point turns a row into (e.g. sample_point dicts).
+    """
+    convert = as_point or (lambda row: row)
+    last = data[-1] if data else None
+    last_timestamp = None if last is None else (last["timestamp"] if isinstance(last, dict) else last.timestamp)
+    before, after = await compressed_bracket(db, sensor_id, start, end)
+    if before is not None:
+        data.insert(0, convert(before))
+    if after is not None and (last_timestamp is None or after.timestamp > last_timestamp):
+        data.append(convert(after))
+    return data
+
+
+async def stream_raw_columns(sensor_id: int, start: datetime, end: datetime, bracket: bool = False):
+    """Raw rows of the range as {"t", "v", "q"} column chunks, read through a server-side cursor."""
+    # Own session: the request's one is closed before a streamed body is sent
+    async with AsyncSessionLocal() as db:
+        before = after = None
+        if bracket:
+            before, after = await compressed_bracket(db, sensor_id, start, end)
+        last_ts = None
+        if before is not None:
+            yield {"t": [epoch_ms(before.timestamp)], "v": [before.value], "q": [before.quality or 0]}
+            last_ts = before.timestamp
+
+        query = select(models.SensorData.timestamp, models.SensorData.value, models.SensorData.quality).where(
+            models.SensorData.sensor_id == sensor_id,
+            models.SensorData.timestamp >= start,
+            models.SensorData.timestamp <= end
+        ).order_by(models.SensorData.timestamp.asc()).execution_options(yield_per=STREAM_BATCH_SIZE)
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            yield {
+                "t": [epoch_ms(ts) for ts, _, _ in rows],
+                "v": [value for _, value, _ in rows],
+                "q": [quality or 0 for _, _, quality in rows]
+            }
+            last_ts = rows[-1][0]
+
+        if after is not None and (last_ts is None or after.timestamp > last_ts):
+            yield {"t": [epoch_ms(after.timestamp)], "v": [after.value], "q": [after.quality or 0]}
+
+
+def points_to_columns(points: list) -> dict:
+    """Bucketed / downsampled points (dicts) as one column chunk."""
+    columns = {"t": [epoch_ms(p["timestamp"]) for p in points], "v": [p["value"] for p in points]}
+    columns["q"] = [0] * len(points)
+    for field in ("min", "max", "last", "count"):
+        if points and field in points[0]:
+            columns[field] = [p[field] for p in points]
+    return columns
+
+
+def encode_columnar(columns: dict) -> bytes:
+    return (json.dumps(columns) + "\n").encode()
+
+
+# Column order and array typecode of the binary format (bucketed points only have the last four)
+BINARY_COLUMNS = (("t", "d"), ("v", "d"), ("q", "i"), ("min", "d"), ("max", "d"), ("last", "d"), ("count", "q"))
+ROLLUP_COLUMNS = ("min", "max", "last", "count")
+
+
+def encode_binary(columns: dict) -> bytes:
+    chunk = len(columns["t"]).to_bytes(4, "little")
+    for name, typecode in BINARY_COLUMNS:
+        if name not in columns:
+            continue
+        values = columns[name]
+        if typecode == "d":
+            values = [float("nan") if value is None else value for value in values]
+        packed = array(typecode, values)
+        if sys.byteorder != "little":
+            packed.byteswap()
+        chunk += packed.tobytes()
+    return chunk
+
+
+def columnar_response(chunks, output_format: str, resolution: str) -> StreamingResponse:
+    """Stream column chunks (an async iterator, or a list of points) in the columnar or binary format."""
+    encode = encode_binary if output_format == "binary" else encode_columnar
+
+    async def body():
+        if isinstance(chunks, list):
+            if chunks:
+                yield encode(points_to_columns(chunks))
+            return
+        async for columns in chunks:
+            yield encode(columns)
+
+    names = ["t", "v", "q"]
+    if isinstance(chunks, list) and chunks:
+        names += [name for name in ROLLUP_COLUMNS if name in chunks[0]]
+    media_type = "application/octet-stream" if output_format == "binary" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type, headers={
+        "X-History-Resolution": resolution,
+        "X-History-Columns": ",".join(names)
+    })
@@ -1,16 +1,36 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query, Request
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import desc, func
+from sqlalchemy import desc, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from .database import engine, Base, get_db, AsyncSessionLocal
 from . import models, schemas
+from .timescale import setup_timescale
+from .server_stats import ServerStatsSampler
+from .pagination import keyset_page, set_next_cursor
+from .topic_trie import TopicTrie
+from .mqtt_ingest import MqttIngest
+from .ws_fanout import ClientSender, FanoutStats, encode_message, get_websocket_config
+from .history import (
+    choose_resolution,
+    fetch_rollup,
+    fetch_histories,
+    downsample_history,
+    bracket_compressed_history,
+    columnar_response,
+    stream_raw_columns,
+    DOWNSAMPLE_METHODS,
+    HISTORY_FORMATS,
+    RESOLUTION_NAMES
+)
 import json
 import asyncio
 import logging
 import paho.mqtt.client as mqtt
 import os
 import secrets
+import time
 import traceback
 from typing import List, Dict, Set, Optional
 from contextlib import asynccontextmanager
@@ -43,45 +63,61 @@ class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
         self.subscriptions: Dict[WebSocket, Set[str]] = {}  # topic patterns per connection
+        self.topic_index = TopicTrie()  # topic pattern -> subscribed connections
+        self.unfiltered: Set[WebSocket] = set()  # connections without subscriptions (receive everything)
+        self.senders: Dict[WebSocket, ClientSender] = {}  # bounded send queue per connection
+        self.fanout_stats = FanoutStats()
+        self.config = get_websocket_config()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
         self.subscriptions[websocket] = set()
+        self.unfiltered.add(websocket)
+        self.senders[websocket] = ClientSender(
+            websocket, self.config["send_queue"], self.config["overflow"], self.fanout_stats, self.disconnect
+        )
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
         if websocket in self.subscriptions:
-            del self.subscriptions[websocket]
+            for pattern in self.subscriptions.pop(websocket):
+                self.topic_index.remove(pattern, websocket)
+        self.unfiltered.discard(websocket)
+        sender = self.senders.pop(websocket, None)
+        if sender:
+            sender.stop()
 
     async def subscribe(self, websocket: WebSocket, topics: List[str]):
         """Subscribe to MQTT topic patterns"""
         if websocket in self.subscriptions:
+            for pattern in set(topics) - self.subscriptions[websocket]:
+                self.topic_index.add(pattern, websocket)
             self.subscriptions[websocket].update(topics)
+            if self.subscriptions[websocket]:
+                self.unfiltered.discard(websocket)
             print(f"Subscribed to topics: {topics}")
 
-    def topic_matches(self, topic: str, pattern: str) -> bool:
-        """Check if topic matches pattern (supports MQTT wildcards)"""
-        if pattern == '*' or pattern == '#':
-            return True
-        
-        topic_parts = topic.split('/')
-        pattern_parts = pattern.split('/')
-        
-        for i, part in enumerate(pattern_parts):
-            if part == '#':
-                # # matches all remaining levels
-                return True
-            if part == '*':
-                # * matches exactly one level
-                if i >= len(topic_parts):
-                    return False
-                continue
-            if i >= len(topic_parts) or part != topic_parts[i]:
-                return False
-        
-        return len(topic_parts) == len(pattern_parts)
+    async def unsubscribe(self, websocket: WebSocket, topics: List[str]):
+        """Remove MQTT topic patterns (a client left without any receives everything again)"""
+        if websocket in self.subscriptions:
+            for pattern in set(topics) & self.subscriptions[websocket]:
+                self.topic_index.remove(pattern, websocket)
+            self.subscriptions[websocket].difference_update(topics)
+            if not self.subscriptions[websocket]:
+                self.unfiltered.add(websocket)
+            print(f"Unsubscribed from topics: {topics}")
+
+    def set_coalesce_window(self, websocket: WebSocket, window_ms: Optional[int]):
+        """Opt a connection into (or out of) latest-value batching"""
+        if window_ms is not None and not isinstance(window_ms, (int, float)):
+            print(f"Invalid coalescing window: {window_ms}")
+            return
+        sender = self.senders.get(websocket)
+        if sender:
+            sender.set_window(window_ms)
+            print(f"Coalescing window: {window_ms or 'off'} ms")
 
     async def broadcast_message(self, topic: str, data: dict):
         """Broadcast message to subscribed clients"""
@@ -90,30 +126,35 @@ class ConnectionManager:
             "payload": data
         }
         
-        to_remove = []
-        for connection in self.active_connections:
-            try:
-                # Check if client is subscribed to this topic
-                subscriptions = self.subscriptions.get(connection, set())
-                
-                # Always send if no subscriptions (default behavior)
-                should_send = len(subscriptions) == 0
-                
-                # Or send if any pattern matches
-                if not should_send:
-                    for pattern in subscriptions:
-                        if self.topic_matches(topic, pattern):
-                            should_send = True
-                            break
-                
-                if should_send:
-                    await connection.send_json(message)
-            except Exception as e:
-                print(f"Error sending message: {e}")
-                to_remove.append(connection)
+        # Always send if no subscriptions (default behavior), or if any pattern matches
+        recipients = self.unfiltered.union(self.topic_index.match(topic))
+        if not recipients:
+            return
         
-        for connection in to_remove:
-            self.disconnect(connection)
+        # Encoded once, queued to every recipient (each connection sends at its own pace)
+        frame = encode_message(message)
+        for connection in recipients:
+            sender = self.senders.get(connection)
+            if sender:
+                sender.enqueue(topic, frame)
+
+    async def broadcast_all(self, message: dict):
+        """Send a system-wide notification to every client, whatever its subscriptions"""
+        frame = encode_message(message)
+        for sender in list(self.senders.values()):
+            sender.enqueue(None, frame)
+
+    def get_stats(self) -> dict:
+        """Send queue depth and drop counters"""
+        clients = [sender.to_dict() for sender in self.senders.values()]
+        return {
+            "overflow": self.config["overflow"],
+            "send_queue": self.config["send_queue"],
+            "queued": sum(client["depth"] for client in clients),
+            "max_depth": max((client["depth"] for client in clients), default=0),
+            **self.fanout_stats.to_dict(),
+            "clients": clients
+        }
 
     async def broadcast_sensor_data(self, data: dict):
         """Legacy method - broadcasts sensor data from MQTT"""
@@ -144,52 +185,83 @@ class ConnectionManager:
             "unit": data.get("unit")
         })
 
+# Sliding window of the MQTT message rates
+RATE_WINDOW_S = 60
+
+class RateCounter:
+    """Messages per second over the last RATE_WINDOW_S, as a ring of per-second buckets"""
+    __slots__ = ("counts", "seconds", "started")
+
+    def __init__(self, now: float):
+        self.counts = [0] * RATE_WINDOW_S
+        self.seconds = [-1] * RATE_WINDOW_S  # epoch second each bucket currently counts
+        self.started = now
+
+    def record(self, now: float):
+        second = int(now)
+        slot = second % RATE_WINDOW_S
+        if self.seconds[slot] != second:
+            self.seconds[slot] = second
+            self.counts[slot] = 0
+        self.counts[slot] += 1
+
+    def rate(self, now: float) -> float:
+        oldest = int(now) - RATE_WINDOW_S
+        count = sum(c for c, second in zip(self.counts, self.seconds) if second > oldest)
+        # A counter younger than the window is averaged over its own age
+        elapsed = min(RATE_WINDOW_S, max(1.0, now - self.started))
+        return count / elapsed
+
 # MQTT Statistics Tracker
 class MQTTStats:
     def __init__(self):
         self.machines: Set[str] = set()
         self.sensors: Set[str] = set()
         self.total_messages: int = 0
-        self.message_timestamps: List[float] = []
-        self.last_clear_time: float = 0
+        self.rate = RateCounter(time.time())
+        self.machine_rates: Dict[str, RateCounter] = {}
+        self.sensor_rates: Dict[tuple, RateCounter] = {}  # (machine_code, sensor_code) -> rate
     
     def record_message(self, machine_code: str, plc_code: str, sensor_code: str):
         """Record incoming MQTT message"""
-        import time
         current_time = time.time()
         
         # Add machine and sensor
         if machine_code:
             self.machines.add(machine_code)
+            if machine_code not in self.machine_rates:
+                self.machine_rates[machine_code] = RateCounter(current_time)
+            self.machine_rates[machine_code].record(current_time)
         if sensor_code:
             self.sensors.add(sensor_code)
+            key = (machine_code, sensor_code)
+            if key not in self.sensor_rates:
+                self.sensor_rates[key] = RateCounter(current_time)
+            self.sensor_rates[key].record(current_time)
         
-        # Record message timestamp
+        # Record message in the current second's bucket
         self.total_messages += 1
-        self.message_timestamps.append(current_time)
-        
-        # Keep only last 60 seconds of timestamps for msg/s calculation
-        cutoff_time = current_time - 60
-        self.message_timestamps = [ts for ts in self.message_timestamps if ts > cutoff_time]
+        self.rate.record(current_time)
     
     def get_messages_per_second(self) -> float:
         """Calculate messages per second in the last 60 seconds"""
-        import time
-        if not self.message_timestamps:
-            return 0.0
-        
-        current_time = time.time()
-        cutoff_time = current_time - 60
-        recent_messages = [ts for ts in self.message_timestamps if ts > cutoff_time]
-        
-        if len(recent_messages) < 2:
-            return 0.0
-        
-        time_span = recent_messages[-1] - recent_messages[0]
-        if time_span < 1:
-            return float(len(recent_messages))
-        
-        return len(recent_messages) / time_span
+        return self.rate.rate(time.time())
+    
+    def get_rates(self, machine_code: Optional[str] = None) -> dict:
+        """Messages per second per machine and per sensor in the last 60 seconds"""
+        now = time.time()
+        machines = {}
+        for code, counter in self.machine_rates.items():
+            if machine_code is None or code == machine_code:
+                machines[code] = {"messages_per_second": round(counter.rate(now), 3), "sensors": {}}
+        for (machine, sensor), counter in self.sensor_rates.items():
+            if machine in machines:
+                machines[machine]["sensors"][sensor] = round(counter.rate(now), 3)
+        return {
+            "window_s": RATE_WINDOW_S,
+            "messages_per_second": round(self.rate.rate(now), 2),
+            "machines": machines
+        }
     
     def get_stats(self) -> dict:
         """Get current statistics"""
@@ -203,6 +275,13 @@ class MQTTStats:
 mqtt_message_stats = MQTTStats()
 manager = ConnectionManager()
 
+# Snapshot served by /api/server/status, refreshed in the background
+server_stats = ServerStatsSampler(AsyncSessionLocal)
+
+# sensor_logs totals per severity, kept by the collector (sensor_log_counters) and
+# received on LOG_COUNTS_TOPIC; None until the first message or DB read
+log_counts: Optional[Dict[str, int]] = None
+
 import yaml
 
 # MQTT Setup
@@ -253,39 +332,63 @@ if hasattr(mqtt, 'CallbackAPIVersion'):
 else:
     mqtt_client = mqtt.Client()
 
-# Global loop reference for threadsafe calls
-app_loop = None
+# Topic the collector listens on to reload a sensor's severity config
+SEVERITY_CONFIG_TOPIC = "config/severity"
+
+# Topic the collector publishes the sensor_logs totals per severity on (retained)
+LOG_COUNTS_TOPIC = "system/log_counts"
 
 def on_connect(client, userdata, flags, reason_code, properties):
     print(f"Connected to MQTT with result code {reason_code}")
     client.subscribe("machines/#")
+    client.subscribe(LOG_COUNTS_TOPIC)
+
+async def update_log_counts(totals: Dict[str, int]):
+    """Apply new sensor_logs totals; push the critical count to every WebSocket client when it changes"""
+    global log_counts
+    previous = log_counts or {}
+    log_counts = dict(previous)
+    for severity, total in totals.items():
+        # Totals only grow; MQTT messages and API inserts may arrive out of order
+        log_counts[severity] = max(total, previous.get(severity, 0))
+    critical = log_counts.get("CRITICAL", 0)
+    if critical != previous.get("CRITICAL"):
+        await manager.broadcast_all({
+            "type": "critical_count",
+            "topic": LOG_COUNTS_TOPIC,
+            "payload": {"count": critical, "severity": "CRITICAL", "totals": log_counts}
+        })
+
+async def handle_mqtt_message(topic: str, raw_payload: bytes):
+    """Process one MQTT message on the event loop (drained from mqtt_ingest)"""
+    payload = json.loads(raw_payload.decode())
+
+    if topic == LOG_COUNTS_TOPIC:
+        await update_log_counts(payload.get("totals", {}))
+        return
+    
+    # Record MQTT statistics
+    # Support both "machine_code" and "machine" field names
+    machine_code = payload.get("machine_code", payload.get("machine", ""))
+    plc_code = payload.get("plc_code", payload.get("plc", ""))
+    sensor_code = payload.get("sensor_code", payload.get("sensor", ""))
+    mqtt_message_stats.record_message(machine_code, plc_code, sensor_code)
+    
+    # Log for debugging (optional, can be noisy)
+    # print(f"MQTT Message received: {payload}")
+    await manager.broadcast_sensor_data(payload)
+
+# Messages cross from paho's network thread to the event loop in batches
+mqtt_ingest = MqttIngest(handle_mqtt_message)
 
 def on_message(client, userdata, msg):
-    try:
-        payload = json.loads(msg.payload.decode())
-        
-        # Record MQTT statistics
-        # Support both "machine_code" and "machine" field names
-        machine_code = payload.get("machine_code", payload.get("machine", ""))
-        plc_code = payload.get("plc_code", payload.get("plc", ""))
-        sensor_code = payload.get("sensor_code", payload.get("sensor", ""))
-        mqtt_message_stats.record_message(machine_code, plc_code, sensor_code)
-        
-        # Log for debugging (optional, can be noisy)
-        # print(f"MQTT Message received: {payload}")
-        if app_loop and app_loop.is_running():
-            asyncio.run_coroutine_threadsafe(manager.broadcast_sensor_data(payload), app_loop)
-    except Exception as e:
-        print(f"Error processing MQTT message: {e}")
+    mqtt_ingest.put(msg.topic, msg.payload)
 
 mqtt_client.on_connect = on_connect
 mqtt_client.on_message = on_message
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global app_loop
-    app_loop = asyncio.get_running_loop()
-    
     # Version banner
     logger.info(f"🚀 Industrial IoT Backend v{VERSION}")
     
@@ -305,6 +408,16 @@ async def lifespan(app: FastAPI):
             else:
                 print("❌ Could not connect to database after multiple retries.")
                 raise e
+
+    # Hypertables, compression and retention for sensor_data / sensor_logs (no-op without TimescaleDB)
+    await setup_timescale(engine)
+
+    # /api/server/status is served from this snapshot
+    stats_task = asyncio.create_task(server_stats.run())
+    
+    # Drains the messages handed over by the MQTT network thread (bound before the client connects)
+    mqtt_ingest.start(asyncio.get_running_loop())
+    ingest_task = asyncio.create_task(mqtt_ingest.run())
     
     # Start MQTT
     try:
@@ -317,7 +430,9 @@ async def lifespan(app: FastAPI):
         
     yield
     
+    stats_task.cancel()
     mqtt_client.loop_stop()
+    ingest_task.cancel()
     await log_system_event("INFO", "SYSTEM", "Backend shutting down")
 
 app = FastAPI(title="Industrial IoT Backend", version=VERSION, lifespan=lifespan)
@@ -415,6 +530,14 @@ async def mqtt_stats(db: AsyncSession = Depends(get_db)):
             "timestamp": None
         }
 
+@app.get("/api/mqtt/rates")
+async def mqtt_rates(machine_code: Optional[str] = None):
+    """
+    Messages per second received over MQTT in the last 60 seconds,
+    per machine and per sensor (optionally for one machine).
+    """
+    return mqtt_message_stats.get_rates(machine_code)
+
 @app.get("/api/version")
 async def version():
     return {"version": VERSION}
@@ -530,158 +653,17 @@ async def save_data_config(body: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def get_collector_ip() -> str:
-    """Get the IP address of the host machine"""
-    import socket
-    import os as os_module
-    try:
-        # First, try to get from environment variable
-        env_ip = os_module.getenv("HOST_IP")
-        if env_ip and env_ip != "localhost" and env_ip != "127.0.0.1":
-            return env_ip
-        
-        # If not in env, try to get from request headers or docker host
-        # Get hostname and resolve it
-        hostname = socket.gethostname()
-        
-        # Try to get all IP addresses for this hostname
-        try:
-            all_ips = socket.gethostbyname_ex(hostname)[2]
-            # Filter out localhost and docker internal IPs
-            for ip in all_ips:
-                if ip != "127.0.0.1" and not ip.startswith("172."):
-                    return ip
-        except:
-            pass
-        
-        # Fallback: use the socket connection method but be aware it might be container IP
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        
-        # If we got a 172.x.x.x (docker bridge), try to get host IP from gateway
-        if ip.startswith("172."):
-            try:
-                import subprocess
-                result = subprocess.run(["ip", "route"], capture_output=True, text=True)
-                for line in result.stdout.split('\n'):
-                    if 'default via' in line:
-                        parts = line.split()
-                        if len(parts) >= 3:
-                            return parts[2]  # Return gateway IP (host IP)
-            except:
-                pass
-        
-        return ip
-    except Exception as e:
-        print(f"Error getting IP: {e}")
-        return "unknown"
-
-
 @app.get("/api/server/status")
-async def get_server_status(db: AsyncSession = Depends(get_db)):
+async def get_server_status():
     import platform
-    import time
     import os as os_module
-    import psutil
-    from sqlalchemy import func
     
-    # Get system info with psutil
-    try:
-        if hasattr(os_module, 'getloadavg'):
-            load_avg = os_module.getloadavg()
-        else:
-            load_avg = [0, 0, 0]
-    except:
-        load_avg = [0, 0, 0]
-    
-    # Get CPU model from /proc/cpuinfo (from host)
-    cpu_model = "Unknown"
-    try:
-        proc_path = '/host/proc/cpuinfo' if os.path.exists('/host/proc/cpuinfo') else '/proc/cpuinfo'
-        with open(proc_path, 'r') as f:
-            for line in f:
-                if line.startswith('model name'):
-                    cpu_model = line.split(':', 1)[1].strip()
-                    break
-    except:
-        cpu_model = platform.processor() or "Unknown"
-    
-    # Get total system memory from /proc/meminfo (from host)
-    total_memory_host = 0
-    free_memory_host = 0
-    try:
-        proc_path = '/host/proc/meminfo' if os.path.exists('/host/proc/meminfo') else '/proc/meminfo'
-        with open(proc_path, 'r') as f:
-            meminfo = {}
-            for line in f:
-                parts = line.split(':', 1)
-                if len(parts) == 2:
-                    key, value = parts
-                    meminfo[key.strip()] = int(value.split()[0]) * 1024  # Convert KB to Bytes
-            
-            total_memory_host = meminfo.get('MemTotal', 0)
-            free_memory_host = meminfo.get('MemAvailable', meminfo.get('MemFree', 0))
-    except:
-        total_memory_host = 0
-        free_memory_host = 0
-    
-    # Get CPU and memory info from psutil (container view, for fallback)
-    try:
-        cpu_percent = psutil.cpu_percent(interval=0.1)
-        virtual_memory = psutil.virtual_memory()
-        
-        # Use host memory if available, otherwise use container memory
-        if total_memory_host > 0:
-            total_memory = total_memory_host
-            free_memory = free_memory_host
-            used_memory = total_memory - free_memory
-            memory_percent = (used_memory / total_memory * 100) if total_memory > 0 else 0
-        else:
-            total_memory = virtual_memory.total
-            free_memory = virtual_memory.available
-            used_memory = virtual_memory.used
-            memory_percent = virtual_memory.percent
-    except:
-        cpu_percent = 0
-        total_memory = total_memory_host if total_memory_host > 0 else 0
-        free_memory = free_memory_host if free_memory_host > 0 else 0
-        used_memory = total_memory - free_memory if total_memory > 0 else 0
-        memory_percent = 0
-    
-    # Get process info
-    try:
-        process = psutil.Process()
-        process_memory = process.memory_info()
-        heap_used = process_memory.rss
-        heap_total = total_memory
-        external = 0
-        rss = process_memory.rss
-    except:
-        heap_used = 0
-        heap_total = 0
-        external = 0
-        rss = 0
-    
-    # Get system uptime
-    try:
-        boot_time = psutil.boot_time()
-        system_uptime = int(time.time() - boot_time)
-    except:
-        system_uptime = int(time.time())
+    # Host metrics, row estimate and collector IP come from the background sampler snapshot
+    stats = await server_stats.get()
     
     # Check MQTT connection
     mqtt_connected = mqtt_client.is_connected() if hasattr(mqtt_client, 'is_connected') else False
-    
-    # Count total records in sensor_data table
-    total_records = 0
-    try:
-        result = await db.execute(select(func.count(models.SensorData.id)))
-        total_records = result.scalar() or 0
-    except Exception as e:
-        print(f"Error counting records: {e}")
-        total_records = 0
+    mqtt_stats = mqtt_message_stats.get_stats()
     
     return {
         "server": {
@@ -691,36 +673,21 @@ async def get_server_status(db: AsyncSession = Depends(get_db)):
             "platform": platform.system(),
             "arch": platform.machine(),
             "hostname": platform.node(),
-            "uptime": system_uptime,
+            "uptime": stats["uptime"],
             "startTime": __import__('datetime').datetime.now().isoformat()
         },
-        "system": {
-            "cpuCount": os_module.cpu_count() if hasattr(os_module, 'cpu_count') else 1,
-            "cpuUsage": cpu_percent,
-            "cpuModel": cpu_model,
-            "totalMemory": total_memory,
-            "freeMemory": free_memory,
-            "usedMemory": used_memory,
-            "memoryUsage": memory_percent,
-            "systemUptime": system_uptime,
-            "loadAverage": list(load_avg)
-        },
-        "process": {
-            "pid": os_module.getpid(),
-            "heapUsed": heap_used,
-            "heapTotal": heap_total,
-            "external": external,
-            "rss": rss
-        },
+        "system": stats["system"],
+        "process": stats["process"],
         "mqtt": {
             "status": "online" if mqtt_connected else "offline",
             "connected": mqtt_connected,
             "broker": f"{MQTT_HOST}:{MQTT_PORT}",
             "topic": "machines/#",
-            "machines": mqtt_message_stats.get_stats()["machines"],
-            "sensors": mqtt_message_stats.get_stats()["sensors"],
-            "totalMessages": mqtt_message_stats.get_stats()["total_messages"],
-            "messagesPerSecond": mqtt_message_stats.get_stats()["messages_per_second"]
+            "machines": mqtt_stats["machines"],
+            "sensors": mqtt_stats["sensors"],
+            "totalMessages": mqtt_stats["total_messages"],
+            "messagesPerSecond": mqtt_stats["messages_per_second"],
+            "ingest": mqtt_ingest.to_dict()
         },
         "database": {
             "status": "online",
@@ -729,7 +696,7 @@ async def get_server_status(db: AsyncSession = Depends(get_db)):
             "port": int(os_module.getenv("DATABASE_PORT", 5432)),
             "name": os_module.getenv("DATABASE_NAME", "industrial"),
             "user": os_module.getenv("DATABASE_USER", "backend"),
-            "total_records": total_records
+            "total_records": stats["total_records"]
         },
         "collector": {
             "status": "online",
@@ -737,32 +704,37 @@ async def get_server_status(db: AsyncSession = Depends(get_db)):
             "host": os_module.getenv("COLLECTOR_HOST", "collector"),
             "port": int(os_module.getenv("COLLECTOR_PORT", 8001)),
             "enabled": True,
-            "ip": await get_collector_ip()
+            "ip": stats["collector_ip"]
         },
         "connections": {
-            "websocketClients": len(manager.active_connections) if manager else 0
+            "websocketClients": len(manager.active_connections) if manager else 0,
+            "websocket": manager.get_stats()
         }
     }
 
 @app.get("/api/logs", response_model=List[schemas.SystemLog], dependencies=[Depends(get_current_user)])
 async def get_logs(
+    response: Response,
     level: Optional[str] = None,
     source: Optional[str] = None,
     limit: int = 100,
     skip: int = 0,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    query = select(models.SystemLog).order_by(desc(models.SystemLog.timestamp))
+    query = select(models.SystemLog)
     
     if level:
         query = query.where(models.SystemLog.level == level)
     if source:
         query = query.where(models.SystemLog.source == source)
         
-    query = query.offset(skip).limit(limit)
+    query = keyset_page(query, models.SystemLog.timestamp, models.SystemLog.id, cursor, skip, limit)
     
     result = await db.execute(query)
-    return result.scalars().all()
+    logs = result.scalars().all()
+    set_next_cursor(response, logs, limit)
+    return logs
 
 @app.get("/api/export/configuration", response_model=schemas.ConfigurationExport, dependencies=[Depends(get_current_user)])
 async def export_configuration(db: AsyncSession = Depends(get_db)):
@@ -1073,6 +1045,7 @@ async def get_sensors_with_mqtt_topics(
 
 @app.get("/api/sensors/logs", response_model=List[schemas.SensorLogResponse])
 async def get_sensor_logs(
+    response: Response,
     sensor_id: Optional[int] = None,
     machine_id: Optional[int] = None,
     severity: Optional[str] = None,
@@ -1080,6 +1053,7 @@ async def get_sensor_logs(
     end_date: Optional[str] = None,
     limit: int = 20,
     skip: int = 0,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -1092,7 +1066,8 @@ async def get_sensor_logs(
     - start_date: fecha inicio (ISO 8601 string)
     - end_date: fecha fin (ISO 8601 string)
     - limit: registros por página (default: 20, máximo: 100)
-    - skip: número de registros a saltar
+    - skip: número de registros a saltar (compatibilidad, preferir cursor)
+    - cursor: página siguiente, tomado del header X-Next-Cursor de la respuesta anterior
     """
     # Limitar el máximo de registros
     limit = min(limit, 100)
@@ -1135,14 +1110,12 @@ async def get_sensor_logs(
     if end_dt:
         query = query.where(models.SensorLog.timestamp <= end_dt)
     
-    # Ordenar por timestamp descendente (más recientes primero)
-    query = query.order_by(desc(models.SensorLog.timestamp))
-    
-    # Aplicar paginación
-    query = query.offset(skip).limit(limit)
+    # Más recientes primero, paginación por cursor (timestamp, id)
+    query = keyset_page(query, models.SensorLog.timestamp, models.SensorLog.id, cursor, skip, limit)
     
     result = await db.execute(query)
     rows = result.all()
+    set_next_cursor(response, [row[0] for row in rows], limit)
     
     logs_response = []
     for row in rows:
@@ -1157,6 +1130,9 @@ async def get_sensor_logs(
             variation_percent=log.variation_percent,
             severity=log.severity,
             unit=log.unit,
+            window_min=log.window_min,
+            window_max=log.window_max,
+            sample_count=log.sample_count,
             created_at=log.timestamp,
             sensor_code=row[1],
             sensor_name=row[2],
@@ -1171,15 +1147,14 @@ async def get_sensor_logs(
 async def get_critical_alarms_count(db: AsyncSession = Depends(get_db)):
     """
     Obtener el número total de alarmas CRITICAL activas.
-    Se usa para mostrar un badge en el sidebar.
+    Se usa para mostrar un badge en el sidebar (también se envía por WebSocket al cambiar).
     """
     try:
-        # Contar logs con severity CRITICAL
-        query = select(func.count(models.SensorLog.id)).where(
-            models.SensorLog.severity == "CRITICAL"
-        )
-        result = await db.execute(query)
-        count = result.scalar() or 0
+        # Contador mantenido por el collector (sensor_log_counters), sin count(*) sobre sensor_logs
+        if log_counts is None:
+            result = await db.execute(select(models.SensorLogCounter.severity, models.SensorLogCounter.total))
+            await update_log_counts({severity: total for severity, total in result.all()})
+        count = log_counts.get("CRITICAL", 0)
         
         return {"count": count, "severity": "CRITICAL"}
     except Exception as e:
@@ -1201,8 +1176,18 @@ async def create_sensor_log(
     
     db_log = models.SensorLog(**log_dict)
     db.add(db_log)
+
+    # Mantener sensor_log_counters en la misma transacción
+    stmt = pg_insert(models.SensorLogCounter.__table__).values(severity=db_log.severity or "INFO", total=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["severity"],
+        set_={"total": models.SensorLogCounter.__table__.c.total + 1, "updated_at": func.now()}
+    ).returning(models.SensorLogCounter.severity, models.SensorLogCounter.total)
+    result = await db.execute(stmt)
+    totals = {severity: total for severity, total in result.all()}
     await db.commit()
     await db.refresh(db_log)
+    await update_log_counts(totals)
     return db_log
 
 @app.get("/api/sensors/{sensor_id}", response_model=schemas.Sensor)
@@ -1213,42 +1198,112 @@ async def get_sensor(sensor_id: int, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Sensor not found")
     return sensor
 
+@app.post("/api/sensors/history:batch", response_model=schemas.SensorHistoryBatchResponse)
+async def get_sensors_history_batch(request: schemas.SensorHistoryBatchRequest, db: AsyncSession = Depends(get_db)):
+    """History of several sensors (ids or codes) in one request, grouped by sensor"""
+    if request.resolution not in RESOLUTION_NAMES:
+        raise HTTPException(status_code=400, detail=f"Invalid resolution. Must be one of: {', '.join(RESOLUTION_NAMES)}")
+    if request.method is not None and request.method not in DOWNSAMPLE_METHODS:
+        raise HTTPException(status_code=400, detail=f"Invalid method. Must be one of: {', '.join(DOWNSAMPLE_METHODS)}")
+
+    start, end = request.start, request.end
+    if start is None or end is None:
+        end = datetime.utcnow()
+        start = end - timedelta(hours=request.hours)
+
+    ids, codes = set(), set()
+    for identifier in request.sensors:
+        try:
+            ids.add(int(identifier))
+        except ValueError:
+            codes.add(identifier)
+    result = await db.execute(select(models.Sensor).where(or_(models.Sensor.id.in_(ids), models.Sensor.code.in_(codes))))
+    sensors = result.scalars().all()
+
+    found = {str(sensor.id) for sensor in sensors} | {sensor.code for sensor in sensors}
+    missing = [str(identifier) for identifier in request.sensors if str(identifier) not in found]
+    if not sensors:
+        return {"resolution": request.resolution, "series": [], "missing": missing}
+
+    resolution, series = await fetch_histories(
+        db, sensors, start, end, request.resolution, request.max_points, request.method
+    )
+    return {
+        "resolution": resolution,
+        "series": [
+            {"sensor_id": sensor.id, "sensor_code": sensor.code, "unit": sensor.unit, "points": series[sensor.id]}
+            for sensor in sensors
+        ],
+        "missing": missing
+    }
+
 @app.get("/api/sensors/{sensor_identifier}/history")
 async def get_sensor_history(
     sensor_identifier: str,
+    response: Response,
     start: Optional[datetime] = Query(None, alias="from"),
     end: Optional[datetime] = Query(None, alias="to"),
     hours: int = Query(6),
+    max_points: Optional[int] = Query(None, ge=1),
+    method: Optional[str] = Query(None),
+    output_format: str = Query("json", alias="format"),
     db: AsyncSession = Depends(get_db)
 ):
+    if method is not None and method not in DOWNSAMPLE_METHODS:
+        raise HTTPException(status_code=400, detail=f"Invalid method. Must be one of: {', '.join(DOWNSAMPLE_METHODS)}")
+    if output_format not in HISTORY_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {', '.join(HISTORY_FORMATS)}")
+
     # If start/end not provided, use hours parameter
     if start is None or end is None:
         end = datetime.utcnow()
         start = end - timedelta(hours=hours)
     
     # Support both numeric ID and sensor code
-    sensor_id = None
-    
     try:
-        # Try to parse as numeric ID
-        sensor_id = int(sensor_identifier)
-        query = select(models.SensorData).where(
-            models.SensorData.sensor_id == sensor_id,
-            models.SensorData.timestamp >= start,
-            models.SensorData.timestamp <= end
-        ).order_by(models.SensorData.timestamp.asc())
+        sensor_filter = models.Sensor.id == int(sensor_identifier)
     except ValueError:
-        # Use as sensor code string
-        query = select(models.SensorData).join(
-            models.Sensor
-        ).where(
-            models.Sensor.code == sensor_identifier,
-            models.SensorData.timestamp >= start,
-            models.SensorData.timestamp <= end
-        ).order_by(models.SensorData.timestamp.asc())
+        sensor_filter = models.Sensor.code == sensor_identifier
+    result = await db.execute(select(models.Sensor).where(sensor_filter))
+    sensor = result.scalar_one_or_none()
+    if not sensor:
+        return []
+
+    # Long ranges: one point per 1m / 15m / 1h bucket instead of every raw row, or the raw
+    # rows downsampled with the requested method (see history.py)
+    resolution = await choose_resolution(db, sensor.id, start, end, max_points)
+    if resolution and method:
+        points, resolution_name = await downsample_history(db, sensor.id, start, end, max_points, method), method
+    elif resolution:
+        points, resolution_name = await fetch_rollup(db, sensor.id, start, end, resolution, max_points), resolution[0]
+    else:
+        points, resolution_name = None, "raw"
+
+    if output_format != "json":
+        # Columnar / binary: raw rows are streamed from a server-side cursor, chunk by chunk
+        if points is None:
+            compressed = bool((sensor.metadata_info or {}).get("storage"))
+            points = stream_raw_columns(sensor.id, start, end, bracket=compressed)
+        return columnar_response(points, output_format, resolution_name)
+
+    response.headers["X-History-Resolution"] = resolution_name
+    if points is not None:
+        return points
+
+    query = select(models.SensorData).where(
+        models.SensorData.sensor_id == sensor.id,
+        models.SensorData.timestamp >= start,
+        models.SensorData.timestamp <= end
+    ).order_by(models.SensorData.timestamp.asc())
     
     result = await db.execute(query)
     data = result.scalars().all()
+
+    if (sensor.metadata_info or {}).get("storage"):
+        # Compressed sensor: the collector stores only the samples needed to rebuild the
+        # series (see collector/compression.py), so add the stored samples bracketing the
+        # window, or the current value if none follows yet, so the series covers it
+        data = await bracket_compressed_history(db, sensor.id, list(data), start, end)
     return data
 
 # Configuration Management Helpers
@@ -1355,13 +1410,20 @@ async def websocket_endpoint(websocket: WebSocket):
                 if isinstance(topics, str):
                     topics = [topics]
                 await manager.subscribe(websocket, topics)
+                if "coalesce_ms" in data:
+                    manager.set_coalesce_window(websocket, data["coalesce_ms"])
+            
+            # Handle latest-value batching: {"action": "coalesce", "window_ms": 250} (0 = off)
+            elif data.get("action") == "coalesce":
+                window_ms = data.get("window_ms", manager.config["coalesce_window_ms"])
+                manager.set_coalesce_window(websocket, window_ms)
             
             # Handle unsubscription messages
             elif data.get("action") == "unsubscribe":
                 topics = data.get("topic") or data.get("sensors") or data.get("topics", [])
                 if isinstance(topics, str):
                     topics = [topics]
-                # TODO: implement unsubscribe if needed
+                await manager.unsubscribe(websocket, topics)
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -1373,11 +1435,13 @@ async def websocket_endpoint(websocket: WebSocket):
 
 @app.get("/api/alarms", response_model=List[schemas.MachineAlarmResponse])
 async def get_all_alarms(
+    response: Response,
     machine_code: Optional[str] = None,
     severity: Optional[str] = None,
     status: Optional[int] = None,
     limit: int = 100,
     skip: int = 0,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -1385,6 +1449,7 @@ async def get_all_alarms(
     - machine_code: filtrar por máquina
     - severity: filtrar por severidad (high, critical, medium, low)
     - status: filtrar por estado (1=activa, 0=inactiva)
+    - cursor: página siguiente, tomado del header X-Next-Cursor de la respuesta anterior
     """
     query = select(
         models.MachineAlarm,
@@ -1396,7 +1461,7 @@ async def get_all_alarms(
         models.Machine, models.MachineAlarm.machine_id == models.Machine.id
     ).join(
         models.Sensor, models.MachineAlarm.sensor_id == models.Sensor.id, isouter=True  # LEFT JOIN para sensor_id nullable
-    ).order_by(desc(models.MachineAlarm.timestamp_on))
+    )
     
     if machine_code:
         query = query.where(models.Machine.code == machine_code)
@@ -1405,10 +1470,11 @@ async def get_all_alarms(
     if status is not None:
         query = query.where(models.MachineAlarm.status == status)
     
-    query = query.offset(skip).limit(limit)
+    query = keyset_page(query, models.MachineAlarm.timestamp_on, models.MachineAlarm.id, cursor, skip, limit)
     
     result = await db.execute(query)
     rows = result.all()
+    set_next_cursor(response, [row[0] for row in rows], limit, "timestamp_on")
     
     alarms_response = []
     for row in rows:
@@ -1495,9 +1561,11 @@ async def get_active_alarms(
 @app.get("/api/machines/{machine_id}/alarms", response_model=List[schemas.MachineAlarmHistory])
 async def get_machine_alarms(
     machine_id: int,
+    response: Response,
     status: Optional[int] = None,
     limit: int = 100,
     skip: int = 0,
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -1505,15 +1573,16 @@ async def get_machine_alarms(
     """
     query = select(models.MachineAlarm).where(
         models.MachineAlarm.machine_id == machine_id
-    ).order_by(desc(models.MachineAlarm.timestamp_on))
+    )
     
     if status is not None:
         query = query.where(models.MachineAlarm.status == status)
     
-    query = query.offset(skip).limit(limit)
+    query = keyset_page(query, models.MachineAlarm.timestamp_on, models.MachineAlarm.id, cursor, skip, limit)
     
     result = await db.execute(query)
     alarms = result.scalars().all()
+    set_next_cursor(response, alarms, limit, "timestamp_on")
     
     alarms_history = []
     for alarm in alarms:
@@ -2081,6 +2150,12 @@ async def update_sensor_severity_config(
     
     await db.commit()
     await db.refresh(db_config)
+
+    # Notify the collector so it reloads this sensor's thresholds from its cache
+    try:
+        mqtt_client.publish(f"{SEVERITY_CONFIG_TOPIC}/{sensor_id}", json.dumps({"sensor_id": sensor_id}))
+    except Exception as e:
+        logger.warning(f"Could not notify severity config change for sensor {sensor_id}: {e}")
     
     return schemas.SensorSeverityConfigResponse(
         id=db_config.id,
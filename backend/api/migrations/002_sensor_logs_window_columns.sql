@@ -0,0 +1,14 @@
+-- Migration: Columnas de ventana en sensor_logs (logs colapsados por log_interval_seconds)
+-- Created: 2026-10-16
+
+BEGIN;
+
+ALTER TABLE sensor_logs ADD COLUMN IF NOT EXISTS window_min DOUBLE PRECISION;
+ALTER TABLE sensor_logs ADD COLUMN IF NOT EXISTS window_max DOUBLE PRECISION;
+ALTER TABLE sensor_logs ADD COLUMN IF NOT EXISTS sample_count INTEGER DEFAULT 1;
+
+COMMENT ON COLUMN sensor_logs.window_min IS 'Minimum value seen in the collapsed log window';
+COMMENT ON COLUMN sensor_logs.window_max IS 'Maximum value seen in the collapsed log window';
+COMMENT ON COLUMN sensor_logs.sample_count IS 'Number of log-worthy changes collapsed into this row';
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- Migration: Requests Modbus TCP en vuelo por PLC (pipelining opcional, 1 = serial)
+-- Created: 2026-10-16
+
+BEGIN;
+
+ALTER TABLE plcs ADD COLUMN IF NOT EXISTS max_inflight INTEGER DEFAULT 1;
+
+COMMENT ON COLUMN plcs.max_inflight IS 'Max outstanding Modbus TCP requests on the shared connection (1 = serial)';
+
+COMMIT;
@@ -0,0 +1,29 @@
+-- Migration: sensor_data y sensor_logs como hypertables de TimescaleDB
+-- Created: 2026-10-16
+--
+-- Requiere la imagen timescale/timescaledb (en PostgreSQL sin la extensión esta migration falla).
+-- create_hypertable(migrate_data => true) copia las filas existentes a chunks y bloquea la tabla:
+-- en tablas grandes ejecutar en una ventana de mantenimiento.
+-- Las políticas de compresión y retención se aplican desde settings.yml (timescale:) al iniciar la API.
+
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS timescaledb;
+
+-- La clave primaria debe incluir la columna de particionado
+ALTER TABLE sensor_data DROP CONSTRAINT IF EXISTS sensor_data_pkey;
+ALTER TABLE sensor_data ADD PRIMARY KEY (id, timestamp);
+SELECT create_hypertable('sensor_data', 'timestamp', chunk_time_interval => INTERVAL '1 day', migrate_data => true, if_not_exists => true);
+CREATE INDEX IF NOT EXISTS ix_sensor_data_sensor_id_timestamp ON sensor_data (sensor_id, timestamp DESC);
+ALTER TABLE sensor_data SET (timescaledb.compress, timescaledb.compress_segmentby = 'sensor_id', timescaledb.compress_orderby = 'timestamp DESC');
+
+-- sensor_logs.timestamp era nullable: rellenar las filas sin timestamp antes de la clave primaria
+UPDATE sensor_logs SET timestamp = now() WHERE timestamp IS NULL;
+ALTER TABLE sensor_logs ALTER COLUMN timestamp SET NOT NULL;
+ALTER TABLE sensor_logs DROP CONSTRAINT IF EXISTS sensor_logs_pkey;
+ALTER TABLE sensor_logs ADD PRIMARY KEY (id, timestamp);
+SELECT create_hypertable('sensor_logs', 'timestamp', chunk_time_interval => INTERVAL '1 day', migrate_data => true, if_not_exists => true);
+CREATE INDEX IF NOT EXISTS ix_sensor_logs_sensor_id_timestamp ON sensor_logs (sensor_id, timestamp DESC);
+ALTER TABLE sensor_logs SET (timescaledb.compress, timescaledb.compress_segmentby = 'sensor_id', timescaledb.compress_orderby = 'timestamp DESC');
+
+COMMIT;
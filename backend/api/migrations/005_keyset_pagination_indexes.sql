@@ -0,0 +1,19 @@
+-- Migration: Índices compuestos para paginación por cursor (timestamp DESC, id DESC)
+-- Created: 2026-10-16
+--
+-- /api/sensors/logs, /api/alarms, /api/machines/{id}/alarms y /api/logs paginan con
+-- cursor (timestamp, id): cada página es un range scan de uno de estos índices.
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS ix_sensor_logs_timestamp_id ON sensor_logs (timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_sensor_logs_sensor_id_timestamp_id ON sensor_logs (sensor_id, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_sensor_logs_machine_id_timestamp_id ON sensor_logs (machine_id, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_sensor_logs_severity_timestamp_id ON sensor_logs (severity, timestamp DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS ix_machine_alarms_timestamp_on_id ON machine_alarms (timestamp_on DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_machine_alarms_machine_id_timestamp_on_id ON machine_alarms (machine_id, timestamp_on DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS ix_system_logs_timestamp_id ON system_logs (timestamp DESC, id DESC);
+
+COMMIT;
@@ -0,0 +1,20 @@
+-- Migration: Contadores de sensor_logs por severidad (badge de alarmas críticas)
+-- Created: 2026-10-16
+--
+-- El collector incrementa sensor_log_counters en la misma transacción que inserta los logs,
+-- así /api/sensors/logs/critical/count no ejecuta count(*) sobre sensor_logs.
+-- El seed cuenta sensor_logs una sola vez (si se omite, el collector lo hace al iniciar).
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS sensor_log_counters (
+    severity VARCHAR PRIMARY KEY,
+    total BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+INSERT INTO sensor_log_counters (severity, total)
+SELECT severity, count(*) FROM sensor_logs WHERE severity IS NOT NULL GROUP BY severity
+ON CONFLICT (severity) DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,94 @@
+"""
+Handoff of MQTT messages from paho's network thread to the event loop.
+
+paho calls on_message on its own thread. Instead of scheduling one coroutine
+per message with run_coroutine_threadsafe (a cross-thread Future and a loop
+wakeup each), the thread only appends (topic, raw payload) to a deque and
+wakes the drain task when it is not already awake, so one wakeup carries
+every message that arrived meanwhile. Parsing, statistics and the WebSocket
+fan-out all run in the drain task on the event loop, so they need no locking.
+At most MAX_PENDING messages wait; beyond that new messages are dropped and
+counted. The drain yields to the loop every YIELD_EVERY messages so a burst
+does not hold up HTTP requests. start() must be called on the event loop
+before the MQTT client connects; messages received before that (none in
+practice) are buffered and drained once it runs.
+"""
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Awaitable, Callable
+
+logger = logging.getLogger("api")
+
+MAX_PENDING = 100000
+YIELD_EVERY = 500
+
+
+class MqttIngest:
+    def __init__(self, handler: Callable[[str, bytes], Awaitable[None]]):
+        self.handler = handler
+        self.pending = deque()
+        self.loop = None
+        self.wakeup = None
+        self._lock = threading.Lock()
+        self._signalled = False
+        self.received = 0
+        self.dropped = 0
+        self.batches = 0
+        self.max_batch = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Bind to the event loop (called on the loop, before the MQTT client connects)."""
+        with self._lock:
+            self.wakeup = asyncio.Event()
+            self.loop = loop
+            self._signalled = bool(self.pending)
+        if self._signalled:
+            self.wakeup.set()
+
+    def put(self, topic: str, payload: bytes):
+        """Called on the paho thread."""
+        if len(self.pending) >= MAX_PENDING:
+            self.dropped += 1
+            return
+        self.pending.append((topic, payload))
+        with self._lock:
+            # Not started yet: start() wakes the drain for the buffered messages
+            if self._signalled or self.loop is None:
+                return
+            self._signalled = True
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def run(self):
+        if self.loop is None:
+            self.start(asyncio.get_running_loop())
+        logger.info("📥 MQTT ingest started")
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            # Reset before draining: messages appended from here on signal again
+            with self._lock:
+                self._signalled = False
+            count = 0
+            while self.pending:
+                topic, payload = self.pending.popleft()
+                count += 1
+                try:
+                    await self.handler(topic, payload)
+                except Exception as e:
+                    print(f"Error processing MQTT message: {e}")
+                if count % YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+            self.received += count
+            self.batches += 1
+            self.max_batch = max(self.max_batch, count)
+
+    def to_dict(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "received": self.received,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "max_batch": self.max_batch
+        }
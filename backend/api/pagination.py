@@ -0,0 +1,48 @@
+"""
+Keyset (cursor) pagination for the timestamp-ordered listings.
+
+Pages are ordered by (timestamp DESC, id DESC) and a page starts right after
+the (timestamp, id) of the previous page's last row, so every page is a range
+scan of a composite index (see migrations/005_keyset_pagination_indexes.sql)
+instead of reading and discarding `skip` rows. The cursor of the next page is
+returned in the X-Next-Cursor response header (absent on the last page) and
+passed back as `cursor`; it is opaque to clients.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, Response
+from sqlalchemy import desc, tuple_
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    payload = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(payload)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_page(query, timestamp_column, id_column, cursor: Optional[str], skip: int, limit: int):
+    """Order newest first and apply the cursor (or the legacy skip when there is none)."""
+    query = query.order_by(desc(timestamp_column), desc(id_column))
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(timestamp_column, id_column) < tuple_(timestamp, row_id))
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def set_next_cursor(response: Response, items: list, limit: int, timestamp_attr: str = "timestamp"):
+    """Publish the cursor after the last item when the page is full."""
+    if len(items) == limit and items:
+        last = items[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(getattr(last, timestamp_attr), last.id)
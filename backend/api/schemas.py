@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Any, Dict
+from typing import List, Optional, Any, Dict, Union
 from datetime import datetime
 
 # ============= MACHINE CONFIGURATION FILE SCHEMAS =============
@@ -69,6 +69,7 @@ class PLCBase(BaseModel):
     port: Optional[int] = None
     unit_id: Optional[int] = None
     poll_interval_s: int = 1
+    max_inflight: Optional[int] = 1
     enabled: bool = True
 
 class PLCCreate(PLCBase):
@@ -89,6 +90,7 @@ class PLCUpdate(BaseModel):
     port: Optional[int] = None
     unit_id: Optional[int] = None
     poll_interval_s: Optional[int] = None
+    max_inflight: Optional[int] = None
     enabled: Optional[bool] = None
 
 # Sensor Schemas
@@ -149,6 +151,30 @@ class SensorData(BaseModel):
     unit: Optional[str]
     quality: int = 0
 
+# Batched history (POST /api/sensors/history:batch)
+class SensorHistoryBatchRequest(BaseModel):
+    sensors: List[Union[int, str]] = Field(..., description="Sensor ids or codes")
+    start: Optional[datetime] = Field(None, alias="from")
+    end: Optional[datetime] = Field(None, alias="to")
+    hours: int = 6
+    resolution: str = Field("auto", description="auto | raw | 1m | 15m | 1h")
+    max_points: Optional[int] = Field(None, ge=1, description="Per sensor, used by resolution auto")
+    method: Optional[str] = Field(None, description="lttb | minmax | avg, downsample raw rows instead of using rollups")
+
+    class Config:
+        populate_by_name = True
+
+class SensorHistorySeries(BaseModel):
+    sensor_id: int
+    sensor_code: str
+    unit: Optional[str] = None
+    points: List[Dict[str, Any]]
+
+class SensorHistoryBatchResponse(BaseModel):
+    resolution: str
+    series: List[SensorHistorySeries]
+    missing: List[str] = []
+
 class ConfigurationExport(BaseModel):
     assets: List[Machine]
     sensors: List[Sensor]
@@ -276,6 +302,9 @@ class SensorLogBase(BaseModel):
     variation_percent: Optional[float] = None
     severity: str = "INFO"
     unit: Optional[str] = None
+    window_min: Optional[float] = None
+    window_max: Optional[float] = None
+    sample_count: Optional[int] = 1
 
 class SensorLogCreate(SensorLogBase):
     timestamp: Optional[datetime] = None
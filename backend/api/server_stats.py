@@ -0,0 +1,234 @@
+"""
+Background sampler behind /api/server/status.
+
+Host metrics (CPU, memory, load, uptime), the estimated sensor_data row count
+and the collector IP are collected every SAMPLE_INTERVAL_S into one snapshot
+that the endpoint serves as is, so operators polling the status page cost no
+database query, no /proc parsing and no `ip route` subprocess per request.
+The blocking parts run in a worker thread. The collector IP changes only
+with the network setup and is resolved every COLLECTOR_IP_TTL_S. If the
+sampler is not running the endpoint refreshes a snapshot older than
+SNAPSHOT_TTL_S itself.
+"""
+import asyncio
+import logging
+import os
+import platform
+import socket
+import subprocess
+import time
+import psutil
+from .timescale import approximate_row_count
+
+logger = logging.getLogger("api")
+
+SAMPLE_INTERVAL_S = 10
+SNAPSHOT_TTL_S = 30
+COLLECTOR_IP_TTL_S = 600
+
+
+def resolve_collector_ip() -> str:
+    """Get the IP address of the host machine"""
+    try:
+        # First, try to get from environment variable
+        env_ip = os.getenv("HOST_IP")
+        if env_ip and env_ip != "localhost" and env_ip != "127.0.0.1":
+            return env_ip
+
+        # If not in env, try to get from request headers or docker host
+        # Get hostname and resolve it
+        hostname = socket.gethostname()
+
+        # Try to get all IP addresses for this hostname
+        try:
+            all_ips = socket.gethostbyname_ex(hostname)[2]
+            # Filter out localhost and docker internal IPs
+            for ip in all_ips:
+                if ip != "127.0.0.1" and not ip.startswith("172."):
+                    return ip
+        except:
+            pass
+
+        # Fallback: use the socket connection method but be aware it might be container IP
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+        s.close()
+
+        # If we got a 172.x.x.x (docker bridge), try to get host IP from gateway
+        if ip.startswith("172."):
+            try:
+                result = subprocess.run(["ip", "route"], capture_output=True, text=True)
+                for line in result.stdout.split('\n'):
+                    if 'default via' in line:
+                        parts = line.split()
+                        if len(parts) >= 3:
+                            return parts[2]  # Return gateway IP (host IP)
+            except:
+                pass
+
+        return ip
+    except Exception as e:
+        print(f"Error getting IP: {e}")
+        return "unknown"
+
+
+def read_cpu_model() -> str:
+    """CPU model from /proc/cpuinfo (from host)"""
+    try:
+        proc_path = '/host/proc/cpuinfo' if os.path.exists('/host/proc/cpuinfo') else '/proc/cpuinfo'
+        with open(proc_path, 'r') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except:
+        pass
+    return platform.processor() or "Unknown"
+
+
+def sample_host(cpu_model: str) -> dict:
+    """System and process sections of the status (blocking, run in a thread)."""
+    try:
+        if hasattr(os, 'getloadavg'):
+            load_avg = os.getloadavg()
+        else:
+            load_avg = [0, 0, 0]
+    except:
+        load_avg = [0, 0, 0]
+
+    # Get total system memory from /proc/meminfo (from host)
+    total_memory_host = 0
+    free_memory_host = 0
+    try:
+        proc_path = '/host/proc/meminfo' if os.path.exists('/host/proc/meminfo') else '/proc/meminfo'
+        with open(proc_path, 'r') as f:
+            meminfo = {}
+            for line in f:
+                parts = line.split(':', 1)
+                if len(parts) == 2:
+                    key, value = parts
+                    meminfo[key.strip()] = int(value.split()[0]) * 1024  # Convert KB to Bytes
+
+            total_memory_host = meminfo.get('MemTotal', 0)
+            free_memory_host = meminfo.get('MemAvailable', meminfo.get('MemFree', 0))
+    except:
+        total_memory_host = 0
+        free_memory_host = 0
+
+    # Get CPU and memory info from psutil (container view, for fallback)
+    try:
+        # Non-blocking: usage since the previous sample
+        cpu_percent = psutil.cpu_percent(interval=None)
+        virtual_memory = psutil.virtual_memory()
+
+        # Use host memory if available, otherwise use container memory
+        if total_memory_host > 0:
+            total_memory = total_memory_host
+            free_memory = free_memory_host
+            used_memory = total_memory - free_memory
+            memory_percent = (used_memory / total_memory * 100) if total_memory > 0 else 0
+        else:
+            total_memory = virtual_memory.total
+            free_memory = virtual_memory.available
+            used_memory = virtual_memory.used
+            memory_percent = virtual_memory.percent
+    except:
+        cpu_percent = 0
+        total_memory = total_memory_host if total_memory_host > 0 else 0
+        free_memory = free_memory_host if free_memory_host > 0 else 0
+        used_memory = total_memory - free_memory if total_memory > 0 else 0
+        memory_percent = 0
+
+    # Get process info
+    try:
+        process = psutil.Process()
+        process_memory = process.memory_info()
+        heap_used = process_memory.rss
+        heap_total = total_memory
+        external = 0
+        rss = process_memory.rss
+    except:
+        heap_used = 0
+        heap_total = 0
+        external = 0
+        rss = 0
+
+    # Get system uptime
+    try:
+        boot_time = psutil.boot_time()
+        system_uptime = int(time.time() - boot_time)
+    except:
+        system_uptime = int(time.time())
+
+    return {
+        "uptime": system_uptime,
+        "system": {
+            "cpuCount": os.cpu_count() if hasattr(os, 'cpu_count') else 1,
+            "cpuUsage": cpu_percent,
+            "cpuModel": cpu_model,
+            "totalMemory": total_memory,
+            "freeMemory": free_memory,
+            "usedMemory": used_memory,
+            "memoryUsage": memory_percent,
+            "systemUptime": system_uptime,
+            "loadAverage": list(load_avg)
+        },
+        "process": {
+            "pid": os.getpid(),
+            "heapUsed": heap_used,
+            "heapTotal": heap_total,
+            "external": external,
+            "rss": rss
+        }
+    }
+
+
+class ServerStatsSampler:
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.snapshot = None
+        self.sampled_at = 0.0  # monotonic
+        self.cpu_model = None
+        self.collector_ip = "unknown"
+        self.collector_ip_at = None  # monotonic, None = never resolved
+        self._lock = asyncio.Lock()
+
+    async def sample(self):
+        """Collect a new snapshot."""
+        if self.cpu_model is None:
+            self.cpu_model = await asyncio.to_thread(read_cpu_model)
+        host = await asyncio.to_thread(sample_host, self.cpu_model)
+
+        now = time.monotonic()
+        if self.collector_ip_at is None or now - self.collector_ip_at >= COLLECTOR_IP_TTL_S:
+            self.collector_ip = await asyncio.to_thread(resolve_collector_ip)
+            self.collector_ip_at = now
+
+        # Estimated records in sensor_data (count(*) scans the whole table)
+        total_records = 0
+        try:
+            async with self.session_factory() as db:
+                total_records = await approximate_row_count(db, "sensor_data")
+        except Exception as e:
+            print(f"Error counting records: {e}")
+
+        self.snapshot = {**host, "total_records": total_records, "collector_ip": self.collector_ip}
+        self.sampled_at = time.monotonic()
+
+    async def get(self) -> dict:
+        """Current snapshot, refreshed here only if the background loop has not kept it fresh."""
+        if self.snapshot is None or time.monotonic() - self.sampled_at > SNAPSHOT_TTL_S:
+            async with self._lock:
+                if self.snapshot is None or time.monotonic() - self.sampled_at > SNAPSHOT_TTL_S:
+                    await self.sample()
+        return self.snapshot
+
+    async def run(self):
+        logger.info(f"📈 Server stats sampler started (every {SAMPLE_INTERVAL_S}s)")
+        while True:
+            try:
+                async with self._lock:
+                    await self.sample()
+            except Exception as e:
+                logger.error(f"❌ Server stats sampling failed: {e}")
+            await asyncio.sleep(SAMPLE_INTERVAL_S)
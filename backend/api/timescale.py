@@ -0,0 +1,249 @@
+"""
+TimescaleDB management for the time-series tables (sensor_data, sensor_logs).
+
+Converting a populated table to a hypertable rewrites its primary key and
+moves every row into chunks while holding a lock, so it is done by
+migrations/004_timescale_hypertables.sql in a maintenance window, not here.
+At startup only tables that are already hypertables are managed: native
+compression segmented by sensor_id and the compression / retention policies
+configured under `timescale:` in settings.yml. An empty table (fresh install)
+is converted on the spot; a populated plain table is reported and left alone.
+
+    timescale:
+      enabled: true
+      chunk_interval: 1 day
+      rollups: true             # 1m / 15m / 1h continuous aggregates of sensor_data
+      sensor_data:
+        compress_after: 7 days
+        retention: null         # e.g. 365 days; null = keep forever
+      sensor_logs:
+        compress_after: 30 days
+        retention: null
+
+The rollups (min / max / avg / last / count per sensor and bucket) are
+refreshed by Timescale policies and read by history.py; they keep answering
+long-range history after the raw chunks are dropped by retention.
+
+Every step is idempotent. On plain PostgreSQL (extension not available) or
+with `enabled: false` nothing is changed.
+"""
+import logging
+import os
+import yaml
+from sqlalchemy import text
+
+logger = logging.getLogger("api")
+
+CONFIG_PATH = os.getenv("CONFIG_PATH", "/app/config")
+SETTINGS_FILE = os.path.join(CONFIG_PATH, "settings.yml")
+
+HYPERTABLES = ("sensor_data", "sensor_logs")
+
+DEFAULT_TIMESCALE_CONFIG = {
+    "enabled": True,
+    "chunk_interval": "1 day",
+    "rollups": True,
+    "sensor_data": {"compress_after": "7 days", "retention": None},
+    "sensor_logs": {"compress_after": "30 days", "retention": None},
+}
+
+# Continuous aggregates of sensor_data: (view, bucket width, refresh start_offset, refresh end_offset)
+ROLLUP_VIEWS = (
+    ("sensor_data_1m", "1 minute", "1 hour", "1 minute"),
+    ("sensor_data_15m", "15 minutes", "1 day", "15 minutes"),
+    ("sensor_data_1h", "1 hour", "3 days", "1 hour"),
+)
+
+# Set by setup_timescale(); hypertables report 0 in pg_class.reltuples, so row counts depend on it
+timescale_enabled = False
+# Set by setup_timescale() once the ROLLUP_VIEWS exist (history.py reads them instead of raw rows)
+rollups_enabled = False
+
+
+def get_timescale_config() -> dict:
+    config = {key: (dict(value) if isinstance(value, dict) else value) for key, value in DEFAULT_TIMESCALE_CONFIG.items()}
+    if os.path.exists(SETTINGS_FILE):
+        with open(SETTINGS_FILE, "r") as f:
+            settings = yaml.safe_load(f) or {}
+        for key, value in (settings.get("timescale") or {}).items():
+            if isinstance(value, dict) and isinstance(config.get(key), dict):
+                config[key].update(value)
+            else:
+                config[key] = value
+    return config
+
+
+async def is_available(conn) -> bool:
+    result = await conn.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb'"))
+    return result.scalar() is not None
+
+
+async def is_hypertable(conn, table: str) -> bool:
+    result = await conn.execute(
+        text("SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = :table"),
+        {"table": table}
+    )
+    return result.scalar() is not None
+
+
+async def compression_enabled(conn, table: str) -> bool:
+    result = await conn.execute(
+        text("SELECT compression_enabled FROM timescaledb_information.hypertables WHERE hypertable_name = :table"),
+        {"table": table}
+    )
+    return bool(result.scalar())
+
+
+async def primary_key_columns(conn, table: str) -> set:
+    result = await conn.execute(text("""
+        SELECT a.attname
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = CAST(:table AS regclass) AND i.indisprimary
+    """), {"table": table})
+    return {row[0] for row in result.all()}
+
+
+async def is_empty(conn, table: str) -> bool:
+    result = await conn.execute(text(f"SELECT 1 FROM {table} LIMIT 1"))
+    return result.scalar() is None
+
+
+async def create_hypertable(conn, table: str, chunk_interval: str):
+    # Unique constraints on a hypertable must include the partitioning column
+    if "timestamp" not in await primary_key_columns(conn, table):
+        logger.info(f"🕒 [{table}] Primary key -> (id, timestamp)")
+        await conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_pkey"))
+        await conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, timestamp)"))
+    logger.info(f"🕒 [{table}] Converting empty table to hypertable (chunk_interval={chunk_interval})")
+    await conn.execute(
+        text(f"SELECT create_hypertable('{table}', 'timestamp', chunk_time_interval => CAST(:interval AS interval), "
+             f"if_not_exists => true)"),
+        {"interval": chunk_interval}
+    )
+
+
+async def apply_policies(conn, table: str, table_config: dict):
+    """Replace the compression and retention policies of a hypertable with the configured ones."""
+    compress_after = table_config.get("compress_after")
+    retention = table_config.get("retention")
+
+    await conn.execute(text(f"SELECT remove_compression_policy('{table}', if_exists => true)"))
+    if compress_after:
+        await conn.execute(
+            text(f"SELECT add_compression_policy('{table}', CAST(:after AS interval))"),
+            {"after": compress_after}
+        )
+
+    await conn.execute(text(f"SELECT remove_retention_policy('{table}', if_exists => true)"))
+    if retention:
+        await conn.execute(
+            text(f"SELECT add_retention_policy('{table}', CAST(:retention AS interval))"),
+            {"retention": retention}
+        )
+    logger.info(f"🕒 [{table}] compress_after={compress_after or 'off'}, retention={retention or 'forever'}")
+
+
+async def is_continuous_aggregate(conn, view: str) -> bool:
+    result = await conn.execute(
+        text("SELECT 1 FROM timescaledb_information.continuous_aggregates WHERE view_name = :view"),
+        {"view": view}
+    )
+    return result.scalar() is not None
+
+
+async def create_rollups(engine):
+    """Create the sensor_data continuous aggregates and their refresh policies."""
+    # CREATE MATERIALIZED VIEW ... WITH DATA cannot run inside a transaction block
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for view, bucket, start_offset, end_offset in ROLLUP_VIEWS:
+            if not await is_continuous_aggregate(conn, view):
+                logger.info(f"🕒 [{view}] Creating continuous aggregate, existing sensor_data is materialized once")
+                # materialized_only = false: buckets not refreshed yet are computed from raw rows at query time
+                await conn.execute(text(f"""
+                    CREATE MATERIALIZED VIEW {view}
+                    WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+                    SELECT sensor_id,
+                           time_bucket(INTERVAL '{bucket}', timestamp) AS bucket,
+                           min(value) AS min_value,
+                           max(value) AS max_value,
+                           avg(value) AS avg_value,
+                           last(value, timestamp) AS last_value,
+                           count(*) AS sample_count
+                    FROM sensor_data
+                    GROUP BY sensor_id, bucket
+                    WITH DATA
+                """))
+            await conn.execute(text(
+                f"SELECT add_continuous_aggregate_policy('{view}', start_offset => INTERVAL '{start_offset}', "
+                f"end_offset => INTERVAL '{end_offset}', schedule_interval => INTERVAL '{end_offset}', if_not_exists => true)"
+            ))
+
+
+async def setup_timescale(engine) -> bool:
+    """Check the hypertables and apply compression and policies. Returns True when active."""
+    global timescale_enabled, rollups_enabled
+    config = get_timescale_config()
+    if not config.get("enabled", True):
+        logger.info("🕒 TimescaleDB management disabled in settings.yml")
+        return False
+
+    try:
+        async with engine.begin() as conn:
+            if not await is_available(conn):
+                logger.info("🕒 TimescaleDB extension not available, keeping plain tables")
+                return False
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb"))
+
+        ready = []
+        for table in HYPERTABLES:
+            async with engine.begin() as conn:
+                if not await is_hypertable(conn, table):
+                    if not await is_empty(conn, table):
+                        logger.warning(
+                            f"⚠️ [{table}] Plain table with data: run migrations/004_timescale_hypertables.sql "
+                            f"in a maintenance window to convert it (left unmanaged)"
+                        )
+                        continue
+                    await create_hypertable(conn, table, config.get("chunk_interval", "1 day"))
+                    await conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_{table}_sensor_id_timestamp ON {table} (sensor_id, timestamp DESC)"
+                    ))
+                if not await compression_enabled(conn, table):
+                    await conn.execute(text(
+                        f"ALTER TABLE {table} SET (timescaledb.compress, "
+                        f"timescaledb.compress_segmentby = 'sensor_id', timescaledb.compress_orderby = 'timestamp DESC')"
+                    ))
+                await apply_policies(conn, table, config.get(table) or {})
+            ready.append(table)
+    except Exception as e:
+        logger.error(f"❌ TimescaleDB setup failed: {e}")
+        return False
+
+    if not ready:
+        return False
+    timescale_enabled = True
+    logger.info(f"✅ TimescaleDB hypertables ready: {', '.join(ready)}")
+
+    # Continuous aggregates can only be built on a hypertable
+    if config.get("rollups", True) and "sensor_data" in ready:
+        try:
+            await create_rollups(engine)
+            rollups_enabled = True
+            logger.info(f"✅ TimescaleDB rollups ready: {', '.join(view for view, *_ in ROLLUP_VIEWS)}")
+        except Exception as e:
+            logger.error(f"❌ TimescaleDB rollups setup failed, history is aggregated from raw rows: {e}")
+    return True
+
+
+async def approximate_row_count(db, table: str) -> int:
+    """Row estimate without scanning the table (count(*) does not scale to hundreds of millions of rows)."""
+    if timescale_enabled and table in HYPERTABLES:
+        result = await db.execute(text("SELECT approximate_row_count(CAST(:table AS regclass))"), {"table": table})
+    else:
+        result = await db.execute(
+            text("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+            {"table": table}
+        )
+    return int(result.scalar() or 0)
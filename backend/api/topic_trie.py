@@ -0,0 +1,114 @@
+"""
+Subscription index for the /ws/realtime fan-out.
+
+Topic patterns are stored in a trie keyed by topic level, so the clients
+interested in a topic are found by walking its levels once instead of testing
+every pattern of every connection. Wildcards follow MQTT: `+` (or `*`)
+matches exactly one level, `#` matches the remaining levels (including none,
+so `machines/#` also matches `machines`), and a bare `*` or `#` matches every
+topic. Different patterns can end on the same node (`+` and `*`, or levels
+after `#`), so each node counts how many patterns of a subscriber end there
+and a subscriber leaves the node only when the last one is removed. The
+subscriber set of a topic is memoized until the next subscribe or
+unsubscribe; the topic space is the set of sensors, so the cache stays small.
+"""
+from typing import Dict, Hashable
+
+SINGLE_LEVEL = ("+", "*")
+MULTI_LEVEL = "#"
+
+# Memoized topics kept before the cache is reset (a guard against unbounded topic names)
+MATCH_CACHE_SIZE = 10000
+
+
+class _Node:
+    __slots__ = ("children", "subscribers", "tail_subscribers")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.subscribers: Dict[Hashable, int] = {}  # patterns ending here, per subscriber
+        self.tail_subscribers: Dict[Hashable, int] = {}  # patterns ending here with '#', per subscriber
+
+
+class TopicTrie:
+    def __init__(self):
+        self._root = _Node()
+        self._cache: Dict[str, frozenset] = {}
+
+    @staticmethod
+    def _levels(pattern: str) -> list:
+        if pattern == "*":
+            return [MULTI_LEVEL]
+        levels = pattern.split("/")
+        # Anything after '#' can never match, the pattern is '#' from there on
+        if MULTI_LEVEL in levels:
+            levels = levels[:levels.index(MULTI_LEVEL) + 1]
+        return [MULTI_LEVEL if level == MULTI_LEVEL else ("+" if level in SINGLE_LEVEL else level) for level in levels]
+
+    def add(self, pattern: str, subscriber: Hashable):
+        node = self._root
+        levels = self._levels(pattern)
+        for level in levels[:-1]:
+            node = node.children.setdefault(level, _Node())
+        if levels[-1] == MULTI_LEVEL:
+            counts = node.tail_subscribers
+        else:
+            counts = node.children.setdefault(levels[-1], _Node()).subscribers
+        counts[subscriber] = counts.get(subscriber, 0) + 1
+        self._cache.clear()
+
+    def remove(self, pattern: str, subscriber: Hashable):
+        levels = self._levels(pattern)
+        path = [self._root]
+        for level in levels[:-1]:
+            node = path[-1].children.get(level)
+            if node is None:
+                return
+            path.append(node)
+        if levels[-1] == MULTI_LEVEL:
+            counts = path[-1].tail_subscribers
+        else:
+            leaf = path[-1].children.get(levels[-1])
+            if leaf is None:
+                return
+            counts = leaf.subscribers
+            path.append(leaf)
+        if subscriber not in counts:
+            return
+        counts[subscriber] -= 1
+        if counts[subscriber] == 0:
+            del counts[subscriber]
+
+        # Prune the branches left empty
+        for depth in range(len(path) - 1, 0, -1):
+            node = path[depth]
+            if node.children or node.subscribers or node.tail_subscribers:
+                break
+            parent = path[depth - 1]
+            for level, child in list(parent.children.items()):
+                if child is node:
+                    del parent.children[level]
+                    break
+        self._cache.clear()
+
+    def match(self, topic: str) -> frozenset:
+        """Subscribers of every pattern matching the topic."""
+        subscribers = self._cache.get(topic)
+        if subscribers is None:
+            found = set()
+            self._collect(self._root, topic.split("/"), 0, found)
+            subscribers = frozenset(found)
+            if len(self._cache) >= MATCH_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[topic] = subscribers
+        return subscribers
+
+    def _collect(self, node: _Node, levels: list, index: int, found: set):
+        found.update(node.tail_subscribers)
+        if index == len(levels):
+            found.update(node.subscribers)
+            return
+        for key in (levels[index], "+"):
+            child = node.children.get(key)
+            if child is not None:
+                self._collect(child, levels, index + 1, found)
@@ -0,0 +1,238 @@
+"""
+Per-client send queues for the /ws/realtime fan-out.
+
+A message is serialized once (orjson when installed, json otherwise) and the
+same frame is queued for every recipient. Each connection has a bounded queue
+drained by its own task, so a slow client only delays itself. When a queue is
+full the `overflow` policy from the `websocket:` section of settings.yml
+applies:
+
+    websocket:
+      send_queue: 256          # frames waiting per client
+      overflow: drop_oldest    # drop_oldest | coalesce | disconnect
+      coalesce_window_ms: 250  # default window of latest-value batching (opt-in per client)
+
+- drop_oldest: the oldest queued frame is discarded.
+- coalesce: a queued frame of the same topic is replaced by the new one (it
+  was stale anyway); without one the oldest frame is discarded.
+- disconnect: the client is closed (code 1013) and can reconnect.
+
+A client can also opt into latest-value batching with
+`{"action": "coalesce", "window_ms": 250}` (0 turns it off): topic messages
+are then held for the window, a newer value replacing the pending one of the
+same topic, and sent as one frame `{"type": "batch", "messages": [...]}`. The
+window is clamped to COALESCE_MIN_MS..COALESCE_MAX_MS; `coalesce_window_ms`
+is used when the client gives none. Notifications without a topic are sent
+immediately.
+
+Queue depth, drops and coalesced frames are reported per client and in total
+under `connections.websocket` in /api/server/status.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from typing import Callable, Optional
+import yaml
+from fastapi import WebSocket
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger("api")
+
+CONFIG_PATH = os.getenv("CONFIG_PATH", "/app/config")
+SETTINGS_FILE = os.path.join(CONFIG_PATH, "settings.yml")
+
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+DEFAULT_WEBSOCKET_CONFIG = {
+    "send_queue": 256,
+    "overflow": "drop_oldest",
+    "coalesce_window_ms": 250,
+}
+
+COALESCE_MIN_MS = 50
+COALESCE_MAX_MS = 5000
+
+# Close code sent to clients dropped by the disconnect policy ("try again later")
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+
+def get_websocket_config() -> dict:
+    config = dict(DEFAULT_WEBSOCKET_CONFIG)
+    if os.path.exists(SETTINGS_FILE):
+        with open(SETTINGS_FILE, "r") as f:
+            settings = yaml.safe_load(f) or {}
+        config.update(settings.get("websocket") or {})
+    if config["overflow"] not in OVERFLOW_POLICIES:
+        logger.warning(f"⚠️ Unknown websocket overflow policy '{config['overflow']}', using drop_oldest")
+        config["overflow"] = "drop_oldest"
+    config["send_queue"] = max(1, int(config["send_queue"]))
+    config["coalesce_window_ms"] = clamp_window_ms(config["coalesce_window_ms"])
+    return config
+
+
+def clamp_window_ms(window_ms) -> int:
+    return min(COALESCE_MAX_MS, max(COALESCE_MIN_MS, int(window_ms)))
+
+
+def encode_message(message: dict) -> str:
+    """Serialize a message once for all recipients (same output as WebSocket.send_json)."""
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class FanoutStats:
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.disconnected = 0
+        self.batches = 0
+        self.superseded = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "slow_disconnects": self.disconnected,
+            "batches": self.batches,
+            "superseded": self.superseded
+        }
+
+
+class ClientSender:
+    """Bounded frame queue of one WebSocket, drained by its own task."""
+
+    def __init__(self, websocket: WebSocket, max_queue: int, overflow: str,
+                 stats: FanoutStats, on_error: Callable[[WebSocket], None]):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.stats = stats
+        self.on_error = on_error
+        self.queue = deque()  # [topic, frame]; entries are lists so coalesce can replace the frame
+        self.pending_topics = {}  # topic -> queued entry (coalesce policy)
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.window_s = None  # latest-value batching window, None = off
+        self.latest = {}  # topic -> newest frame of the current window
+        self.flush_handle = None
+        self.batches = 0
+        self.task = asyncio.create_task(self.run())
+
+    def set_window(self, window_ms: Optional[int]):
+        """Turn latest-value batching on (window in ms) or off (None / 0)."""
+        self.window_s = clamp_window_ms(window_ms) / 1000 if window_ms else None
+        if self.window_s is None:
+            self.flush_latest()
+
+    def enqueue(self, topic: Optional[str], frame: str):
+        if self.closed:
+            return
+        if self.window_s is not None and topic is not None:
+            if topic in self.latest:
+                self.stats.superseded += 1
+            self.latest[topic] = frame
+            if self.flush_handle is None:
+                self.flush_handle = asyncio.get_running_loop().call_later(self.window_s, self.flush_latest)
+            return
+        self.put(topic, frame)
+
+    def flush_latest(self):
+        """Queue the values held in the window as one batch frame (reuses the encoded messages)."""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if not self.latest or self.closed:
+            return
+        frame = '{"type":"batch","messages":[' + ",".join(self.latest.values()) + "]}"
+        self.latest = {}
+        self.batches += 1
+        self.stats.batches += 1
+        self.put(None, frame)
+
+    def put(self, topic: Optional[str], frame: str):
+        if self.overflow == "coalesce" and topic is not None:
+            entry = self.pending_topics.get(topic)
+            if entry is not None:
+                entry[1] = frame
+                self.coalesced += 1
+                self.stats.coalesced += 1
+                return
+        if len(self.queue) >= self.max_queue:
+            if self.overflow == "disconnect":
+                self.closed = True
+                self.stats.disconnected += 1
+                logger.warning(f"⚠️ WebSocket client too slow ({len(self.queue)} frames queued), disconnecting")
+                self.on_error(self.websocket)
+                asyncio.create_task(self._close())
+                return
+            oldest = self.queue.popleft()
+            if self.pending_topics.get(oldest[0]) is oldest:
+                del self.pending_topics[oldest[0]]
+            self.dropped += 1
+            self.stats.dropped += 1
+        entry = [topic, frame]
+        self.queue.append(entry)
+        if self.overflow == "coalesce" and topic is not None:
+            self.pending_topics[topic] = entry
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self.ready.set()
+
+    async def run(self):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.queue:
+                    entry = self.queue.popleft()
+                    topic, frame = entry
+                    if self.pending_topics.get(topic) is entry:
+                        del self.pending_topics[topic]
+                    await self.websocket.send_text(frame)
+                    self.sent += 1
+                    self.stats.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error sending message: {e}")
+            self.on_error(self.websocket)
+
+    async def _close(self):
+        try:
+            await self.websocket.close(code=SLOW_CLIENT_CLOSE_CODE)
+        except Exception:
+            pass
+
+    def stop(self):
+        self.closed = True
+        self.queue.clear()
+        self.pending_topics.clear()
+        self.latest.clear()
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    def to_dict(self) -> dict:
+        return {
+            "depth": len(self.queue),
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "window_ms": round(self.window_s * 1000) if self.window_s else None,
+            "batches": self.batches
+        }
@@ -0,0 +1,201 @@
+"""
+Edge-triggered alarm engine for the collector.
+
+Alarm definitions come from the `alarms:` section of the machine YAML (synced
+as sensors with an "alarm" entry in their metadata). Open alarms are kept in a
+dict warmed from machine_alarms at startup, so each reading is an O(1) state
+comparison; the DB is only touched on 0->1 / 1->0 transitions, which are
+queued and written in one batch per cycle.
+
+The queue is shared by every poll job, whichever session writes it. flush()
+moves the queued transitions into a token, so a concurrent flush from another
+job never writes them twice, and the caller reports committed() or failed()
+once its transaction is over; on failure (or cancellation) the token's
+transitions go back to the queue for the next cycle of any job. No lock is
+held across the caller's commit.
+"""
+import logging
+from sqlalchemy import insert, update, bindparam
+from sqlalchemy.future import select
+import models
+
+logger = logging.getLogger("collector")
+
+DEFAULT_ALARM_SEVERITY = "high"
+DEFAULT_ALARM_COLOR = "#FF0000"
+
+# Consecutive failed flushes after which the queue is dropped and the state re-read from the DB
+MAX_FLUSH_FAILURES = 5
+
+
+class AlarmDefinition:
+    __slots__ = ("sensor_id", "code", "name", "severity", "color", "store_in_db")
+
+    def __init__(self, sensor_id: int, code: str, name: str, severity: str = DEFAULT_ALARM_SEVERITY,
+                 color: str = DEFAULT_ALARM_COLOR, store_in_db: bool = True):
+        self.sensor_id = sensor_id
+        self.code = code
+        self.name = name
+        self.severity = severity
+        self.color = color
+        self.store_in_db = store_in_db
+
+
+def alarm_metadata(alarm_conf: dict) -> dict:
+    """Metadata stored on the sensor synced from an `alarms:` entry of the machine YAML."""
+    return {
+        "severity": alarm_conf.get("severity", DEFAULT_ALARM_SEVERITY),
+        "color": alarm_conf.get("color", DEFAULT_ALARM_COLOR),
+        "store_in_db": alarm_conf.get("store_in_db", True)
+    }
+
+
+def alarm_definition(sensor):
+    """AlarmDefinition for a sensor synced from the `alarms:` section, None otherwise."""
+    alarm = (sensor.metadata_info or {}).get("alarm")
+    if not alarm:
+        return None
+    return AlarmDefinition(
+        sensor_id=sensor.id,
+        code=sensor.code,
+        name=sensor.name,
+        severity=alarm.get("severity", DEFAULT_ALARM_SEVERITY),
+        color=alarm.get("color", DEFAULT_ALARM_COLOR),
+        store_in_db=alarm.get("store_in_db", True)
+    )
+
+
+class AlarmEngine:
+    def __init__(self):
+        self.active = {}  # sensor_id -> machine_alarms id (None until the insert is flushed)
+        self._pending_on = []  # rows to insert
+        self._unflushed = {}  # sensor_id -> row in _pending_on that is still open
+        self._pending_off = []  # {"alarm_id", "closed_at"} to update
+        self._stale = False
+        self._failures = 0
+        self._generation = 0  # bumped when the queue is reset; older tokens are not re-queued
+
+    async def warm(self, db):
+        result = await db.execute(
+            select(models.MachineAlarm.sensor_id, models.MachineAlarm.id).where(
+                models.MachineAlarm.status == 1,
+                models.MachineAlarm.timestamp_off == None
+            )
+        )
+        self.active = {sensor_id: alarm_id for sensor_id, alarm_id in result.all()}
+        self._pending_on = []
+        self._unflushed = {}
+        self._pending_off = []
+        self._stale = False
+        self._generation += 1
+        logger.info(f"🚨 Alarm engine warmed with {len(self.active)} open alarms")
+
+    def observe(self, definition: AlarmDefinition, machine_id: int, machine_code: str, value: float, timestamp):
+        """Compare the reading with the open-alarm state and queue a transition on an edge."""
+        is_active = value > 0
+        sensor_id = definition.sensor_id
+        if is_active == (sensor_id in self.active):
+            return
+
+        if is_active:
+            # Alarma se ACTIVÓ (0->1)
+            self.active[sensor_id] = None
+            if definition.store_in_db:
+                row = {
+                    "machine_id": machine_id,
+                    "sensor_id": sensor_id,
+                    "alarm_code": definition.code,
+                    "alarm_name": definition.name,
+                    "severity": definition.severity,
+                    "status": 1,
+                    "color": definition.color,
+                    "timestamp_on": timestamp,
+                    "timestamp_off": None
+                }
+                self._pending_on.append(row)
+                self._unflushed[sensor_id] = row
+            logger.warning(f"🚨 ALARM TRIGGERED: {definition.name} ({machine_code}) at {timestamp.isoformat()}")
+        else:
+            # Alarma se DESACTIVÓ (1->0)
+            alarm_id = self.active.pop(sensor_id)
+            row = self._unflushed.pop(sensor_id, None)
+            if row is not None:
+                # Opened and cleared within the same batch: insert it already closed
+                row["status"] = 0
+                row["timestamp_off"] = timestamp
+            elif alarm_id is not None:
+                self._pending_off.append({"alarm_id": alarm_id, "closed_at": timestamp})
+            logger.info(f"✅ ALARM CLEARED: {definition.name} ({machine_code}) at {timestamp.isoformat()}")
+
+    async def flush(self, db):
+        """Write the queued transitions: one multi-row INSERT and one executemany UPDATE.
+
+        The caller commits, then passes the returned token to committed() or failed().
+        Returns None when nothing was queued.
+        """
+        if not self._pending_on and not self._pending_off:
+            return None
+        on_rows, self._pending_on = self._pending_on, []
+        off_rows, self._pending_off = self._pending_off, []
+        # Rows may be closed by a reading while the transaction is open: insert a copy
+        sent = [dict(row) for row in on_rows]
+        token = [on_rows, sent, {}, off_rows, self._generation]
+        table = models.MachineAlarm.__table__
+        try:
+            if sent:
+                result = await db.execute(insert(table).returning(table.c.id, table.c.sensor_id, table.c.status), sent)
+                token[2] = {sensor_id: alarm_id for alarm_id, sensor_id, status in result.all() if status == 1}
+            if off_rows:
+                await db.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("alarm_id"))
+                    .values(status=0, timestamp_off=bindparam("closed_at")),
+                    off_rows
+                )
+        except BaseException:
+            self.failed(token)
+            raise
+        return token
+
+    def committed(self, token):
+        """The flushed transitions are in the DB: record the new alarm ids."""
+        if token is None:
+            return
+        on_rows, sent, opened, off_rows, generation = token
+        token.clear()  # Reported once
+        self._failures = 0
+        for row, sent_row in zip(on_rows, sent):
+            sensor_id = row["sensor_id"]
+            if self._unflushed.get(sensor_id) is row:
+                del self._unflushed[sensor_id]
+            if sent_row["status"] != 1 or sensor_id not in opened:
+                continue
+            if row["status"] == 0:
+                # Cleared while the insert was in flight: close the stored alarm next cycle
+                self._pending_off.append({"alarm_id": opened[sensor_id], "closed_at": row["timestamp_off"]})
+            elif generation == self._generation and sensor_id in self.active and self.active[sensor_id] is None:
+                self.active[sensor_id] = opened[sensor_id]
+
+    def failed(self, token):
+        """The transaction was rolled back: the transitions go back to the queue for the next cycle."""
+        if not token:
+            return
+        on_rows, sent, opened, off_rows, generation = token
+        token.clear()  # Reported once
+        if generation != self._generation:
+            return  # The queue was reset meanwhile, the state is re-read from the DB
+        self._pending_on[:0] = on_rows
+        self._pending_off[:0] = off_rows
+        self._failures += 1
+        if self._failures >= MAX_FLUSH_FAILURES:
+            logger.error(f"❌ Alarm transitions failed to commit {self._failures} times, reloading open alarms")
+            self._pending_on = []
+            self._unflushed = {}
+            self._pending_off = []
+            self._stale = True
+            self._failures = 0
+            self._generation += 1
+
+    async def refresh_if_stale(self, db):
+        if self._stale:
+            await self.warm(db)
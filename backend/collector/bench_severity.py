@@ -0,0 +1,132 @@
+"""
+Benchmark: per-reading evaluate_log() vs vectorized evaluate_batch().
+
+Builds one synthetic poll cycle (10k sensors by default: mixed analog and
+boolean, a share of first readings and near-zero previous values), checks
+that both evaluators select the same rows with the same severity and
+variation, and times them.
+
+Usage: python bench_severity.py [sensors] [repeats]
+"""
+import random
+import sys
+import time
+import numpy as np
+from severity import SeverityConfig, SeverityConfigCache, PlcLogEvaluator, evaluate_log, evaluate_batch, SEVERITY_LABELS
+
+
+def build_cycle(n: int, seed: int = 42):
+    rng = random.Random(seed)
+    configs, is_boolean, prev_values, current_values = [], [], [], []
+    for sensor_id in range(n):
+        boolean = rng.random() < 0.2
+        configs.append(SeverityConfig(
+            sensor_id,
+            variation_threshold_normal=rng.choice([1.0, 5.0, 10.0]),
+            variation_threshold_alert=rng.choice([10.0, 15.0]),
+            variation_threshold_critical=rng.choice([20.0, 30.0]),
+            is_boolean_critical=rng.random() < 0.5,
+            log_enabled=rng.random() < 0.95
+        ))
+        is_boolean.append(boolean)
+        roll = rng.random()
+        if roll < 0.05:
+            prev = None
+        elif roll < 0.10:
+            prev = 0.0
+        elif boolean:
+            prev = float(rng.randint(0, 1))
+        else:
+            prev = rng.uniform(-500, 500)
+        if boolean:
+            current = float(rng.randint(0, 1))
+        elif prev is None or rng.random() < 0.1:
+            current = rng.uniform(-500, 500)
+        else:
+            current = prev * (1 + rng.uniform(-0.1, 0.1))
+        prev_values.append(prev)
+        current_values.append(current)
+    return configs, is_boolean, prev_values, current_values
+
+
+def run_scalar(configs, is_boolean, prev_values, current_values):
+    rows = []
+    for i, config in enumerate(configs):
+        result = evaluate_log(config, is_boolean[i], prev_values[i], current_values[i])
+        if result is not None:
+            rows.append((i, result[0], result[1]))
+    return rows
+
+
+def run_batch(arrays):
+    indices, severity, variation = evaluate_batch(*arrays)
+    return [(int(i), SEVERITY_LABELS[s], float(v)) for i, s, v in zip(indices, severity, variation)]
+
+
+class _Sensor:
+    def __init__(self, sensor_id: int, boolean: bool):
+        self.id = sensor_id
+        self.type = "boolean" if boolean else "analog"
+
+
+def build_evaluator(configs, is_boolean):
+    cache = SeverityConfigCache()
+    cache.configs = {c.sensor_id: c for c in configs}
+    return PlcLogEvaluator([_Sensor(c.sensor_id, b) for c, b in zip(configs, is_boolean)], cache)
+
+
+def to_arrays(configs, is_boolean, prev_values, current_values):
+    return (
+        np.array([np.nan if v is None else v for v in prev_values], dtype=np.float64),
+        np.array(current_values, dtype=np.float64),
+        np.array([c.variation_threshold_normal for c in configs], dtype=np.float64),
+        np.array([c.variation_threshold_alert for c in configs], dtype=np.float64),
+        np.array([c.variation_threshold_critical for c in configs], dtype=np.float64),
+        np.array(is_boolean, dtype=bool),
+        np.array([c.is_boolean_critical for c in configs], dtype=bool),
+        np.array([c.log_enabled for c in configs], dtype=bool),
+    )
+
+
+def best_of(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    cycle = build_cycle(n)
+    arrays = to_arrays(*cycle)
+
+    scalar_rows = run_scalar(*cycle)
+    batch_rows = run_batch(arrays)
+    mismatches = [
+        (a, b) for a, b in zip(scalar_rows, batch_rows)
+        if a[0] != b[0] or a[1] != b[1] or abs(a[2] - b[2]) > 0.011
+    ]
+    if len(scalar_rows) != len(batch_rows) or mismatches:
+        print(f"❌ Results differ: {len(scalar_rows)} vs {len(batch_rows)} rows, first mismatches: {mismatches[:5]}")
+        sys.exit(1)
+    print(f"✅ {n} sensors -> {len(batch_rows)} SensorLog rows, both evaluators agree")
+
+    scalar_ms = best_of(lambda: run_scalar(*cycle), repeats)
+    batch_ms = best_of(lambda: evaluate_batch(*arrays), repeats)
+    configs, is_boolean, prev_values, current_values = cycle
+    evaluator = build_evaluator(configs, is_boolean)
+    sensor_ids = [c.sensor_id for c in configs]
+    if evaluator.evaluate(sensor_ids, prev_values, current_values) != batch_rows:
+        print("❌ PlcLogEvaluator differs from evaluate_batch")
+        sys.exit(1)
+    evaluator_ms = best_of(lambda: evaluator.evaluate(sensor_ids, prev_values, current_values), repeats)
+    print(f"⏱️ evaluate_log (per reading):        {scalar_ms:8.3f} ms")
+    print(f"⏱️ evaluate_batch (arrays only):      {batch_ms:8.3f} ms  ({scalar_ms / batch_ms:.1f}x)")
+    print(f"⏱️ PlcLogEvaluator (poll loop path):  {evaluator_ms:8.3f} ms  ({scalar_ms / evaluator_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
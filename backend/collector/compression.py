@@ -0,0 +1,165 @@
+"""
+Storage compression for sensor_data.
+
+Configured per sensor in the machine YAML and synced into the sensor metadata:
+
+    storage:
+      mode: swinging_door   # swinging_door | deadband
+      deviation: 0.5        # tolerance, in the sensor's units
+      max_interval_s: 300   # a sample is stored at least this often
+
+Only real readings are persisted, and only those needed to rebuild the series:
+- swinging_door: straight lines between consecutive stored samples pass
+  within `deviation` of every reading in between
+- deadband: holding each stored value until the next stored sample stays
+  within `deviation` of every reading; the sample held just before a change
+  is stored with it, so a flat period followed by a step is not drawn as a
+  slow ramp
+Sensors without a `storage` entry store every reading, as before.
+"""
+import logging
+
+logger = logging.getLogger("collector")
+
+COMPRESSION_MODES = ("swinging_door", "deadband")
+DEFAULT_MAX_INTERVAL_S = 300
+
+
+class CompressionConfig:
+    __slots__ = ("mode", "deviation", "max_interval_s")
+
+    def __init__(self, mode: str = "swinging_door", deviation: float = 0.0, max_interval_s: float = DEFAULT_MAX_INTERVAL_S):
+        self.mode = mode
+        self.deviation = deviation
+        self.max_interval_s = max_interval_s
+
+
+def compression_metadata(conf: dict) -> dict:
+    """Normalize a storage entry of the machine YAML for the sensor metadata."""
+    mode = conf.get("mode", "swinging_door")
+    if mode not in COMPRESSION_MODES:
+        logger.warning(f"⚠️ Unknown storage compression mode '{mode}', using 'swinging_door'")
+        mode = "swinging_door"
+    return {
+        "mode": mode,
+        "deviation": float(conf.get("deviation", 0.0)),
+        "max_interval_s": float(conf.get("max_interval_s", DEFAULT_MAX_INTERVAL_S))
+    }
+
+
+def compression_from_metadata(sensor):
+    """CompressionConfig stored in the sensor metadata, None if the sensor stores every reading."""
+    conf = (sensor.metadata_info or {}).get("storage")
+    if not conf:
+        return None
+    return CompressionConfig(conf.get("mode", "swinging_door"), conf.get("deviation", 0.0),
+                             conf.get("max_interval_s", DEFAULT_MAX_INTERVAL_S))
+
+
+class _Sample:
+    __slots__ = ("t", "row")
+
+    def __init__(self, row: tuple):
+        self.row = row  # (sensor_id, timestamp, value, quality, raw_value) as taken by SensorDataWriter.put
+        self.t = row[1].timestamp()
+
+    @property
+    def value(self) -> float:
+        return self.row[2]
+
+
+class _State:
+    __slots__ = ("archived", "held", "slope_upper", "slope_lower")
+
+    def __init__(self):
+        self.archived = None  # Last stored sample
+        self.held = None  # Last received sample, not stored yet
+        self.slope_upper = float("inf")
+        self.slope_lower = float("-inf")
+
+    def archive(self, sample: _Sample):
+        self.archived = sample
+        self.held = None
+        self.slope_upper = float("inf")
+        self.slope_lower = float("-inf")
+
+
+class StorageCompressor:
+    """Decides which readings become sensor_data rows, per sensor."""
+
+    def __init__(self):
+        self.states = {}  # sensor_id -> _State
+        self.received = 0
+        self.stored = 0
+
+    def offer(self, config: CompressionConfig, row: tuple) -> list:
+        """Submit one reading; returns the rows to store now (0, 1 or 2)."""
+        state = self.states.get(row[0])
+        if state is None:
+            state = self.states[row[0]] = _State()
+        sample = _Sample(row)
+        if config.mode == "deadband":
+            stored = self._deadband(state, config, sample)
+        else:
+            stored = self._swinging_door(state, config, sample)
+        self.received += 1
+        self.stored += len(stored)
+        return stored
+
+    def _store_and_restart(self, state: _State, sample: _Sample) -> list:
+        """Store the held sample (if any) and this one, and restart from here."""
+        stored = [state.held.row, sample.row] if state.held is not None else [sample.row]
+        state.archive(sample)
+        return stored
+
+    def _deadband(self, state: _State, config: CompressionConfig, sample: _Sample) -> list:
+        archived = state.archived
+        if archived is None:
+            state.archive(sample)
+            return [sample.row]
+        if abs(sample.value - archived.value) > config.deviation or sample.t - archived.t >= config.max_interval_s:
+            return self._store_and_restart(state, sample)
+        state.held = sample
+        return []
+
+    def _swinging_door(self, state: _State, config: CompressionConfig, sample: _Sample) -> list:
+        archived = state.archived
+        if archived is None:
+            state.archive(sample)
+            return [sample.row]
+        dt = sample.t - archived.t
+        if dt <= 0:
+            return []
+        if dt >= config.max_interval_s:
+            return self._store_and_restart(state, sample)
+
+        # The straight line archived -> sample must stay inside the corridor left by the
+        # samples in between (doors hinged at archived value +/- deviation)
+        slope = (sample.value - archived.value) / dt
+        if state.slope_lower <= slope <= state.slope_upper:
+            state.held = sample
+            self._narrow(state, archived, sample, dt, config.deviation)
+            return []
+
+        # Doors closed on it: store the held sample (the last one the line still fits)
+        # and restart the corridor from there
+        held = state.held
+        if sample.t <= held.t:
+            # Same timestamp as the held sample: no slope to narrow by, store both
+            return self._store_and_restart(state, sample)
+        state.archive(held)
+        self._narrow(state, held, sample, sample.t - held.t, config.deviation)
+        state.held = sample
+        return [held.row]
+
+    @staticmethod
+    def _narrow(state: _State, archived: _Sample, sample: _Sample, dt: float, deviation: float):
+        state.slope_upper = min(state.slope_upper, (sample.value + deviation - archived.value) / dt)
+        state.slope_lower = max(state.slope_lower, (sample.value - deviation - archived.value) / dt)
+
+    def to_dict(self) -> dict:
+        return {
+            "received": self.received,
+            "stored": self.stored,
+            "compression_ratio": round(self.received / self.stored, 2) if self.stored else 0.0
+        }
@@ -0,0 +1,95 @@
+"""
+Per-sensor deadband (report-by-exception) for the collector's MQTT output.
+
+Configured per sensor in the machine YAML and synced into the sensor metadata:
+
+    publish:
+      mode: absolute      # absolute | percent | change
+      deadband: 0.5       # units (absolute) or % of the last published value (percent)
+      max_silence_s: 60   # heartbeat: publish anyway once this long without a publish
+
+A reading is published when it moves more than the deadband away from the
+last *published* value (so slow drift cannot escape it), or when the
+heartbeat expires. Sensors without a `publish` entry are published on every
+poll, as before.
+"""
+import logging
+
+logger = logging.getLogger("collector")
+
+DEADBAND_MODES = ("absolute", "percent", "change")
+
+# Previous values below this are treated as zero for percent deadbands
+NEAR_ZERO = 0.0001
+
+
+class Deadband:
+    __slots__ = ("mode", "deadband", "max_silence_s")
+
+    def __init__(self, mode: str = "absolute", deadband: float = 0.0, max_silence_s: float = 0):
+        self.mode = mode
+        self.deadband = deadband
+        self.max_silence_s = max_silence_s
+
+    def exceeded(self, reference: float, value: float) -> bool:
+        """True when value is outside the deadband around reference."""
+        if self.mode == "change":
+            return value != reference
+        delta = abs(value - reference)
+        if self.mode == "percent":
+            if abs(reference) < NEAR_ZERO:
+                return delta > NEAR_ZERO
+            return delta / abs(reference) * 100 > self.deadband
+        return delta > self.deadband
+
+
+def deadband_metadata(conf: dict) -> dict:
+    """Normalize a deadband entry of the machine YAML for the sensor metadata."""
+    mode = conf.get("mode", "absolute")
+    if mode not in DEADBAND_MODES:
+        logger.warning(f"⚠️ Unknown deadband mode '{mode}', using 'absolute'")
+        mode = "absolute"
+    return {
+        "mode": mode,
+        "deadband": float(conf.get("deadband", 0.0)),
+        "max_silence_s": float(conf.get("max_silence_s", 0))
+    }
+
+
+def deadband_from_metadata(sensor, key: str = "publish"):
+    """Deadband stored under key in the sensor metadata, None if not configured."""
+    conf = (sensor.metadata_info or {}).get(key)
+    if not conf:
+        return None
+    return Deadband(conf.get("mode", "absolute"), conf.get("deadband", 0.0), conf.get("max_silence_s", 0))
+
+
+class ReportByException:
+    """Decides which readings are published, tracking the last published value per sensor."""
+
+    def __init__(self):
+        self.last = {}  # sensor_id -> (published value, monotonic time)
+        self.published = 0
+        self.suppressed = 0
+
+    def should_publish(self, sensor_id: int, deadband: Deadband, value: float, now: float) -> bool:
+        if deadband is None:
+            self.published += 1
+            return True
+        last = self.last.get(sensor_id)
+        if (last is None
+                or deadband.exceeded(last[0], value)
+                or (deadband.max_silence_s and now - last[1] >= deadband.max_silence_s)):
+            self.last[sensor_id] = (value, now)
+            self.published += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def to_dict(self) -> dict:
+        total = self.published + self.suppressed
+        return {
+            "published": self.published,
+            "suppressed": self.suppressed,
+            "suppressed_percent": round(self.suppressed / total * 100, 1) if total else 0.0
+        }
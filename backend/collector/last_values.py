@@ -0,0 +1,68 @@
+"""
+Process-local last-value store for the collector.
+
+Warmed once from sensor_last_value at startup and consulted by the alarm and
+log logic instead of a SELECT per reading. Changed entries are written back
+with one batched INSERT ... ON CONFLICT (sensor_id) DO UPDATE per cycle. An
+entry stays dirty until the transaction that wrote it has committed, so a
+failed cycle writes it again on the next one.
+"""
+import logging
+from sqlalchemy import or_
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import models
+
+logger = logging.getLogger("collector")
+
+
+class LastValueCache:
+    def __init__(self):
+        self.values = {}  # sensor_id -> value
+        self.dirty = {}   # sensor_id -> row pending write-back
+
+    async def warm(self, db):
+        result = await db.execute(select(models.SensorLastValue.sensor_id, models.SensorLastValue.value))
+        self.values = {sensor_id: value for sensor_id, value in result.all()}
+        logger.info(f"🗂️ Last-value cache warmed with {len(self.values)} sensors")
+
+    def get(self, sensor_id: int):
+        return self.values.get(sensor_id)
+
+    def update(self, sensor_id: int, value: float, timestamp, quality: int):
+        self.values[sensor_id] = value
+        self.dirty[sensor_id] = {
+            "sensor_id": sensor_id,
+            "timestamp": timestamp,
+            "value": value,
+            "quality": quality
+        }
+
+    async def flush(self, db):
+        """Upsert every changed entry in one statement.
+
+        The caller commits, then passes the returned rows to committed().
+        """
+        if not self.dirty:
+            return None
+        rows = list(self.dirty.values())
+        table = models.SensorLastValue.__table__
+        stmt = pg_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["sensor_id"],
+            set_={
+                "timestamp": stmt.excluded.timestamp,
+                "value": stmt.excluded.value,
+                "quality": stmt.excluded.quality
+            },
+            # Concurrent cycles may write the same entry: never go back in time
+            where=or_(table.c.timestamp.is_(None), table.c.timestamp <= stmt.excluded.timestamp)
+        )
+        await db.execute(stmt, rows)
+        return rows
+
+    def committed(self, rows):
+        """Clear the written entries, unless they changed again since the flush."""
+        for row in rows or ():
+            if self.dirty.get(row["sensor_id"]) is row:
+                del self.dirty[row["sensor_id"]]
@@ -0,0 +1,63 @@
+"""
+Maintained per-severity totals of sensor_logs (sensor_log_counters table).
+
+Each poll cycle adds the number of log rows it wrote, in the same transaction
+as the rows, so the totals stay exact and the API's critical-count badge is a
+primary-key lookup instead of a count(*) over sensor_logs. After the commit
+the totals are published (retained) on LOG_COUNTS_TOPIC; the API pushes them
+to its WebSocket clients.
+"""
+import logging
+from sqlalchemy import func, text
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import models
+
+logger = logging.getLogger("collector")
+
+LOG_COUNTS_TOPIC = "system/log_counts"
+
+
+class SensorLogCounters:
+    def __init__(self):
+        self.totals = {}  # severity -> total, as of the last commit
+
+    async def warm(self, db):
+        """Load the totals; seed them once from sensor_logs if the table is new (caller commits)."""
+        result = await db.execute(select(models.SensorLogCounter.severity, models.SensorLogCounter.total))
+        rows = result.all()
+        if not rows:
+            logger.info("🧮 Seeding sensor_log_counters from sensor_logs (one-time count)")
+            await db.execute(text("""
+                INSERT INTO sensor_log_counters (severity, total)
+                SELECT severity, count(*) FROM sensor_logs WHERE severity IS NOT NULL GROUP BY severity
+                ON CONFLICT (severity) DO NOTHING
+            """))
+            result = await db.execute(select(models.SensorLogCounter.severity, models.SensorLogCounter.total))
+            rows = result.all()
+        self.totals = {severity: total for severity, total in rows}
+        logger.info(f"🧮 Sensor log counters: {self.totals}")
+
+    async def increment(self, db, counts: dict) -> dict:
+        """Add this cycle's rows per severity in the caller's transaction. Returns the new totals."""
+        if not counts:
+            return {}
+        stmt = pg_insert(models.SensorLogCounter.__table__).values(
+            [{"severity": severity, "total": count} for severity, count in counts.items()]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["severity"],
+            set_={"total": models.SensorLogCounter.__table__.c.total + stmt.excluded.total, "updated_at": func.now()}
+        ).returning(models.SensorLogCounter.severity, models.SensorLogCounter.total)
+        result = await db.execute(stmt)
+        return {severity: total for severity, total in result.all()}
+
+    def committed(self, totals: dict) -> bool:
+        """Apply the totals of a committed cycle. Returns True if any changed."""
+        changed = False
+        for severity, total in totals.items():
+            # Concurrent poll jobs may commit out of order: totals only grow
+            if total > self.totals.get(severity, 0):
+                self.totals[severity] = total
+                changed = True
+        return changed
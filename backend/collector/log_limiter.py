@@ -0,0 +1,137 @@
+"""
+Per-sensor rate limiter for sensor_logs.
+
+Enforces SensorSeverityConfig.log_interval_seconds in memory: the first
+log-worthy change after a quiet period is written immediately, further
+changes inside the interval are collapsed into one pending row that records
+the min / max value seen, the worst severity and the number of changes. The
+pending row is written when the interval expires, so each sensor produces at
+most one sensor_logs row per interval.
+
+Emitted rows stay in `unconfirmed` until the caller reports committed(); if
+the transaction fails they are handed out again by the next flush_due(), up
+to MAX_RETRY_ROWS (the oldest are dropped during a long DB outage).
+"""
+import heapq
+import logging
+from datetime import timedelta
+from severity import SEVERITY_LABELS
+
+logger = logging.getLogger("collector")
+
+MAX_RETRY_ROWS = 10000
+
+SEVERITY_RANK = {label: rank for rank, label in enumerate(SEVERITY_LABELS)}
+
+
+class _Window:
+    """Log-worthy changes of one sensor suppressed inside the current interval."""
+
+    __slots__ = ("first", "last", "due", "minimum", "maximum", "count", "severity", "variation_percent")
+
+    def __init__(self, row: dict, due):
+        self.first = row
+        self.last = row
+        self.due = due
+        self.minimum = row["current_value"]
+        self.maximum = row["current_value"]
+        self.count = 1
+        self.severity = row["severity"]
+        self.variation_percent = row["variation_percent"]
+
+    def add(self, row: dict):
+        self.last = row
+        self.minimum = min(self.minimum, row["current_value"])
+        self.maximum = max(self.maximum, row["current_value"])
+        self.count += 1
+        if SEVERITY_RANK.get(row["severity"], 0) > SEVERITY_RANK.get(self.severity, 0):
+            self.severity = row["severity"]
+        if abs(row["variation_percent"] or 0.0) > abs(self.variation_percent or 0.0):
+            self.variation_percent = row["variation_percent"]
+
+    def to_row(self) -> dict:
+        """Latest reading of the window, from the value before the burst, with its worst severity."""
+        row = dict(self.last)
+        row["previous_value"] = self.first["previous_value"]
+        row["severity"] = self.severity
+        row["variation_percent"] = self.variation_percent
+        row["window_min"] = self.minimum
+        row["window_max"] = self.maximum
+        row["sample_count"] = self.count
+        return row
+
+
+def single_row(row: dict) -> dict:
+    row["window_min"] = row["current_value"]
+    row["window_max"] = row["current_value"]
+    row["sample_count"] = 1
+    return row
+
+
+class SensorLogLimiter:
+    def __init__(self):
+        self.last_emitted = {}  # sensor_id -> timestamp of the last written row
+        self.windows = {}  # sensor_id -> _Window pending write
+        self._due = []  # heap of (due timestamp, sensor_id)
+        self.unconfirmed = {}  # id(row) -> emitted row whose transaction has not committed
+        self.retry = []  # emitted rows whose transaction was rolled back
+
+    def offer(self, row: dict, interval_s: float) -> list:
+        """
+        Submit a log-worthy SensorLog row. Returns the rows to write now
+        (empty while the change is absorbed in the sensor's pending window).
+        """
+        sensor_id = row["sensor_id"]
+        timestamp = row["timestamp"]
+        if not interval_s or interval_s <= 0:
+            return self._emit([single_row(row)])
+
+        last = self.last_emitted.get(sensor_id)
+        if last is None or (timestamp - last).total_seconds() >= interval_s:
+            window = self.windows.pop(sensor_id, None)
+            self.last_emitted[sensor_id] = timestamp
+            if window is None:
+                return self._emit([single_row(row)])
+            window.add(row)
+            return self._emit([window.to_row()])
+
+        window = self.windows.get(sensor_id)
+        if window is None:
+            due = last + timedelta(seconds=interval_s)
+            self.windows[sensor_id] = _Window(row, due)
+            heapq.heappush(self._due, (due, sensor_id))
+        else:
+            window.add(row)
+        return []
+
+    def flush_due(self, now) -> list:
+        """Rows of rolled-back transactions, then pending windows whose interval has expired (one row each)."""
+        rows, self.retry = self.retry, []
+        while self._due and self._due[0][0] <= now:
+            due, sensor_id = heapq.heappop(self._due)
+            window = self.windows.get(sensor_id)
+            if window is None or window.due != due:
+                continue  # Already written by offer()
+            del self.windows[sensor_id]
+            self.last_emitted[sensor_id] = due
+            rows.append(window.to_row())
+        return self._emit(rows)
+
+    def _emit(self, rows: list) -> list:
+        for row in rows:
+            self.unconfirmed[id(row)] = row
+        return rows
+
+    def committed(self, rows: list):
+        """The rows are in the DB."""
+        for row in rows or ():
+            self.unconfirmed.pop(id(row), None)
+
+    def failed(self, rows: list):
+        """The transaction was rolled back: the rows are written again by the next flush_due()."""
+        for row in rows or ():
+            if self.unconfirmed.pop(id(row), None) is not None:
+                self.retry.append(row)
+        if len(self.retry) > MAX_RETRY_ROWS:
+            logger.warning(f"⚠️ Dropping {len(self.retry) - MAX_RETRY_ROWS} sensor log rows that failed to commit")
+            del self.retry[:len(self.retry) - MAX_RETRY_ROWS]
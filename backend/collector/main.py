@@ -14,8 +14,16 @@ from database import AsyncSessionLocal, engine, Base
 import models
 import paho.mqtt.client as mqtt
 from pymodbus.client import AsyncModbusTcpClient
-from pymodbus.payload import BinaryPayloadDecoder
-from pymodbus.constants import Endian
+from read_planner import plan_reads, execute_plan, DEFAULT_REGISTER_GAP, DEFAULT_COIL_GAP
+from writer import SensorDataWriter, DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL_S, DEFAULT_MAX_QUEUE
+from last_values import LastValueCache
+from severity import SeverityConfigCache, PlcLogEvaluator, SEVERITY_CONFIG_TOPIC
+from log_limiter import SensorLogLimiter
+from alarms import AlarmEngine, alarm_definition, alarm_metadata
+from scheduler import DeadlineScheduler, PollJob, build_jobs, active_jobs, sensor_poll_interval
+from deadband import ReportByException, deadband_from_metadata, deadband_metadata
+from compression import StorageCompressor, compression_from_metadata, compression_metadata
+from log_counters import SensorLogCounters, LOG_COUNTS_TOPIC
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -45,6 +53,10 @@ class DBStats:
         self.total_write_time_ms = 0.0
         self.write_count = 0
         self.last_write_time_ms = 0.0
+        self.max_write_time_ms = 0.0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.queue_depth = 0
         self.last_error = None
         self.start_time = datetime.now(timezone.utc)
     
@@ -53,9 +65,12 @@ class DBStats:
         self.total_write_time_ms += duration_ms
         self.write_count += 1
         self.last_write_time_ms = duration_ms
+        self.max_write_time_ms = max(self.max_write_time_ms, duration_ms)
+        self.last_batch_size = count
+        self.max_batch_size = max(self.max_batch_size, count)
     
-    def record_error(self, error: str):
-        self.records_failed += 1
+    def record_error(self, error: str, count: int = 1):
+        self.records_failed += count
         self.last_error = error
     
     @property
@@ -63,6 +78,12 @@ class DBStats:
         if self.write_count == 0:
             return 0.0
         return self.total_write_time_ms / self.write_count
+
+    @property
+    def avg_batch_size(self) -> float:
+        if self.write_count == 0:
+            return 0.0
+        return self.records_saved / self.write_count
     
     def to_dict(self) -> dict:
         uptime = (datetime.now(timezone.utc) - self.start_time).total_seconds()
@@ -71,7 +92,12 @@ class DBStats:
             "records_failed": self.records_failed,
             "avg_write_time_ms": round(self.avg_write_time_ms, 2),
             "last_write_time_ms": round(self.last_write_time_ms, 2),
+            "max_write_time_ms": round(self.max_write_time_ms, 2),
             "write_operations": self.write_count,
+            "last_batch_size": self.last_batch_size,
+            "avg_batch_size": round(self.avg_batch_size, 1),
+            "max_batch_size": self.max_batch_size,
+            "queue_depth": self.queue_depth,
             "last_error": self.last_error,
             "uptime_seconds": int(uptime)
         }
@@ -98,13 +124,75 @@ def get_mqtt_config():
 
 MQTT_HOST, MQTT_PORT = get_mqtt_config()
 
+def get_modbus_config():
+    register_gap = int(os.getenv("MODBUS_MAX_REGISTER_GAP", DEFAULT_REGISTER_GAP))
+    coil_gap = int(os.getenv("MODBUS_MAX_COIL_GAP", DEFAULT_COIL_GAP))
+    if os.path.exists(SETTINGS_FILE):
+        with open(SETTINGS_FILE, "r") as f:
+            config = yaml.safe_load(f) or {}
+            modbus_conf = config.get("modbus") or {}
+            register_gap = modbus_conf.get("max_register_gap", register_gap)
+            coil_gap = modbus_conf.get("max_coil_gap", coil_gap)
+    return register_gap, coil_gap
+
+MODBUS_REGISTER_GAP, MODBUS_COIL_GAP = get_modbus_config()
+
+def get_writer_config():
+    batch_size = DEFAULT_BATCH_SIZE
+    flush_interval_s = DEFAULT_FLUSH_INTERVAL_S
+    max_queue = DEFAULT_MAX_QUEUE
+    if os.path.exists(SETTINGS_FILE):
+        with open(SETTINGS_FILE, "r") as f:
+            config = yaml.safe_load(f) or {}
+            writer_conf = config.get("writer") or {}
+            batch_size = writer_conf.get("batch_size", batch_size)
+            flush_interval_s = writer_conf.get("flush_interval_s", flush_interval_s)
+            max_queue = writer_conf.get("max_queue", max_queue)
+    return batch_size, flush_interval_s, max_queue
+
+WRITER_BATCH_SIZE, WRITER_FLUSH_INTERVAL_S, WRITER_MAX_QUEUE = get_writer_config()
+
+# Write-behind stage for sensor_data (flushed in batches by its own task)
+sensor_writer = SensorDataWriter(AsyncSessionLocal, db_stats, WRITER_BATCH_SIZE, WRITER_FLUSH_INTERVAL_S, WRITER_MAX_QUEUE)
+
+# Last value per sensor, kept in memory and written back once per cycle
+last_values = LastValueCache()
+
+# Severity thresholds per sensor, reloaded when the API announces a change over MQTT
+severity_configs = SeverityConfigCache()
+
+# Enforces log_interval_seconds per sensor (bursts collapse into one sensor_logs row)
+log_limiter = SensorLogLimiter()
+
+# Open alarms per sensor (edge-triggered, transitions written in batches)
+alarm_engine = AlarmEngine()
+
+# Last published value per sensor for deadband (report-by-exception) publishing
+report_by_exception = ReportByException()
+
+# Per-sensor swinging-door / deadband state deciding which readings reach sensor_data
+storage_compressor = StorageCompressor()
+
+# sensor_logs totals per severity (critical-count badge), published on LOG_COUNTS_TOPIC
+log_counters = SensorLogCounters()
+
 # MQTT Client
 mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
 
 def on_connect(client, userdata, flags, reason_code, properties):
     logger.info(f"Connected to MQTT with result code {reason_code}")
+    client.subscribe(f"{SEVERITY_CONFIG_TOPIC}/#")
+
+def on_message(client, userdata, msg):
+    try:
+        if msg.topic.startswith(SEVERITY_CONFIG_TOPIC):
+            payload = json.loads(msg.payload.decode()) if msg.payload else {}
+            severity_configs.request_refresh(payload.get("sensor_id"))
+    except Exception as e:
+        logger.error(f"Error processing MQTT message on {msg.topic}: {e}")
 
 mqtt_client.on_connect = on_connect
+mqtt_client.on_message = on_message
 
 async def sync_config_files(db: AsyncSession):
     logger.info("Syncing configuration from files...")
@@ -182,6 +270,7 @@ async def sync_config_files(db: AsyncSession):
                         port=plc_conf.get("port"),
                         unit_id=plc_conf.get("unit_id"),
                         poll_interval_s=plc_conf.get("poll_interval_s", 1),
+                        max_inflight=plc_conf.get("max_inflight", 1),
                         enabled=plc_conf.get("enabled", True)
                     )
                     db.add(plc)
@@ -192,20 +281,33 @@ async def sync_config_files(db: AsyncSession):
                     plc.ip_address = plc_conf.get("ip_address")
                     plc.port = plc_conf.get("port")
                     plc.poll_interval_s = plc_conf.get("poll_interval_s", 1)
+                    plc.max_inflight = plc_conf.get("max_inflight", 1)
                     # Only update enabled if explicitly set in file
                     if "enabled" in plc_conf:
                         plc.enabled = plc_conf["enabled"]
                     await db.commit()
 
-                # Sync Sensors
-                sensors_conf = config.get("sensors", [])
+                # Sync Sensors (entries of the alarms: section are sensors with alarm metadata)
+                sensors_conf = (config.get("sensors") or []) + (config.get("alarms") or [])
                 for sensor_conf in sensors_conf:
                     config_sensor_codes.add(sensor_conf["code"])
                     
-                    # Prepare metadata with value_map if present
+                    # Prepare metadata with value_map / alarm definition / own poll interval / deadbands if present
                     metadata = None
                     if sensor_conf.get("value_map"):
                         metadata = {"value_map": sensor_conf["value_map"]}
+                    if sensor_conf.get("is_alarm"):
+                        metadata = metadata or {}
+                        metadata["alarm"] = alarm_metadata(sensor_conf)
+                    if sensor_conf.get("poll_interval_s"):
+                        metadata = metadata or {}
+                        metadata["poll_interval_s"] = sensor_conf["poll_interval_s"]
+                    if sensor_conf.get("publish"):
+                        metadata = metadata or {}
+                        metadata["publish"] = deadband_metadata(sensor_conf["publish"])
+                    if sensor_conf.get("storage"):
+                        metadata = metadata or {}
+                        metadata["storage"] = compression_metadata(sensor_conf["storage"])
                     
                     result = await db.execute(select(models.Sensor).where(models.Sensor.code == sensor_conf["code"]))
                     sensor = result.scalar_one_or_none()
@@ -325,480 +427,299 @@ def get_config_mtime():
                 mtime = max(mtime, os.path.getmtime(os.path.join(CONFIG_PATH, f)))
     return mtime
 
-async def handle_sensor_alarm(db: AsyncSession, sensor, machine, current_value: float, timestamp: datetime):
-    """
-    Detectar y guardar alarmas cuando sensores marcados como is_alarm cambian de estado.
-    """
-    try:
-        # Revisar si el sensor está marcado como alarma
-        is_alarm = sensor.is_alarm if hasattr(sensor, 'is_alarm') else False
-        if not is_alarm:
-            return
-        
-        alarm_code = sensor.code
-        alarm_name = sensor.name
-        severity = "high"  # Default severity
-        color = "#FF0000"  # Default red color
-        
-        # Obtener el valor anterior del sensor
-        result = await db.execute(
-            select(models.SensorLastValue).where(models.SensorLastValue.sensor_id == sensor.id)
-        )
-        last_value_record = result.scalar_one_or_none()
-        prev_value = last_value_record.value if last_value_record else None
-        
-        # Detectar transición de estado (0->1 = activación, 1->0 = desactivación)
-        if prev_value is not None:
-            prev_alarm_active = prev_value > 0
-            curr_alarm_active = current_value > 0
-            
-            if prev_alarm_active != curr_alarm_active:
-                if curr_alarm_active:
-                    # Alarma se ACTIVÓ (0->1)
-                    existing_alarm = await db.execute(
-                        select(models.MachineAlarm).where(
-                            models.MachineAlarm.sensor_id == sensor.id,
-                            models.MachineAlarm.alarm_code == alarm_code,
-                            models.MachineAlarm.status == 1,
-                            models.MachineAlarm.timestamp_off == None
-                        )
-                    )
-                    if not existing_alarm.scalar_one_or_none():
-                        # Crear nueva alarma
-                        new_alarm = models.MachineAlarm(
-                            machine_id=machine.id,
-                            sensor_id=sensor.id,
-                            alarm_code=alarm_code,
-                            alarm_name=alarm_name,
-                            severity=severity,
-                            status=1,
-                            color=color,
-                            timestamp_on=timestamp,
-                            timestamp_off=None
-                        )
-                        db.add(new_alarm)
-                        logger.warning(f"🚨 ALARM TRIGGERED: {alarm_name} ({machine.code}) at {timestamp.isoformat()}")
-                else:
-                    # Alarma se DESACTIVÓ (1->0)
-                    active_alarm = await db.execute(
-                        select(models.MachineAlarm).where(
-                            models.MachineAlarm.sensor_id == sensor.id,
-                            models.MachineAlarm.alarm_code == alarm_code,
-                            models.MachineAlarm.status == 1,
-                            models.MachineAlarm.timestamp_off == None
-                        )
-                    )
-                    alarm_to_close = active_alarm.scalar_one_or_none()
-                    if alarm_to_close:
-                        alarm_to_close.status = 0
-                        alarm_to_close.timestamp_off = timestamp
-                        logger.info(f"✅ ALARM CLEARED: {alarm_name} ({machine.code}) at {timestamp.isoformat()}")
-    
-    except Exception as e:
-        logger.error(f"Error handling sensor alarm for {sensor.code}: {e}")
-
-async def handle_sensor_log(db: AsyncSession, sensor, machine_id: int, current_value: float, timestamp: datetime, is_initial_read: bool = False):
+def handle_sensor_logs(db: AsyncSession, evaluator: PlcLogEvaluator, machine_id: int, candidates: list) -> dict:
     """
     Registrar cambios de sensores en el log cuando la variación es mayor al threshold configurado.
-    Asigna severidad basada en los umbrales de configuración del sensor.
-    
+    Evalúa todas las lecturas de un PLC en un solo paso vectorizado (evaluate_batch) y
+    agrega solo las filas que deben convertirse en SensorLog.
+
     Args:
         db: Database session
-        sensor: Sensor model instance
+        evaluator: Per-PLC threshold arrays built from the severity config cache
         machine_id: Machine ID
-        current_value: Current sensor value
-        timestamp: Timestamp of the reading
-        is_initial_read: If True, register initial value as INFO without requiring variation threshold
+        candidates: (sensor, current_value, prev_value, timestamp) for this cycle; prev_value
+            comes from the last-value cache (None if never read)
+
+    Rows pass through log_limiter, which enforces log_interval_seconds per sensor.
+    Returns the number of rows added per severity (for log_counters) and the rows,
+    to report to log_limiter once the transaction is over.
     """
+    counts = {}
+    log_rows = []
     try:
-        logger.debug(f"🔍 handle_sensor_log called for {sensor.code}, is_initial_read={is_initial_read}")
-        
-        # Obtener configuración de severidad del sensor
-        result = await db.execute(
-            select(models.SensorSeverityConfig).where(
-                models.SensorSeverityConfig.sensor_id == sensor.id
-            )
+        results = evaluator.evaluate(
+            [sensor.id for sensor, _, _, _ in candidates],
+            [prev_value for _, _, prev_value, _ in candidates],
+            [current_value for _, current_value, _, _ in candidates]
         )
-        config = result.scalar_one_or_none()
-        
-        # Si no existe configuración, crearla por defecto
-        if not config:
-            config = models.SensorSeverityConfig(
-                sensor_id=sensor.id,
-                default_severity="INFO",
-                variation_threshold_normal=5.0,
-                variation_threshold_alert=10.0,
-                variation_threshold_critical=20.0,
-                log_enabled=True,
-                log_interval_seconds=0
-            )
-            db.add(config)
-            await db.commit()
-        
-        # Si el logging está deshabilitado, salir
-        if not config.log_enabled:
-            logger.debug(f"  -> Logging disabled for {sensor.code}")
-            return
-        
-        # Obtener valor anterior
-        result = await db.execute(
-            select(models.SensorLastValue).where(models.SensorLastValue.sensor_id == sensor.id)
-        )
-        last_value_record = result.scalar_one_or_none()
-        prev_value = last_value_record.value if last_value_record else None
-        logger.debug(f"  -> prev_value={prev_value}, current_value={current_value}")
-        
-        # Si no hay valor anterior (lectura inicial), registrar como INFO
-        if prev_value is None:
-            logger.info(f"📊 Registering initial value for sensor {sensor.code}: {current_value} {sensor.unit}")
-            sensor_log = models.SensorLog(
-                sensor_id=sensor.id,
-                machine_id=machine_id,
-                timestamp=timestamp,
-                previous_value=None,
-                current_value=current_value,
-                variation_percent=0.0,
-                severity="INFO",
-                unit=sensor.unit
-            )
-            db.add(sensor_log)
-            
-            # Guardar en last_value
-            if last_value_record:
-                last_value_record.value = current_value
-                last_value_record.timestamp = timestamp
+        for row, severity, variation_percent in results:
+            sensor, current_value, prev_value, timestamp = candidates[row]
+            if prev_value is None:
+                logger.info(f"📊 Registering initial value for sensor {sensor.code}: {current_value} {sensor.unit}")
             else:
-                last_value_record = models.SensorLastValue(
-                    sensor_id=sensor.id,
-                    timestamp=timestamp,
-                    value=current_value,
-                    quality=1.0
-                )
-                db.add(last_value_record)
-            return
-        
-        # Verificar si es sensor booleano crítico
-        is_boolean = sensor.type and 'boolean' in sensor.type.lower()
-        
-        # Para sensores booleanos críticos: cualquier cambio es CRITICAL
-        if is_boolean and config.is_boolean_critical:
-            if current_value != prev_value:
-                sensor_log = models.SensorLog(
-                    sensor_id=sensor.id,
-                    machine_id=machine_id,
-                    timestamp=timestamp,
-                    previous_value=prev_value,
-                    current_value=current_value,
-                    variation_percent=0.0,  # No aplicable a booleanos
-                    severity="CRITICAL",
-                    unit=sensor.unit
-                )
-                db.add(sensor_log)
-                logger.debug(f"📝 SensorLog (Boolean Critical): {sensor.name} - {prev_value} → {current_value} (CRITICAL)")
-                
-                # Update last_value_record
-                if last_value_record:
-                    last_value_record.value = current_value
-                    last_value_record.timestamp = timestamp
-                else:
-                    last_value_record = models.SensorLastValue(
-                        sensor_id=sensor.id,
-                        timestamp=timestamp,
-                        value=current_value,
-                        quality=1.0
-                    )
-                    db.add(last_value_record)
-            return
-        
-        # Para sensores booleanos normales: registrar como INFO sin porcentaje
-        if is_boolean:
-            if current_value != prev_value:
-                sensor_log = models.SensorLog(
-                    sensor_id=sensor.id,
-                    machine_id=machine_id,
-                    timestamp=timestamp,
-                    previous_value=prev_value,
-                    current_value=current_value,
-                    variation_percent=0.0,  # No aplicable a booleanos
-                    severity="INFO",
-                    unit=sensor.unit
-                )
-                db.add(sensor_log)
-                logger.debug(f"📝 SensorLog (Boolean): {sensor.name} - {prev_value} → {current_value} (INFO)")
-                
-                # Update last_value_record
-                if last_value_record:
-                    last_value_record.value = current_value
-                    last_value_record.timestamp = timestamp
-                else:
-                    last_value_record = models.SensorLastValue(
-                        sensor_id=sensor.id,
-                        timestamp=timestamp,
-                        value=current_value,
-                        quality=1.0
-                    )
-                    db.add(last_value_record)
-            return
-        
-        # Calcular variación porcentual (para sensores no booleanos)
-        if abs(prev_value) < 0.0001:  # Prevenir división por casi cero
-            if abs(current_value - prev_value) > 0.0001:  # Hubo cambio significativo
-                variation_percent = 100.0 if current_value > prev_value else -100.0
-            else:
-                return  # Sin cambio significativo
-        else:
-            variation_percent = ((current_value - prev_value) / abs(prev_value)) * 100
-        
-        # Verificar si la variación excede el threshold mínimo (5% por defecto)
-        min_threshold = config.variation_threshold_normal
-        if abs(variation_percent) < min_threshold:
-            return  # No registrar si variación es menor al threshold
-        
-        # Determinar severidad basada en thresholds
-        abs_variation = abs(variation_percent)
-        if abs_variation >= config.variation_threshold_critical:
-            severity = "CRITICAL"
-        elif abs_variation >= config.variation_threshold_alert:
-            severity = "ALERTA"
-        elif abs_variation >= config.variation_threshold_normal:
-            severity = "NORMAL"
-        else:
-            severity = "INFO"
-        
-        # Crear registro de log
-        sensor_log = models.SensorLog(
-            sensor_id=sensor.id,
-            machine_id=machine_id,
-            timestamp=timestamp,
-            previous_value=prev_value,
-            current_value=current_value,
-            variation_percent=round(variation_percent, 2),
-            severity=severity,
-            unit=sensor.unit
-        )
-        db.add(sensor_log)
-        logger.debug(f"📝 SensorLog: {sensor.name} - Variación {variation_percent:.2f}% ({severity})")
-        
-        # Update last_value_record after creating log
-        if last_value_record:
-            last_value_record.value = current_value
-            last_value_record.timestamp = timestamp
-        else:
-            last_value_record = models.SensorLastValue(
-                sensor_id=sensor.id,
-                timestamp=timestamp,
-                value=current_value,
-                quality=1.0
-            )
-            db.add(last_value_record)
-        
+                logger.debug(f"📝 SensorLog: {sensor.name} - {prev_value} → {current_value} ({variation_percent:.2f}%, {severity})")
+
+            # log_interval_seconds: bursts inside the interval collapse into one row (min/max)
+            log_row = {
+                "sensor_id": sensor.id,
+                "machine_id": machine_id,
+                "timestamp": timestamp,
+                "previous_value": prev_value,
+                "current_value": current_value,
+                "variation_percent": variation_percent,
+                "severity": severity,
+                "unit": sensor.unit
+            }
+            interval = severity_configs.get(sensor.id).log_interval_seconds
+            for log_row in log_limiter.offer(log_row, interval):
+                db.add(models.SensorLog(**log_row))
+                log_rows.append(log_row)
+                counts[log_row["severity"]] = counts.get(log_row["severity"], 0) + 1
+
+        # Windows that expired without a new change (and rows of a failed cycle) are written now
+        for log_row in log_limiter.flush_due(datetime.now(timezone.utc)):
+            db.add(models.SensorLog(**log_row))
+            log_rows.append(log_row)
+            counts[log_row["severity"]] = counts.get(log_row["severity"], 0) + 1
+
     except Exception as e:
-        logger.error(f"❌ Error handling sensor log for {sensor.code}: {e}")
+        logger.error(f"❌ Error handling sensor logs for machine {machine_id}: {e}")
         import traceback
         logger.error(traceback.format_exc())
+    return counts, log_rows
+
+def publish_log_counts():
+    """Publish the sensor_logs totals per severity (retained, pushed to WebSocket clients by the API)."""
+    mqtt_client.publish(LOG_COUNTS_TOPIC, json.dumps({
+        "totals": log_counters.totals,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }), retain=True)
+
+async def poll_job(client, job: PollJob, alarm_defs: dict):
+    """Read, publish and store one tick of a poll job (the sensors of a PLC sharing an interval)."""
+    plc = job.plc
+    sensors = job.sensors
+    machine_code = job.machine_code
+
+    readings_log = []
+
+    # Read all blocks of this job before touching the DB
+    try:
+        readings = await execute_plan(client, job.blocks, plc.code, plc.max_inflight or 1)
+    except Exception as e:
+        logger.error(f"❌ Error reading PLC {plc.code}: {e!r}")
+        db_stats.record_error(str(e))
+        return
+
+    # Open DB session once per poll to reduce overhead
+    alarm_flush = None
+    log_rows = None
+    try:
+        async with AsyncSessionLocal() as db:
+            machine_id = plc.machine_id
+
+            # Apply severity config changes announced by the API
+            await severity_configs.refresh_pending(db)
+            await alarm_engine.refresh_if_stale(db)
+            log_candidates = []
+
+            for sensor in sensors:
+                if sensor.id not in readings:
+                    continue  # Function code not handled by the read planner
+
+                try:
+                    # Already decoded in one pass per block with the sensor's precompiled plan
+                    raw_value, value, timestamp = readings[sensor.id]
+                    quality = 0 if value is not None else 2 # 2 = Error
+
+                    if value is not None:
+                        # Determine icon based on type
+                        icon = "📊"
+                        if "temp" in sensor.type.lower(): icon = "🌡️"
+                        elif "rpm" in sensor.type.lower(): icon = "⚙️"
+                        elif "state" in sensor.type.lower(): icon = "🟢" if value > 0 else "🔴"
+                        elif "pressure" in sensor.type.lower(): icon = "💨"
+                        elif sensor.type.lower() == "boolean": icon = "🟢" if value > 0 else "🔴"
+                        elif sensor.type.lower() == "program": icon = "📋"
+
+                        # Format display value based on display_format
+                        display_value = value
+                        if sensor.display_format == "boolean":
+                            display_value = "ON" if value > 0 else "OFF"
+                        elif sensor.display_format == "mapped" and sensor.metadata_info:
+                            value_map = sensor.metadata_info.get("value_map", {})
+                            # Convert value to int for lookup (keys in YAML are ints)
+                            int_value = int(value)
+                            display_value = value_map.get(str(int_value), value_map.get(int_value, f"#{int_value}"))
+
+                        readings_log.append(f"{icon} {sensor.name}: {display_value}{sensor.unit}")
+
+                        # Publish MQTT (report-by-exception for sensors with a publish deadband)
+                        if report_by_exception.should_publish(sensor.id, job.publish_deadbands.get(sensor.id), value, time.monotonic()):
+                            topic = f"machines/{machine_code}/{plc.code}/{sensor.code}"
+                            payload = {
+                                "sensor_code": sensor.code,
+                                "timestamp": timestamp.isoformat(),
+                                "value": value,
+                                "display_value": str(display_value),
+                                "raw_value": raw_value,
+                                "quality": quality,
+                                "unit": sensor.unit,
+                                "machine": machine_code,
+                                "plc": plc.code
+                            }
+                            mqtt_client.publish(topic, json.dumps(payload))
+
+                        # Queue for the batched sensor_data writer
+                        # Sanitize raw_value for Integer column
+                        safe_raw_value = raw_value
+                        if safe_raw_value is not None:
+                            try:
+                                # Check if it fits in 4-byte signed integer
+                                if not (-2147483648 <= safe_raw_value <= 2147483647):
+                                    safe_raw_value = None
+                                else:
+                                    safe_raw_value = int(safe_raw_value)
+                            except Exception:
+                                safe_raw_value = None
+
+                        compression = job.storage_compression.get(sensor.id)
+                        if compression is None:
+                            sensor_writer.put(sensor.id, timestamp, value, quality, safe_raw_value)
+                        else:
+                            # Storage compression: only the samples needed to rebuild the series
+                            for row in storage_compressor.offer(compression, (sensor.id, timestamp, value, quality, safe_raw_value)):
+                                sensor_writer.put(*row)
+
+                        # Previous value from the in-memory cache (no SELECT per reading)
+                        prev_value = last_values.get(sensor.id)
+
+                        # Alarm sensors: O(1) edge check against the open alarms held in memory
+                        alarm = alarm_defs.get(sensor.id)
+                        if alarm is not None:
+                            alarm_engine.observe(alarm, machine_id, machine_code, value, timestamp)
+
+                        # Collected for the batched sensor log evaluation below
+                        log_candidates.append((sensor, value, prev_value, timestamp))
+
+                        # Update Last Value (prev_value was captured above for the log evaluation)
+                        last_values.update(sensor.id, value, timestamp, quality)
+
+                except Exception as e:
+                    import traceback
+                    logger.error(f"❌ Error handling sensor {sensor.code}: {e!r}")
+                    logger.error(traceback.format_exc())
+                    quality = 2
+                    db_stats.record_error(str(e))
+
+            # Handle sensor logs (registra cambios en el historial) for the whole job at once
+            log_counts, log_rows = handle_sensor_logs(db, job.evaluator, machine_id, log_candidates)
+
+            # Write back last values in one upsert, alarm transitions in one batch,
+            # log totals in one upsert, and commit logs for this PLC at once
+            # (sensor_data goes through sensor_writer)
+            last_values_flush = await last_values.flush(db)
+            alarm_flush = await alarm_engine.flush(db)
+            log_totals = await log_counters.increment(db, log_counts)
+            await db.commit()
+            last_values.committed(last_values_flush)
+            log_limiter.committed(log_rows)
+            log_rows = None
+            alarm_engine.committed(alarm_flush)
+            alarm_flush = None
+            if log_counters.committed(log_totals):
+                publish_log_counts()
+    except Exception as db_error:
+        logger.warning(f"⚠️ Database error for PLC {plc.code}, skipping this cycle: {db_error}")
+        db_stats.record_error(str(db_error))
+        # Session will be rolled back automatically when exiting async with block
+    finally:
+        # Also when the job is cancelled mid-commit (group restart): requeue the transitions and log rows
+        alarm_engine.failed(alarm_flush)
+        log_limiter.failed(log_rows)
+
+    if readings_log:
+        logger.info(f"📡 [{plc.name}] {' | '.join(readings_log)}")
+
+def sensor_signature(sensor, plc) -> tuple:
+    """Per-sensor settings compiled into the poll jobs at group start"""
+    metadata = sensor.metadata_info or {}
+    return (
+        sensor.id,
+        # Per-sensor poll intervals decide the deadline scheduler's jobs
+        sensor_poll_interval(sensor, plc),
+        # Report-by-exception deadband (job.publish_deadbands)
+        json.dumps(metadata.get("publish"), sort_keys=True),
+        # Storage compression (job.storage_compression)
+        json.dumps(metadata.get("storage"), sort_keys=True)
+    )
+
+def group_signature(plcs_in_group) -> list:
+    """Settings a running group loop is built from; the group is restarted when they change."""
+    return sorted(
+        (
+            p["plc"].code,
+            p["plc"].poll_interval_s,
+            # Modbus requests kept in flight on the shared connection (execute_plan)
+            p["plc"].max_inflight or 1,
+            tuple(sorted(sensor_signature(sensor, p["plc"]) for sensor in p["sensors"]))
+        )
+        for p in plcs_in_group
+    )
 
 async def read_group_loop(group_key, plcs_in_group, is_initial_startup: bool = False):
     ip, port = group_key
     logger.info(f"Starting shared connection loop for {ip}:{port} (handling {len(plcs_in_group)} logical PLCs)")
     
     client = AsyncModbusTcpClient(ip, port=port)
-    first_cycle = True  # Track if this is the first cycle for this group
-    
-    while True:
-        try:
-            if not client.connected:
-                logger.info(f"🔌 Attempting to connect to {ip}:{port}...")
-                await client.connect()
-                if client.connected:
-                    logger.info(f"✅ Successfully connected to {ip}:{port}")
-            
-            if not client.connected:
-                logger.error(f"❌ Failed to connect to {ip}:{port}. Retrying in 60 seconds...")
-                await asyncio.sleep(60)
-                continue
 
-            # Iterate over each logical PLC in this group
-            for plc_data in plcs_in_group:
-                plc = plc_data["plc"]
-                sensors = plc_data["sensors"]
-                machine_code = plc_data["machine_code"]
-                
-                readings_log = []
-                records_to_save = 0
+    # One poll job per PLC and interval; read plans (and decode plans) are built once per group start
+    jobs = build_jobs(plcs_in_group)
+    for job in jobs:
+        job.blocks = plan_reads(job.sensors, job.plc.unit_id, MODBUS_REGISTER_GAP, MODBUS_COIL_GAP)
+        job.evaluator = PlcLogEvaluator(job.sensors, severity_configs)
+        job.publish_deadbands = {sensor.id: deadband_from_metadata(sensor) for sensor in job.sensors}
+        job.storage_compression = {sensor.id: compression_from_metadata(sensor) for sensor in job.sensors}
+        active_jobs[job.key] = job
+        logger.info(f"🧩 [{job.key}] {len(job.sensors)} sensors -> {len(job.blocks)} Modbus requests per poll")
+    alarm_defs = {}
+    for plc_data in plcs_in_group:
+        for sensor in plc_data["sensors"]:
+            definition = alarm_definition(sensor)
+            if definition is not None:
+                alarm_defs[sensor.id] = definition
+
+    scheduler = DeadlineScheduler(jobs)
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                if not client.connected:
+                    logger.info(f"🔌 Attempting to connect to {ip}:{port}...")
+                    await client.connect()
+                    if client.connected:
+                        logger.info(f"✅ Successfully connected to {ip}:{port}")
                 
-                # Open DB session once per PLC poll to reduce overhead
+                if not client.connected:
+                    logger.error(f"❌ Failed to connect to {ip}:{port}. Retrying in 60 seconds...")
+                    await asyncio.sleep(60)
+                    continue
+
+                # Run whichever job is due next; each keeps its own fixed cadence
+                job, due, seq = await scheduler.next_job()
+                started = loop.time()
                 try:
-                    async with AsyncSessionLocal() as db:
-                        # Get machine object for this PLC
-                        result_m = await db.execute(select(models.Machine).where(models.Machine.id == plc.machine_id))
-                        machine = result_m.scalar_one_or_none()
-                        if not machine:
-                            logger.warning(f"⚠️ Machine not found for PLC {plc.code}")
-                            continue
-                        
-                        for sensor in sensors:
-                            value = None
-                            quality = 0
-                            raw_value = None
-                            
-                            try:
-                                if sensor.function_code == 3: # Holding Register
-                                    count = 2 if sensor.data_type in ["float32", "uint32"] else 1
-                                    rr = await client.read_holding_registers(sensor.address, count, slave=plc.unit_id)
-                                    if not rr.isError():
-                                        # Default Endianness
-                                        byte_order = Endian.BIG
-                                        word_order = Endian.BIG
-                                        
-                                        if sensor.swap == "word":
-                                            word_order = Endian.LITTLE
-                                        
-                                        decoder = BinaryPayloadDecoder.fromRegisters(rr.registers, byteorder=byte_order, wordorder=word_order)
-                                        
-                                        if sensor.data_type == "float32":
-                                            raw_value = decoder.decode_32bit_float()
-                                        elif sensor.data_type == "uint32":
-                                            raw_value = decoder.decode_32bit_uint()
-                                        else:
-                                            raw_value = decoder.decode_16bit_int()
-                                            
-                                        value = (raw_value * sensor.scale_factor) + sensor.offset
-                                        
-                                        if sensor.precision is not None:
-                                            value = round(value, sensor.precision)
-                                    else:
-                                        quality = 2 # Error
-                                        # logger.warning(f"Modbus error reading sensor {sensor.code} on PLC {plc.code}")
-                                elif sensor.function_code == 1: # Coil
-                                    rr = await client.read_coils(sensor.address, 1, slave=plc.unit_id)
-                                    if not rr.isError():
-                                        raw_value = 1 if rr.bits[0] else 0
-                                        value = float(raw_value)
-                                    else:
-                                        quality = 2
-                                        # logger.warning(f"Modbus error reading sensor {sensor.code} on PLC {plc.code}")
-                                
-                                if value is not None:
-                                    timestamp = datetime.now(timezone.utc)
-                                    
-                                    # Determine icon based on type
-                                    icon = "📊"
-                                    if "temp" in sensor.type.lower(): icon = "🌡️"
-                                    elif "rpm" in sensor.type.lower(): icon = "⚙️"
-                                    elif "state" in sensor.type.lower(): icon = "🟢" if value > 0 else "🔴"
-                                    elif "pressure" in sensor.type.lower(): icon = "💨"
-                                    elif sensor.type.lower() == "boolean": icon = "🟢" if value > 0 else "🔴"
-                                    elif sensor.type.lower() == "program": icon = "📋"
-                                    
-                                    # Format display value based on display_format
-                                    display_value = value
-                                    if sensor.display_format == "boolean":
-                                        display_value = "ON" if value > 0 else "OFF"
-                                    elif sensor.display_format == "mapped" and sensor.metadata_info:
-                                        value_map = sensor.metadata_info.get("value_map", {})
-                                        # Convert value to int for lookup (keys in YAML are ints)
-                                        int_value = int(value)
-                                        display_value = value_map.get(str(int_value), value_map.get(int_value, f"#{int_value}"))
-                                    
-                                    readings_log.append(f"{icon} {sensor.name}: {display_value}{sensor.unit}")
-                                    
-                                    # Publish MQTT
-                                    topic = f"machines/{machine_code}/{plc.code}/{sensor.code}"
-                                    payload = {
-                                        "sensor_code": sensor.code,
-                                        "timestamp": timestamp.isoformat(),
-                                        "value": value,
-                                        "display_value": str(display_value),
-                                        "raw_value": raw_value,
-                                        "quality": quality,
-                                        "unit": sensor.unit,
-                                        "machine": machine_code,
-                                        "plc": plc.code
-                                    }
-                                    mqtt_client.publish(topic, json.dumps(payload))
-                                    
-                                    # Save to DB
-                                    # Sanitize raw_value for Integer column
-                                    safe_raw_value = raw_value
-                                    if safe_raw_value is not None:
-                                        try:
-                                            # Check if it fits in 4-byte signed integer
-                                            if not (-2147483648 <= safe_raw_value <= 2147483647):
-                                                safe_raw_value = None
-                                            else:
-                                                safe_raw_value = int(safe_raw_value)
-                                        except Exception:
-                                            safe_raw_value = None
-
-                                    sensor_data = models.SensorData(
-                                        sensor_id=sensor.id,
-                                        timestamp=timestamp,
-                                        value=value,
-                                        quality=quality,
-                                        raw_value=safe_raw_value
-                                    )
-                                    db.add(sensor_data)
-                                    
-                                    # Handle alarms if this sensor is marked as is_alarm
-                                    await handle_sensor_alarm(db, sensor, machine, value, timestamp)
-                                    
-                                    # Handle sensor logs (registra cambios en el historial)
-                                    # On the first cycle of system startup, register as initial data
-                                    logger.info(f"🔍 BEFORE handle_sensor_log: sensor={sensor.code}, is_initial_startup={is_initial_startup}, first_cycle={first_cycle}")
-                                    await handle_sensor_log(db, sensor, machine.id, value, timestamp, is_initial_read=(is_initial_startup and first_cycle))
-                                    logger.info(f"✅ AFTER handle_sensor_log: sensor={sensor.code}")
-                                    
-                                    # Update Last Value (AFTER handle_sensor_log so it sees pre-updated state)
-                                    result = await db.execute(select(models.SensorLastValue).where(models.SensorLastValue.sensor_id == sensor.id))
-                                    last_val = result.scalar_one_or_none()
-                                    if last_val:
-                                        last_val.timestamp = timestamp
-                                        last_val.value = value
-                                        last_val.quality = quality
-                                    else:
-                                        last_val = models.SensorLastValue(
-                                            sensor_id=sensor.id,
-                                            timestamp=timestamp,
-                                            value=value,
-                                            quality=quality
-                                        )
-                                    db.add(last_val)
-                                    records_to_save += 1
-
-                            except Exception as e:
-                                import traceback
-                                logger.error(f"❌ Error handling sensor {sensor.code}: {e!r}")
-                                logger.error(traceback.format_exc())
-                                quality = 2
-                                db_stats.record_error(str(e))
-                    
-                        # Commit all changes for this PLC at once (outside sensor loop, inside db session)
-                        if records_to_save > 0:
-                            write_start = time.time()
-                            await db.commit()
-                            write_duration_ms = (time.time() - write_start) * 1000
-                            db_stats.record_write(write_duration_ms, records_to_save)
-                        else:
-                            await db.commit()
-                except Exception as db_error:
-                    logger.warning(f"⚠️ Database error for PLC {plc.code}, skipping this cycle: {db_error}")
-                    db_stats.record_error(str(db_error))
-                    # Session will be rolled back automatically when exiting async with block
+                    await poll_job(client, job, alarm_defs)
+                finally:
+                    scheduler.done(job, due, seq, started)
                 
-                if readings_log:
-                    logger.info(f"📡 [{plc.name}] {' | '.join(readings_log)}")
-
-            # Mark first cycle as complete after processing all PLCs
-            if first_cycle:
-                first_cycle = False
-            
-            # Sleep interval (using the first PLC's interval as reference, or default 1s)
-            interval = plcs_in_group[0]["plc"].poll_interval_s
-            await asyncio.sleep(interval)
-            
-        except Exception as e:
-            logger.error(f"❌ Error in group loop {ip}:{port}: {e}. Retrying in 60 seconds...")
-            await asyncio.sleep(60)
+            except Exception as e:
+                logger.error(f"❌ Error in group loop {ip}:{port}: {e}. Retrying in 60 seconds...")
+                await asyncio.sleep(60)
+    finally:
+        for job in jobs:
+            if active_jobs.get(job.key) is job:
+                del active_jobs[job.key]
 
 def get_system_resources() -> dict:
     """Get system resource usage (CPU, memory, disk)."""
@@ -1032,7 +953,10 @@ async def publish_system_status():
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "collector": {
                 "status": "online",
-                "stats": collector_stats
+                "stats": collector_stats,
+                "scheduler": {key: job.to_dict() for key, job in active_jobs.items()},
+                "publish": report_by_exception.to_dict(),
+                "storage": storage_compressor.to_dict()
             },
             "postgresql": pg_stats,
             "mqtt": {
@@ -1119,6 +1043,23 @@ async def main():
             
         # Initial sync
         await sync_config_files(db)
+
+        # Warm the last-value cache once (the poll loops never SELECT sensor_last_value)
+        await last_values.warm(db)
+
+        # Load all severity configs once (the poll loops never SELECT sensor_severity_config)
+        await severity_configs.load(db)
+
+        # Open alarms are held in memory; machine_alarms is only written on transitions
+        await alarm_engine.warm(db)
+
+        # sensor_logs totals per severity are maintained on insert (seeded once if missing)
+        await log_counters.warm(db)
+        await db.commit()
+        publish_log_counts()
+
+    # Start the batched sensor_data writer before any poll loop produces readings
+    writer_task = asyncio.create_task(sensor_writer.run())
     
     running_tasks = {} # key -> task
     group_signatures = {} # key -> set of plc codes
@@ -1144,6 +1085,13 @@ async def main():
             # 2. Get active PLCs from DB
             async with AsyncSessionLocal() as db:
                 plcs = await get_active_plcs(db)
+
+                # Create missing default severity configs in one batch (instead of mid-poll)
+                await severity_configs.ensure_defaults(db, [s.id for p in plcs for s in p["sensors"]])
+                await db.commit()
+
+            # Safety net: full severity config reload in case an MQTT notification was missed
+            severity_configs.request_refresh()
             
             # 3. Group PLCs
             new_plc_groups = {}
@@ -1208,7 +1156,7 @@ async def main():
             # Re-implementing the loop logic cleanly
             for key in new_keys:
                 new_group = new_plc_groups[key]
-                new_sig = sorted([(p["plc"].code, p["plc"].poll_interval_s) for p in new_group])
+                new_sig = group_signature(new_group)
                 
                 if key not in running_tasks:
                     # New
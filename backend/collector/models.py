@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, DateTime, JSON, text
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Float, ForeignKey, DateTime, JSON, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -33,6 +33,7 @@ class PLC(Base):
     stopbits = Column(Integer, nullable=True)
     databits = Column(Integer, nullable=True)
     poll_interval_s = Column(Integer, default=1)
+    max_inflight = Column(Integer, default=1)  # Requests en vuelo por conexión Modbus TCP (1 = serial)
     enabled = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -72,9 +73,10 @@ class Sensor(Base):
 class SensorData(Base):
     __tablename__ = "sensor_data"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # Composite primary key: TimescaleDB hypertables need the partitioning column in unique constraints
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     sensor_id = Column(Integer, ForeignKey("sensors.id"), nullable=False)
-    timestamp = Column(DateTime(timezone=True), nullable=False, index=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, nullable=False, index=True)
     value = Column(Float, nullable=False)
     quality = Column(Integer, default=0)
     raw_value = Column(Integer, nullable=True)
@@ -102,14 +104,40 @@ class PLCStatus(Base):
 
     plc = relationship("PLC", back_populates="status")
 
+class MachineAlarm(Base):
+    __tablename__ = "machine_alarms"
+
+    id = Column(Integer, primary_key=True, index=True)
+    machine_id = Column(Integer, ForeignKey("machines.id"), nullable=False, index=True)
+    sensor_id = Column(Integer, ForeignKey("sensors.id"), nullable=False, index=True)
+    alarm_code = Column(String, nullable=False, index=True)  # falla_variador_sec21
+    alarm_name = Column(String, nullable=False)  # Falla Variador SEC21
+    severity = Column(String, nullable=False)  # high, critical, medium, low
+    status = Column(Integer, default=1)  # 1 = activa, 0 = inactiva
+    color = Column(String, default="#FF0000")  # Color de visualización
+    timestamp_on = Column(DateTime(timezone=True), nullable=False)  # Cuándo se activó
+    timestamp_off = Column(DateTime(timezone=True), nullable=True)  # Cuándo se desactivó (NULL si sigue activa)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    machine = relationship("Machine", foreign_keys=[machine_id])
+    sensor = relationship("Sensor", foreign_keys=[sensor_id])
+
+    # Keyset pagination (timestamp_on DESC, id DESC), see api/pagination.py
+    __table_args__ = (
+        Index("ix_machine_alarms_timestamp_on_id", timestamp_on.desc(), id.desc()),
+        Index("ix_machine_alarms_machine_id_timestamp_on_id", machine_id, timestamp_on.desc(), id.desc()),
+    )
+
 class SensorLog(Base):
     """Registro de cambios en valores de sensores"""
     __tablename__ = "sensor_logs"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # Composite primary key (id, timestamp), see SensorData
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     sensor_id = Column(Integer, ForeignKey("sensors.id"), nullable=False, index=True)
     machine_id = Column(Integer, ForeignKey("machines.id"), nullable=False, index=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), index=True)
     
     # Valores del sensor
     previous_value = Column(Float, nullable=True)
@@ -120,10 +148,31 @@ class SensorLog(Base):
     severity = Column(String, default="INFO")  # INFO, NORMAL, ALERTA, CRITICAL
     unit = Column(String, nullable=True)
     
+    # Ventana colapsada por log_interval_seconds (min/max y cantidad de cambios agrupados)
+    window_min = Column(Float, nullable=True)
+    window_max = Column(Float, nullable=True)
+    sample_count = Column(Integer, nullable=True, default=1)
+    
     # Relaciones
     sensor = relationship("Sensor", foreign_keys=[sensor_id])
     machine = relationship("Machine", foreign_keys=[machine_id])
 
+    # Keyset pagination (timestamp DESC, id DESC), see api/pagination.py
+    __table_args__ = (
+        Index("ix_sensor_logs_timestamp_id", timestamp.desc(), id.desc()),
+        Index("ix_sensor_logs_sensor_id_timestamp_id", sensor_id, timestamp.desc(), id.desc()),
+        Index("ix_sensor_logs_machine_id_timestamp_id", machine_id, timestamp.desc(), id.desc()),
+        Index("ix_sensor_logs_severity_timestamp_id", severity, timestamp.desc(), id.desc()),
+    )
+
+class SensorLogCounter(Base):
+    """Total de sensor_logs por severidad, mantenido por el collector al insertar (evita count(*))"""
+    __tablename__ = "sensor_log_counters"
+
+    severity = Column(String, primary_key=True)  # INFO, NORMAL, ALERTA, CRITICAL
+    total = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class SensorSeverityConfig(Base):
     """Configuración de severidad y thresholds por sensor"""
     __tablename__ = "sensor_severity_config"
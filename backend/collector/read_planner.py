@@ -0,0 +1,195 @@
+"""
+Modbus read planner for the collector.
+
+Groups the sensors of a logical PLC by function code and unit id and merges
+adjacent (or nearby) addresses into contiguous blocks, so a poll issues one
+request per block instead of one request per sensor.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pymodbus.pdu import ExceptionResponse
+from decoding import compile_sensor, pack_registers
+
+logger = logging.getLogger("collector")
+
+# Modbus protocol limits per request
+MAX_REGISTERS_PER_READ = 125
+MAX_COILS_PER_READ = 2000
+
+# Default gap tolerance (unused addresses read to join two sensors in one block)
+DEFAULT_REGISTER_GAP = 8
+DEFAULT_COIL_GAP = 64
+
+READ_LIMITS = {
+    1: MAX_COILS_PER_READ,      # Coils
+    3: MAX_REGISTERS_PER_READ,  # Holding Registers
+}
+
+
+class ReadBlock:
+    """One Modbus request covering one or more sensors."""
+
+    def __init__(self, function_code: int, unit_id: int, start: int):
+        self.function_code = function_code
+        self.unit_id = unit_id
+        self.start = start
+        self.count = 0
+        self.items = []  # (sensor, offset, decode plan)
+
+    @property
+    def end(self) -> int:
+        return self.start + self.count
+
+    def add(self, sensor, plan):
+        offset = sensor.address - self.start
+        self.items.append((sensor, offset, plan))
+        self.count = max(self.count, offset + plan.span)
+
+    def split(self) -> list:
+        """Break the block into one block per sensor."""
+        blocks = []
+        for sensor, _, plan in self.items:
+            block = ReadBlock(self.function_code, self.unit_id, sensor.address)
+            block.add(sensor, plan)
+            blocks.append(block)
+        return blocks
+
+    def decode(self, data, timestamp, readings: dict):
+        """Decode a whole response in one pass into readings[sensor id] = (raw_value, value, timestamp)."""
+        if self.function_code == 1:
+            for sensor, offset, plan in self.items:
+                raw_value, value = plan.decode_bit(data[offset])
+                readings[sensor.id] = (raw_value, value, timestamp)
+            return
+        buf = pack_registers(data)
+        for sensor, offset, plan in self.items:
+            raw_value, value = plan.decode(buf, offset)
+            readings[sensor.id] = (raw_value, value, timestamp)
+
+    def fail(self, timestamp, readings: dict):
+        for sensor, _, _ in self.items:
+            readings[sensor.id] = (None, None, timestamp)
+
+    def __repr__(self):
+        return f"ReadBlock(fc={self.function_code}, unit={self.unit_id}, start={self.start}, count={self.count}, sensors={len(self.items)})"
+
+
+def plan_reads(sensors, unit_id: int, register_gap: int = DEFAULT_REGISTER_GAP, coil_gap: int = DEFAULT_COIL_GAP) -> list:
+    """
+    Build the list of read blocks for the sensors of one PLC.
+
+    Sensors are sorted by address and merged into a block while the hole between
+    them is at most the gap tolerance and the block stays within the protocol
+    limit for its function code. Unsupported function codes are skipped.
+    Each sensor's decode plan is compiled here, once per group start.
+    """
+    by_function = {}
+    for sensor in sensors:
+        if sensor.function_code in READ_LIMITS:
+            by_function.setdefault(sensor.function_code, []).append(sensor)
+
+    blocks = []
+    for function_code in sorted(by_function):
+        limit = READ_LIMITS[function_code]
+        max_gap = coil_gap if function_code == 1 else register_gap
+        block = None
+        for sensor in sorted(by_function[function_code], key=lambda s: s.address):
+            plan = compile_sensor(sensor)
+            if block is not None:
+                gap = sensor.address - block.end
+                new_count = max(block.count, sensor.address + plan.span - block.start)
+                if gap <= max_gap and new_count <= limit:
+                    block.add(sensor, plan)
+                    continue
+            block = ReadBlock(function_code, unit_id, sensor.address)
+            block.add(sensor, plan)
+            blocks.append(block)
+    return blocks
+
+
+async def read_block(client, block: ReadBlock):
+    """Issue the request for a block. Returns the raw response."""
+    if block.function_code == 3:
+        return await client.read_holding_registers(block.start, block.count, slave=block.unit_id)
+    return await client.read_coils(block.start, block.count, slave=block.unit_id)
+
+
+def block_data(block: ReadBlock, rr):
+    """Registers or bits from a successful response, None on error."""
+    if rr.isError():
+        return None
+    return rr.registers if block.function_code == 3 else rr.bits
+
+
+async def read_pipelined(client, blocks: list, max_inflight: int) -> list:
+    """
+    Issue the requests of a plan with up to max_inflight outstanding on the
+    connection (responses are matched to requests by Modbus transaction id).
+
+    Every request is awaited before returning, so nothing is left in flight.
+    Returns (response or exception, timestamp) per block, in plan order.
+    """
+    semaphore = asyncio.Semaphore(max_inflight)
+
+    async def read_one(block):
+        async with semaphore:
+            try:
+                rr = await read_block(client, block)
+            except Exception as e:
+                rr = e
+            return rr, datetime.now(timezone.utc)
+
+    return await asyncio.gather(*(read_one(block) for block in blocks))
+
+
+async def execute_plan(client, blocks: list, plc_code: str = "", max_inflight: int = 1) -> dict:
+    """
+    Read and decode every block of a plan.
+
+    Returns a dict sensor id -> (raw_value, value, timestamp); sensors whose
+    block failed map to (None, None, timestamp). A multi-sensor block rejected
+    by the device with an exception response (typically an illegal address
+    inside a gap) is split into per-sensor blocks, re-read immediately, and
+    replaced in the plan so later cycles don't retry the bad range.
+
+    With max_inflight > 1 the block requests are pipelined (see
+    read_pipelined) and decoded in plan order afterwards; a request that
+    raised (timeout, connection lost) fails the whole plan, as in serial mode.
+    """
+    responses = None
+    if max_inflight > 1 and len(blocks) > 1:
+        responses = await read_pipelined(client, blocks, max_inflight)
+
+    readings = {}
+    refined = []
+    for i, block in enumerate(blocks):
+        if responses is None:
+            rr = await read_block(client, block)
+            timestamp = datetime.now(timezone.utc)
+        else:
+            rr, timestamp = responses[i]
+            if isinstance(rr, Exception):
+                raise rr
+
+        if isinstance(rr, ExceptionResponse) and len(block.items) > 1:
+            logger.warning(f"⚠️ {block!r} rejected by PLC {plc_code} ({rr}). Falling back to per-sensor reads")
+            for part in block.split():
+                refined.append(part)
+                part_data = block_data(part, await read_block(client, part))
+                part_timestamp = datetime.now(timezone.utc)
+                if part_data is None:
+                    part.fail(part_timestamp, readings)
+                else:
+                    part.decode(part_data, part_timestamp, readings)
+            continue
+
+        refined.append(block)
+        data = block_data(block, rr)
+        if data is None:
+            block.fail(timestamp, readings)
+        else:
+            block.decode(data, timestamp, readings)
+
+    blocks[:] = refined
+    return readings
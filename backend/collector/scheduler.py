@@ -0,0 +1,128 @@
+"""
+Deadline scheduler for the logical PLCs of one Modbus connection group.
+
+Each PLC is split into poll jobs, one per distinct poll interval among its
+sensors (the PLC's poll_interval_s, or a sensor's own poll_interval_s from
+the machine YAML), so critical tags can be sampled every second and slow ones
+every 10 s over the same connection. A job is due at fixed multiples of its
+interval from the group start, so the cadence does not drift with the time
+spent reading and writing; a job that falls behind skips the missed ticks
+instead of running back-to-back. Jitter and overrun counters are kept per job
+and published with the collector status.
+"""
+import asyncio
+import heapq
+import logging
+
+logger = logging.getLogger("collector")
+
+# job key -> PollJob for every running group (published with the collector status)
+active_jobs = {}
+
+
+def sensor_poll_interval(sensor, plc) -> float:
+    interval = (sensor.metadata_info or {}).get("poll_interval_s")
+    return float(interval or plc.poll_interval_s or 1)
+
+
+class JobStats:
+    def __init__(self):
+        self.runs = 0
+        self.overruns = 0
+        self.skipped_ticks = 0
+        self.total_jitter_ms = 0.0
+        self.last_jitter_ms = 0.0
+        self.max_jitter_ms = 0.0
+        self.last_duration_ms = 0.0
+        self.max_duration_ms = 0.0
+
+    def record_run(self, jitter_ms: float, duration_ms: float):
+        self.runs += 1
+        self.total_jitter_ms += jitter_ms
+        self.last_jitter_ms = jitter_ms
+        self.max_jitter_ms = max(self.max_jitter_ms, jitter_ms)
+        self.last_duration_ms = duration_ms
+        self.max_duration_ms = max(self.max_duration_ms, duration_ms)
+
+    def record_overrun(self, skipped: int):
+        self.overruns += 1
+        self.skipped_ticks += skipped
+
+    @property
+    def avg_jitter_ms(self) -> float:
+        if self.runs == 0:
+            return 0.0
+        return self.total_jitter_ms / self.runs
+
+    def to_dict(self) -> dict:
+        return {
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "skipped_ticks": self.skipped_ticks,
+            "avg_jitter_ms": round(self.avg_jitter_ms, 2),
+            "last_jitter_ms": round(self.last_jitter_ms, 2),
+            "max_jitter_ms": round(self.max_jitter_ms, 2),
+            "last_duration_ms": round(self.last_duration_ms, 2),
+            "max_duration_ms": round(self.max_duration_ms, 2)
+        }
+
+
+class PollJob:
+    """The sensors of one PLC that share a poll interval."""
+
+    def __init__(self, plc_data: dict, sensors: list, interval_s: float):
+        self.plc_data = plc_data
+        self.plc = plc_data["plc"]
+        self.machine_code = plc_data["machine_code"]
+        self.sensors = sensors
+        self.interval_s = interval_s
+        self.key = f"{self.plc.code}@{interval_s:g}s"
+        self.blocks = []  # Read plan, built by the group loop
+        self.evaluator = None  # PlcLogEvaluator, built by the group loop
+        self.publish_deadbands = {}  # sensor_id -> Deadband (None = publish every poll)
+        self.storage_compression = {}  # sensor_id -> CompressionConfig (None = store every reading)
+        self.stats = JobStats()
+
+    def to_dict(self) -> dict:
+        return {"plc": self.plc.code, "interval_s": self.interval_s, "sensors": len(self.sensors), **self.stats.to_dict()}
+
+
+def build_jobs(plcs_in_group: list) -> list:
+    jobs = []
+    for plc_data in plcs_in_group:
+        by_interval = {}
+        for sensor in plc_data["sensors"]:
+            by_interval.setdefault(sensor_poll_interval(sensor, plc_data["plc"]), []).append(sensor)
+        for interval_s in sorted(by_interval):
+            jobs.append(PollJob(plc_data, by_interval[interval_s], interval_s))
+    return jobs
+
+
+class DeadlineScheduler:
+    def __init__(self, jobs: list):
+        self._heap = []
+        start = asyncio.get_running_loop().time()
+        for seq, job in enumerate(jobs):
+            heapq.heappush(self._heap, (start, seq, job))
+
+    async def next_job(self):
+        """Wait for the earliest deadline. Returns (job, due, seq)."""
+        loop = asyncio.get_running_loop()
+        due = self._heap[0][0]
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        due, seq, job = heapq.heappop(self._heap)
+        return job, due, seq
+
+    def done(self, job: PollJob, due: float, seq: int, started: float):
+        """Record the run and schedule the job's next tick on its fixed grid, skipping missed ticks."""
+        now = asyncio.get_running_loop().time()
+        job.stats.record_run((started - due) * 1000, (now - started) * 1000)
+        next_due = due + job.interval_s
+        if next_due <= now:
+            missed = int((now - next_due) // job.interval_s) + 1
+            next_due += missed * job.interval_s
+            job.stats.record_overrun(missed)
+            logger.debug(f"⏱️ [{job.key}] overrun, skipped {missed} tick(s)")
+        heapq.heappush(self._heap, (next_due, seq, job))
@@ -0,0 +1,284 @@
+"""
+Sensor severity configuration cache and log evaluation.
+
+All sensor_severity_config rows are loaded into memory once; missing default
+rows are created in one batch when a group starts. The API announces changes
+on the SEVERITY_CONFIG_TOPIC MQTT topic and the affected rows are reloaded on
+the next poll cycle, so threshold evaluation is a pure in-memory function with
+no DB round-trip on the hot path.
+
+evaluate_log() is the per-reading reference; evaluate_batch() applies the same
+rules to a whole poll cycle of a PLC at once with NumPy.
+"""
+import logging
+import threading
+import numpy as np
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import models
+
+logger = logging.getLogger("collector")
+
+# Published by the API when a sensor's severity config changes (payload: {"sensor_id": ...})
+SEVERITY_CONFIG_TOPIC = "config/severity"
+
+DEFAULT_THRESHOLD_NORMAL = 5.0
+DEFAULT_THRESHOLD_ALERT = 10.0
+DEFAULT_THRESHOLD_CRITICAL = 20.0
+
+# Variations below this are treated as zero (prevents division by ~0)
+NEAR_ZERO = 0.0001
+
+# Severity codes used by evaluate_batch (index into SEVERITY_LABELS)
+SEVERITY_LABELS = ("INFO", "NORMAL", "ALERTA", "CRITICAL")
+INFO, NORMAL, ALERTA, CRITICAL = range(4)
+
+# Below this many readings per cycle PlcLogEvaluator uses evaluate_log() directly
+VECTORIZE_MIN_READINGS = 256
+
+
+class SeverityConfig:
+    """In-memory snapshot of one sensor_severity_config row."""
+
+    __slots__ = ("sensor_id", "variation_threshold_normal", "variation_threshold_alert",
+                 "variation_threshold_critical", "is_boolean_critical", "log_enabled", "log_interval_seconds")
+
+    def __init__(self, sensor_id: int, variation_threshold_normal: float = DEFAULT_THRESHOLD_NORMAL,
+                 variation_threshold_alert: float = DEFAULT_THRESHOLD_ALERT,
+                 variation_threshold_critical: float = DEFAULT_THRESHOLD_CRITICAL,
+                 is_boolean_critical: bool = False, log_enabled: bool = True, log_interval_seconds: int = 0):
+        self.sensor_id = sensor_id
+        self.variation_threshold_normal = variation_threshold_normal
+        self.variation_threshold_alert = variation_threshold_alert
+        self.variation_threshold_critical = variation_threshold_critical
+        self.is_boolean_critical = is_boolean_critical
+        self.log_enabled = log_enabled
+        self.log_interval_seconds = log_interval_seconds
+
+    @classmethod
+    def from_row(cls, row):
+        def pick(value, default):
+            return default if value is None else value
+        return cls(
+            sensor_id=row.sensor_id,
+            variation_threshold_normal=pick(row.variation_threshold_normal, DEFAULT_THRESHOLD_NORMAL),
+            variation_threshold_alert=pick(row.variation_threshold_alert, DEFAULT_THRESHOLD_ALERT),
+            variation_threshold_critical=pick(row.variation_threshold_critical, DEFAULT_THRESHOLD_CRITICAL),
+            is_boolean_critical=pick(row.is_boolean_critical, False),
+            log_enabled=pick(row.log_enabled, True),
+            log_interval_seconds=pick(row.log_interval_seconds, 0)
+        )
+
+
+def default_config_row(sensor_id: int) -> dict:
+    return {
+        "sensor_id": sensor_id,
+        "default_severity": "INFO",
+        "variation_threshold_normal": DEFAULT_THRESHOLD_NORMAL,
+        "variation_threshold_alert": DEFAULT_THRESHOLD_ALERT,
+        "variation_threshold_critical": DEFAULT_THRESHOLD_CRITICAL,
+        "is_boolean_critical": False,
+        "log_enabled": True,
+        "log_interval_seconds": 0
+    }
+
+
+def is_boolean_sensor(sensor) -> bool:
+    return bool(sensor.type and 'boolean' in sensor.type.lower())
+
+
+def evaluate_log(config: SeverityConfig, is_boolean: bool, prev_value, current_value: float):
+    """
+    Decide whether a reading becomes a SensorLog entry.
+
+    Returns (severity, variation_percent) or None when nothing must be logged:
+    - first reading (no previous value): INFO
+    - boolean sensors: any change, CRITICAL if is_boolean_critical else INFO
+    - analog sensors: percent variation against the previous value, logged
+      from the NORMAL threshold up and graded NORMAL / ALERTA / CRITICAL
+    """
+    if not config.log_enabled:
+        return None
+
+    if prev_value is None:
+        return "INFO", 0.0
+
+    if is_boolean:
+        if current_value == prev_value:
+            return None
+        return ("CRITICAL" if config.is_boolean_critical else "INFO"), 0.0
+
+    if abs(prev_value) < NEAR_ZERO:
+        if abs(current_value - prev_value) <= NEAR_ZERO:
+            return None  # Sin cambio significativo
+        variation_percent = 100.0 if current_value > prev_value else -100.0
+    else:
+        variation_percent = ((current_value - prev_value) / abs(prev_value)) * 100
+
+    abs_variation = abs(variation_percent)
+    if abs_variation < config.variation_threshold_normal:
+        return None
+
+    if abs_variation >= config.variation_threshold_critical:
+        severity = "CRITICAL"
+    elif abs_variation >= config.variation_threshold_alert:
+        severity = "ALERTA"
+    else:
+        severity = "NORMAL"
+    return severity, round(variation_percent, 2)
+
+
+def evaluate_batch(prev_values, current_values, threshold_normal, threshold_alert, threshold_critical,
+                   is_boolean, is_boolean_critical, log_enabled):
+    """
+    Vectorized evaluate_log() for one poll cycle.
+
+    All arguments are 1-D arrays of the same length; prev_values holds NaN for
+    sensors without a previous value. Returns (indices, severity codes,
+    variation percents) for the rows that must become SensorLog entries only.
+    """
+    prev_values = np.asarray(prev_values, dtype=np.float64)
+    current_values = np.asarray(current_values, dtype=np.float64)
+    is_boolean = np.asarray(is_boolean, dtype=bool)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        initial = np.isnan(prev_values)
+        delta = current_values - prev_values
+        near_zero = np.abs(prev_values) < NEAR_ZERO
+        variation = np.where(
+            near_zero,
+            np.where(current_values > prev_values, 100.0, -100.0),
+            delta / np.abs(prev_values) * 100
+        )
+        abs_variation = np.abs(variation)
+
+        boolean_log = is_boolean & (current_values != prev_values)
+        analog_log = (~is_boolean
+                      & (~near_zero | (np.abs(delta) > NEAR_ZERO))
+                      & (abs_variation >= threshold_normal))
+        log = np.asarray(log_enabled, dtype=bool) & (initial | boolean_log | analog_log)
+
+    indices = np.flatnonzero(log)
+    abs_variation = abs_variation[indices]
+    severity = np.select(
+        [initial[indices],
+         is_boolean[indices] & np.asarray(is_boolean_critical, dtype=bool)[indices],
+         is_boolean[indices],
+         abs_variation >= np.asarray(threshold_critical)[indices],
+         abs_variation >= np.asarray(threshold_alert)[indices]],
+        [INFO, CRITICAL, INFO, CRITICAL, ALERTA],
+        default=NORMAL
+    )
+    variation = np.where(initial[indices] | is_boolean[indices], 0.0, np.round(variation[indices], 2))
+    return indices, severity, variation
+
+
+class PlcLogEvaluator:
+    """Per-PLC threshold arrays for evaluate_batch, rebuilt when the config cache changes."""
+
+    def __init__(self, sensors, configs: "SeverityConfigCache"):
+        self.configs = configs
+        self.positions = {sensor.id: i for i, sensor in enumerate(sensors)}
+        self.sensor_ids = [sensor.id for sensor in sensors]
+        self.is_boolean = np.array([is_boolean_sensor(sensor) for sensor in sensors], dtype=bool)
+        self.version = -1
+
+    def _rebuild(self):
+        configs = [self.configs.get(sensor_id) for sensor_id in self.sensor_ids]
+        self.threshold_normal = np.array([c.variation_threshold_normal for c in configs], dtype=np.float64)
+        self.threshold_alert = np.array([c.variation_threshold_alert for c in configs], dtype=np.float64)
+        self.threshold_critical = np.array([c.variation_threshold_critical for c in configs], dtype=np.float64)
+        self.is_boolean_critical = np.array([c.is_boolean_critical for c in configs], dtype=bool)
+        self.log_enabled = np.array([c.log_enabled for c in configs], dtype=bool)
+        self.version = self.configs.version
+
+    def evaluate(self, sensor_ids, prev_values, current_values):
+        """
+        Evaluate one cycle's readings (prev None = first reading) with
+        evaluate_batch(), or evaluate_log() for small cycles.
+
+        Returns a list of (row, severity, variation_percent) where row is the
+        position in the given sequences.
+        """
+        if len(sensor_ids) < VECTORIZE_MIN_READINGS:
+            # NumPy setup costs more than it saves on small PLCs
+            results = []
+            for row, sensor_id in enumerate(sensor_ids):
+                result = evaluate_log(self.configs.get(sensor_id), bool(self.is_boolean[self.positions[sensor_id]]),
+                                      prev_values[row], current_values[row])
+                if result is not None:
+                    results.append((row, result[0], result[1]))
+            return results
+
+        if self.version != self.configs.version:
+            self._rebuild()
+        pos = np.array([self.positions[sensor_id] for sensor_id in sensor_ids], dtype=np.intp)
+        indices, severity, variation = evaluate_batch(
+            np.array(prev_values, dtype=np.float64),  # None -> NaN
+            np.array(current_values, dtype=np.float64),
+            self.threshold_normal[pos], self.threshold_alert[pos], self.threshold_critical[pos],
+            self.is_boolean[pos], self.is_boolean_critical[pos], self.log_enabled[pos]
+        )
+        return [(row, SEVERITY_LABELS[code], percent)
+                for row, code, percent in zip(indices.tolist(), severity.tolist(), variation.tolist())]
+
+
+class SeverityConfigCache:
+    def __init__(self):
+        self.configs = {}  # sensor_id -> SeverityConfig
+        self._defaults = {}  # sensor_id -> default SeverityConfig for sensors without a DB row
+        self.version = 0  # bumped on every change so PlcLogEvaluator knows to rebuild
+        self._pending = set()  # sensor ids to reload (None = reload all)
+        self._lock = threading.Lock()  # request_refresh is called from the MQTT thread
+
+    def get(self, sensor_id: int) -> SeverityConfig:
+        config = self.configs.get(sensor_id)
+        if config is None:
+            # Not in the DB yet: use defaults without caching them in configs,
+            # so ensure_defaults() still creates the row
+            config = self._defaults.get(sensor_id)
+            if config is None:
+                config = self._defaults[sensor_id] = SeverityConfig(sensor_id)
+        return config
+
+    async def load(self, db):
+        result = await db.execute(select(models.SensorSeverityConfig))
+        self.configs = {row.sensor_id: SeverityConfig.from_row(row) for row in result.scalars().all()}
+        self._defaults = {}
+        self.version += 1
+        logger.info(f"🎚️ Severity config cache loaded ({len(self.configs)} sensors)")
+
+    async def ensure_defaults(self, db, sensor_ids):
+        """Create the missing default rows for these sensors in one batch (caller commits)."""
+        missing = [sensor_id for sensor_id in sensor_ids if sensor_id not in self.configs]
+        if not missing:
+            return
+        stmt = pg_insert(models.SensorSeverityConfig.__table__).on_conflict_do_nothing(index_elements=["sensor_id"])
+        await db.execute(stmt, [default_config_row(sensor_id) for sensor_id in missing])
+        await self._reload(db, missing)
+        logger.info(f"🎚️ Created default severity config for {len(missing)} sensors")
+
+    def request_refresh(self, sensor_id: int = None):
+        """Mark a sensor (or every sensor when None) for reload on the next cycle. Thread-safe."""
+        with self._lock:
+            self._pending.add(sensor_id)
+
+    async def refresh_pending(self, db):
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, set()
+        if None in pending:
+            await self.load(db)
+        else:
+            await self._reload(db, list(pending))
+            logger.info(f"🎚️ Severity config reloaded for sensors {sorted(pending)}")
+
+    async def _reload(self, db, sensor_ids):
+        result = await db.execute(
+            select(models.SensorSeverityConfig).where(models.SensorSeverityConfig.sensor_id.in_(sensor_ids))
+        )
+        for row in result.scalars().all():
+            self.configs[row.sensor_id] = SeverityConfig.from_row(row)
+            self._defaults.pop(row.sensor_id, None)
+        self.version += 1
@@ -0,0 +1,159 @@
+"""
+Write-behind stage for sensor_data.
+
+Readings are queued in memory by the poll loops and a single writer task
+flushes them in batches (when the batch is full or the flush interval
+expires) with one multi-row INSERT, instead of one ORM object per reading.
+
+A batch mixes the readings of every PLC, so a failed INSERT must not lose
+them all: on a connection error the rows are kept for the next flush and the
+writer backs off (up to MAX_BACKOFF_S); on a data error the batch is split in
+halves until the offending rows are isolated, and only those are dropped.
+"""
+import asyncio
+import logging
+import time
+from sqlalchemy import insert, exc
+import models
+
+logger = logging.getLogger("collector")
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL_S = 1.0
+DEFAULT_MAX_QUEUE = 50000
+
+INITIAL_BACKOFF_S = 0.5
+MAX_BACKOFF_S = 30.0
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Database unreachable or connection lost (worth retrying), as opposed to a bad row."""
+    if isinstance(error, exc.DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, (exc.OperationalError, exc.InterfaceError, exc.DisconnectionError,
+                              exc.TimeoutError, OSError, asyncio.TimeoutError))
+
+
+class SensorDataWriter:
+    def __init__(self, session_factory, stats, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval_s: float = DEFAULT_FLUSH_INTERVAL_S, max_queue: int = DEFAULT_MAX_QUEUE):
+        self.session_factory = session_factory
+        self.stats = stats
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_queue = max_queue
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.retry_rows = []  # rows of failed flushes, written first by the next one
+        self.failures = 0  # consecutive connection failures (drives the backoff)
+
+    def put(self, sensor_id: int, timestamp, value: float, quality: int, raw_value):
+        """Queue one reading. Never blocks the poll loop; a full queue drops the reading."""
+        try:
+            self.queue.put_nowait({
+                "sensor_id": sensor_id,
+                "timestamp": timestamp,
+                "value": value,
+                "quality": quality,
+                "raw_value": raw_value
+            })
+        except asyncio.QueueFull:
+            self.stats.record_error("sensor_data write queue full, reading dropped")
+        self.stats.queue_depth = self.queue.qsize()
+
+    def _drain(self, batch: list):
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+
+    async def run(self):
+        """Writer task: collect a batch (size- or time-triggered) and flush it."""
+        loop = asyncio.get_running_loop()
+        logger.info(f"💾 sensor_data writer started (batch_size={self.batch_size}, flush_interval={self.flush_interval_s}s)")
+        batch = []
+        try:
+            while True:
+                if self.failures:
+                    await asyncio.sleep(min(MAX_BACKOFF_S, INITIAL_BACKOFF_S * 2 ** (self.failures - 1)))
+                # Rows waiting for a retry are flushed even if no new reading arrives
+                batch = [] if self.retry_rows else [await self.queue.get()]
+                deadline = loop.time() + self.flush_interval_s
+                while True:
+                    self._drain(batch)
+                    remaining = deadline - loop.time()
+                    if len(batch) >= self.batch_size or remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                await self.flush(batch)
+                batch = []
+        except asyncio.CancelledError:
+            # Flush whatever is still pending before stopping
+            while batch or not self.queue.empty():
+                self._drain(batch)
+                await self.flush(batch)
+                batch = []
+            if self.retry_rows:
+                await self.flush([])
+            if self.retry_rows:
+                logger.error(f"❌ {len(self.retry_rows)} sensor_data rows not written at shutdown")
+                self.stats.record_error("database unavailable at shutdown", len(self.retry_rows))
+            raise
+
+    async def _insert(self, rows: list):
+        async with self.session_factory() as db:
+            await db.execute(insert(models.SensorData.__table__), rows)
+            await db.commit()
+
+    def _requeue(self, rows: list):
+        """Keep rows for the next flush, bounded like the queue (oldest dropped first)."""
+        self.retry_rows.extend(rows)
+        overflow = len(self.retry_rows) - self.max_queue
+        if overflow > 0:
+            del self.retry_rows[:overflow]
+            self.stats.record_error("sensor_data retry buffer full, oldest readings dropped", overflow)
+
+    async def _isolate(self, rows: list, error: Exception) -> int:
+        """Write a batch rejected for its data in halves, dropping only the rows that fail alone."""
+        if len(rows) == 1:
+            logger.error(f"❌ Dropping sensor_data row {rows[0]}: {error}")
+            self.stats.record_error(str(error), 1)
+            return 0
+        written = 0
+        middle = len(rows) // 2
+        for part in (rows[:middle], rows[middle:]):
+            try:
+                await self._insert(part)
+                written += len(part)
+            except Exception as e:
+                if is_connection_error(e):
+                    self._requeue(part)
+                else:
+                    written += await self._isolate(part, e)
+        return written
+
+    async def flush(self, rows: list):
+        rows = self.retry_rows + rows
+        self.retry_rows = []
+        if not rows:
+            return
+        write_start = time.time()
+        try:
+            await self._insert(rows)
+            written = len(rows)
+            self.failures = 0
+        except Exception as e:
+            if is_connection_error(e):
+                self.failures += 1
+                logger.warning(f"⚠️ Failed to flush {len(rows)} sensor_data rows, retrying (attempt {self.failures}): {e}")
+                self.stats.record_error(str(e), 0)
+                self._requeue(rows)
+                self.stats.queue_depth = self.queue.qsize() + len(self.retry_rows)
+                return
+            self.failures = 0
+            logger.error(f"❌ sensor_data batch of {len(rows)} rows rejected, isolating bad rows: {e}")
+            written = await self._isolate(rows, e)
+        if written:
+            write_duration_ms = (time.time() - write_start) * 1000
+            self.stats.record_write(write_duration_ms, written)
+        self.stats.queue_depth = self.queue.qsize() + len(self.retry_rows)
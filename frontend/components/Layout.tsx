@@ -5,6 +5,7 @@ import { LayoutDashboard, Factory, History, Settings, Menu, X, Server, Activity,
 import { useAppContext } from '../App';
 import { useAuth } from '../features/auth/useAuth';
 import { scadaBackendService } from '../services/scadaBackendService';
+import { mqttService } from '../services/mqttService';
 
 const APP_VERSION = '0.1.0';
 
@@ -29,10 +30,22 @@ export const Layout: React.FC = () => {
       }
     };
 
+    // El backend envía el contador por WebSocket a todos los clientes cuando cambia
+    // (sin suscripción: no filtrar la conexión compartida con las otras páginas)
+    const onCriticalCount = (payload: any) => {
+      if (typeof payload?.count === 'number') {
+        setCriticalAlarmCount(payload.count);
+      }
+    };
+    mqttService.onBroadcast('critical_count', onCriticalCount);
+
     loadCriticalCount();
-    // Actualizar cada 30 segundos
+    // Actualizar cada 30 segundos (respaldo si no hay WebSocket)
     const interval = setInterval(loadCriticalCount, 30000);
-    return () => clearInterval(interval);
+    return () => {
+      clearInterval(interval);
+      mqttService.offBroadcast('critical_count', onCriticalCount);
+    };
   }, []);
 
   const navItems = [
@@ -4,6 +4,9 @@ import { adminService } from '../../services/adminService';
 import { LineChart, Line, XAxis, YAxis, Tooltip, ResponsiveContainer, CartesianGrid, Legend } from 'recharts';
 import { Download, Calendar, Filter, RefreshCw } from 'lucide-react';
 
+// Points the chart can draw; longer ranges come back as 1m / 15m / 1h buckets
+const HISTORY_MAX_POINTS = 2000;
+
 export const HistoryPage: React.FC = () => {
   const { currentBackend } = useAppContext();
   const [sensors, setSensors] = useState<any[]>([]);
@@ -47,7 +50,8 @@ export const HistoryPage: React.FC = () => {
       const data = await adminService.getSensorHistory(
         selectedSensorId, 
         fromDate.toISOString(), 
-        now.toISOString()
+        now.toISOString(),
+        HISTORY_MAX_POINTS
       );
       
       // Format data for chart
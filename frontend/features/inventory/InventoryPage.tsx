@@ -59,6 +59,9 @@ export const InventoryPage: React.FC = () => {
     if (mqttStatus === 'connected') {
       console.log('📡 Inventory: Subscribing to sensor updates...');
       
+      // Only the latest value per sensor is shown: batch updates every 250 ms
+      mqttService.setCoalesceWindow(250);
+      
       // Subscribe to all sensor updates via wildcard
       mqttService.subscribe('machines/#', (payload: any, topic?: string) => {
         // Topic format: machines/{machine_code}/{plc_code}/{sensor_code}
@@ -107,6 +110,7 @@ export const InventoryPage: React.FC = () => {
     return () => {
       if (mqttStatus === 'connected') {
         mqttService.unsubscribe('machines/#');
+        mqttService.setCoalesceWindow(0);
       }
     };
   }, [mqttStatus]);
@@ -389,9 +389,10 @@ class AdminService {
     }
   }
 
-  async getSensorHistory(sensorId: number | string, from: string, to: string): Promise<HistoryDatapoint[]> {
+  async getSensorHistory(sensorId: number | string, from: string, to: string, maxPoints?: number): Promise<HistoryDatapoint[]> {
     try {
       const params = new URLSearchParams({ from, to });
+      if (maxPoints) params.append('max_points', maxPoints.toString());
       const url = this.buildUrl(`/api/sensors/${sensorId}/history?${params}`);
       const response = await fetch(url, { headers: this.getHeaders() });
       if (!response.ok) throw new Error('Failed to fetch sensor history');
@@ -18,6 +18,7 @@ class MQTTService {
   private token: string = '';
   private isConnecting: boolean = false;
   private messageCallbacks: Map<string, Set<MessageCallback>> = new Map();
+  private broadcastCallbacks: Map<string, Set<MessageCallback>> = new Map();
   private connectionChangeCallbacks: Set<ConnectionChangeCallback> = new Set();
   private systemStatusCallbacks: Set<SystemStatusCallback> = new Set();
   private postgresStatusCallbacks: Set<PostgreSQLStatusCallback> = new Set();
@@ -25,6 +26,7 @@ class MQTTService {
   private maxReconnectAttempts: number = 5;
   private reconnectDelay: number = 3000;
   private reconnectTimeout: ReturnType<typeof setTimeout> | null = null;
+  private coalesceWindowMs: number = 0;
 
   /**
    * Connect to WebSocket endpoint
@@ -58,6 +60,9 @@ class MQTTService {
           console.log('✅ WebSocket connected');
           this.isConnecting = false;
           this.reconnectAttempts = 0;
+          if (this.coalesceWindowMs > 0) {
+            this.sendCoalesceWindow();
+          }
           this.notifyConnectionChange(true);
           resolve();
         };
@@ -160,6 +165,40 @@ class MQTTService {
     }
   }
 
+  /**
+   * Latest-value batching: the backend holds topic updates for windowMs and
+   * sends the newest value per topic in one batch frame (0 = every message)
+   */
+  setCoalesceWindow(windowMs: number): void {
+    this.coalesceWindowMs = windowMs;
+    this.sendCoalesceWindow();
+  }
+
+  /**
+   * Listen for system-wide notifications of a message type (e.g. 'critical_count').
+   * The backend sends them to every client, so no subscription is sent: the
+   * connection keeps its current topic filter.
+   */
+  onBroadcast(type: string, callback: MessageCallback): void {
+    if (!this.broadcastCallbacks.has(type)) {
+      this.broadcastCallbacks.set(type, new Set());
+    }
+    this.broadcastCallbacks.get(type)!.add(callback);
+  }
+
+  /**
+   * Stop listening for a notification type
+   */
+  offBroadcast(type: string, callback: MessageCallback): void {
+    const callbacks = this.broadcastCallbacks.get(type);
+    if (callbacks) {
+      callbacks.delete(callback);
+      if (callbacks.size === 0) {
+        this.broadcastCallbacks.delete(type);
+      }
+    }
+  }
+
   /**
    * Register callback for connection state changes
    */
@@ -213,6 +252,24 @@ class MQTTService {
    * Private: Handle incoming messages
    */
   private handleMessage(data: any): void {
+    // Handle batched frames (latest value per topic, see setCoalesceWindow)
+    if (data.type === 'batch' && Array.isArray(data.messages)) {
+      data.messages.forEach((message: any) => this.handleMessage(message));
+      return;
+    }
+
+    // System-wide notifications (see onBroadcast)
+    const broadcastCallbacks = data.type ? this.broadcastCallbacks.get(data.type) : undefined;
+    if (broadcastCallbacks) {
+      broadcastCallbacks.forEach((cb) => {
+        try {
+          cb(data.payload, data.topic);
+        } catch (error) {
+          console.error('Error in broadcast callback:', error);
+        }
+      });
+    }
+
     // Handle system status messages
     if (data.type === 'system_status' || data.topic === 'system/status') {
       this.notifySystemStatus(data);
@@ -351,6 +408,20 @@ class MQTTService {
     return topicParts.length === patternParts.length;
   }
 
+  /**
+   * Private: Send the coalescing window to the backend
+   */
+  private sendCoalesceWindow(): void {
+    if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+      this.ws.send(
+        JSON.stringify({
+          action: 'coalesce',
+          window_ms: this.coalesceWindowMs,
+        })
+      );
+    }
+  }
+
   /**
    * Private: Attempt to reconnect
    */
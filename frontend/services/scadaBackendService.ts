@@ -14,6 +14,7 @@ import {
   SensorWithMQTT,
   PLC,
   HistoryDatapoint,
+  SensorHistoryBatchResponse,
   DashboardMetric,
   ScadaEvent,
 } from '../types';
@@ -355,6 +356,32 @@ class ScadaBackendService {
     }
   }
 
+  /**
+   * POST /api/sensors/history:batch - History of several sensors in one request
+   */
+  async getSensorsHistoryBatch(
+    sensors: (number | string)[],
+    from: Date,
+    to: Date,
+    maxPoints?: number
+  ): Promise<SensorHistoryBatchResponse | null> {
+    try {
+      const data = await this.fetch<SensorHistoryBatchResponse>('/api/sensors/history:batch', {
+        method: 'POST',
+        body: JSON.stringify({
+          sensors,
+          from: from.toISOString(),
+          to: to.toISOString(),
+          max_points: maxPoints,
+        }),
+      });
+      return data;
+    } catch (error) {
+      console.error('Failed to fetch batched sensor history:', error);
+      return null;
+    }
+  }
+
   // =====================================================
   // Real-time Data Endpoints (via MQTT or WebSocket)
   // =====================================================
@@ -413,7 +440,12 @@ class ScadaBackendService {
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
-          onMessage(data);
+          // Batched frame (coalescing mode): one callback per message
+          if (data.type === 'batch' && Array.isArray(data.messages)) {
+            data.messages.forEach((message: any) => onMessage(message));
+          } else {
+            onMessage(data);
+          }
         } catch (e) {
           console.error('Failed to parse WebSocket message:', e);
         }
@@ -104,6 +104,20 @@ export interface HistoryDatapoint {
   value: number;
 }
 
+// Batched history: POST /api/sensors/history:batch
+export interface SensorHistorySeries {
+  sensor_id: number;
+  sensor_code: string;
+  unit: string | null;
+  points: HistoryDatapoint[];
+}
+
+export interface SensorHistoryBatchResponse {
+  resolution: string;
+  series: SensorHistorySeries[];
+  missing: string[];
+}
+
 // ============================================
 // Logs API Types
 // ============================================
@@ -158,6 +172,18 @@ export interface WSSubscribeMessage {
   sensors: string[]; // Array of sensor codes
 }
 
+// Latest-value batching (0 = off), answered with WSBatchMessage frames
+export interface WSCoalesceMessage {
+  action: 'coalesce';
+  window_ms: number;
+}
+
+// Batched frame: newest message per topic over the coalescing window
+export interface WSBatchMessage {
+  type: 'batch';
+  messages: { topic: string; payload: any }[];
+}
+
 // Measurement received from WebSocket
 export interface WSMeasurement {
   type: 'measurement';